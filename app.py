@@ -3,12 +3,24 @@
 
 from flask import Flask, jsonify
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, verify_jwt_in_request, get_jwt_identity, get_jwt
+import importlib
 import os
 
 # Initialize JWT extension globally
 jwt = JWTManager()
 
+# Route blueprints: (module, blueprint attribute, URL prefix)
+BLUEPRINTS = (
+    ('routes.auth', 'auth_bp', '/api/v1/auth'),              # Authentication routes
+    ('routes.users', 'users_bp', '/api/v1/users'),           # User management routes
+    ('routes.trips', 'trips_bp', '/api/v1/trips'),           # Trip booking and management
+    ('routes.drivers', 'drivers_bp', '/api/v1/drivers'),     # Driver registration and profile
+    ('routes.payments', 'payments_bp', '/api/v1/payments'),  # M-Pesa payment integration
+    ('routes.admin', 'admin_bp', '/api/v1/admin'),           # Admin dashboard routes
+    ('routes.migrate', 'migrate_bp', '/api/v1/migrate'),     # Database migration endpoint
+)
+
 def create_app():
     """Application factory pattern for creating Flask app instance"""
     app = Flask(__name__)
@@ -18,79 +30,172 @@ def create_app():
     # Database URI - defaults to SQLite for development
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{os.path.join(os.path.dirname(os.path.abspath(__file__)), "safedrive.db")}')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable event system for performance
-    # Database connection optimization
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_pre_ping': True,  # Verify connections before use
-        'pool_recycle': 300,    # Recycle connections every 5 minutes
-        'connect_args': {'check_same_thread': False} if 'sqlite' in os.environ.get('DATABASE_URL', '') else {}
-    }
+    # SQLite mode (including the default database): WAL, pragmas and a single writer thread
+    is_sqlite = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '65536'))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', '268435456'))
+    app.config['SQLITE_WRITE_QUEUE'] = os.environ.get('SQLITE_WRITE_QUEUE', 'true').lower() == 'true'
+    app.config['SQLITE_BUSY_RETRIES'] = int(os.environ.get('SQLITE_BUSY_RETRIES', '3'))
+    # Database connection pool - sized per SAFERIDE_ENV profile, overridable with DB_* variables
+    from services.db_pool import engine_options
+    in_memory = is_sqlite and (':memory:' in app.config['SQLALCHEMY_DATABASE_URI'] or app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://')
+    engine_config, app.config['DB_PRE_PING'] = engine_options(is_sqlite, in_memory)
+    app.config['DB_PRE_PING_IDLE_SECONDS'] = float(os.environ.get('DB_PRE_PING_IDLE_SECONDS', '30'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(engine_config, connect_args={
+        'check_same_thread': False,
+        'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000
+    } if is_sqlite else {})
+    # Read replicas - comma-separated URLs; read-only routes are served from these
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
+    # Read-through cache - the Redis URL enables the shared tier across workers; without it
+    # invalidations stay in one process, so the cache is off unless explicitly enabled
+    app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+    app.config['CACHE_ENABLED'] = os.environ.get(
+        'CACHE_ENABLED', 'true' if app.config['CACHE_REDIS_URL'] else 'false').lower() == 'true'
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))
+    app.config['CACHE_TAG_TTL'] = int(os.environ.get('CACHE_TAG_TTL', '3600'))
+    # Compress responses larger than this many bytes
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+    # Simulated M-Pesa latency in milliseconds for the mock service (benchmarks and load tests)
+    app.config['MPESA_MOCK_LATENCY_MS'] = float(os.environ.get('MPESA_MOCK_LATENCY_MS', '0'))
+    # Background jobs - JOBS_EAGER runs tasks inline (development without a worker)
+    app.config['JOBS_EAGER'] = os.environ.get('JOBS_EAGER', 'false').lower() == 'true'
+    app.config['JOBS_VISIBILITY_TIMEOUT'] = int(os.environ.get('JOBS_VISIBILITY_TIMEOUT', '300'))
+    app.config['JOBS_RETENTION_DAYS'] = int(os.environ.get('JOBS_RETENTION_DAYS', '7'))
+    # Expiry sweeper - seconds a trip or payment may wait in a status before it is expired (0 disables)
+    app.config['TRIP_EXPIRY_SECONDS'] = {
+        'requested': int(os.environ.get('TRIP_EXPIRY_REQUESTED_SECONDS', '900')),
+        'accepted': int(os.environ.get('TRIP_EXPIRY_ACCEPTED_SECONDS', '3600')),
+        'arrived': int(os.environ.get('TRIP_EXPIRY_ARRIVED_SECONDS', '1800')),
+    }
+    app.config['PAYMENT_EXPIRY_SECONDS'] = int(os.environ.get('PAYMENT_EXPIRY_PENDING_SECONDS', '600'))
+    app.config['EXPIRY_BATCH_SIZE'] = int(os.environ.get('EXPIRY_BATCH_SIZE', '500'))
+    app.config['EXPIRY_SWEEP_INTERVAL'] = int(os.environ.get('EXPIRY_SWEEP_INTERVAL', '60'))
+    # Archive - finished trips older than ARCHIVE_AFTER_DAYS move to the *_archive tables
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+    app.config['ARCHIVE_MAX_BATCHES'] = int(os.environ.get('ARCHIVE_MAX_BATCHES', '100'))
+    app.config['ARCHIVE_INTERVAL'] = int(os.environ.get('ARCHIVE_INTERVAL', '3600'))
+    app.config['ARCHIVE_EXPORT_DIR'] = os.environ.get('ARCHIVE_EXPORT_DIR')
+    # Pricing - quotes are memoized per (pickup cell, dropoff cell, time bucket); signed quotes stay valid for QUOTE_TTL_SECONDS
+    app.config['PRICING_CELL_DEGREES'] = float(os.environ.get('PRICING_CELL_DEGREES', '0.002'))
+    app.config['PRICING_TIME_BUCKET_SECONDS'] = int(os.environ.get('PRICING_TIME_BUCKET_SECONDS', '60'))
+    app.config['PRICING_CACHE_SIZE'] = int(os.environ.get('PRICING_CACHE_SIZE', '10000'))
+    app.config['PRICING_CONFIG_TTL'] = int(os.environ.get('PRICING_CONFIG_TTL', '60'))
+    app.config['QUOTE_TTL_SECONDS'] = int(os.environ.get('QUOTE_TTL_SECONDS', '300'))
+    # Surge - zone size, how often the job worker publishes multipliers (and workers reload them), how they move
+    app.config['SURGE_ENABLED'] = os.environ.get('SURGE_ENABLED', 'true').lower() == 'true'
+    app.config['SURGE_CELL_DEGREES'] = float(os.environ.get('SURGE_CELL_DEGREES', '0.01'))
+    app.config['SURGE_TICK_SECONDS'] = float(os.environ.get('SURGE_TICK_SECONDS', '10'))
+    app.config['SURGE_SMOOTHING'] = float(os.environ.get('SURGE_SMOOTHING', '0.3'))
+    app.config['SURGE_SENSITIVITY'] = float(os.environ.get('SURGE_SENSITIVITY', '0.5'))
+    app.config['SURGE_MAX_MULTIPLIER'] = float(os.environ.get('SURGE_MAX_MULTIPLIER', '2.5'))
+    # ETA - learned speed grid cells, history used by the nightly build, and how often workers pick up a new build
+    app.config['ETA_CELL_DEGREES'] = float(os.environ.get('ETA_CELL_DEGREES', '0.01'))
+    app.config['ETA_COARSE_CELL_DEGREES'] = float(os.environ.get('ETA_COARSE_CELL_DEGREES', '0.05'))
+    app.config['ETA_MIN_SAMPLES'] = int(os.environ.get('ETA_MIN_SAMPLES', '3'))
+    app.config['ETA_HISTORY_DAYS'] = int(os.environ.get('ETA_HISTORY_DAYS', '90'))
+    app.config['ETA_BUILD_INTERVAL'] = int(os.environ.get('ETA_BUILD_INTERVAL', '86400'))
+    app.config['ETA_RELOAD_SECONDS'] = int(os.environ.get('ETA_RELOAD_SECONDS', '300'))
+    # Idempotency keys - how long responses are replayed, and how long duplicates wait for the first request
+    app.config['IDEMPOTENCY_TTL_SECONDS'] = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+    app.config['IDEMPOTENCY_LOCK_SECONDS'] = float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '10'))
+    # Outbox relay - broker for domain events (local in-memory stand-in unless a Redis URL is set)
+    app.config['OUTBOX_BROKER_URL'] = os.environ.get('OUTBOX_BROKER_URL', 'local')
+    app.config['OUTBOX_SUBSCRIBERS'] = [m.strip() for m in os.environ.get('OUTBOX_SUBSCRIBERS', '').split(',') if m.strip()]
+    app.config['OUTBOX_RETENTION_DAYS'] = int(os.environ.get('OUTBOX_RETENTION_DAYS', '3'))
+    # Presence tracking - users count as online for this many seconds after their last request
+    app.config['PRESENCE_TTL_SECONDS'] = int(os.environ.get('PRESENCE_TTL_SECONDS', '120'))
+    app.config['PRESENCE_FLUSH_INTERVAL'] = int(os.environ.get('PRESENCE_FLUSH_INTERVAL', '30'))
+    # Metrics - METRICS_DIR shares metrics between Gunicorn workers; METRICS_TOKEN protects /metrics (localhost only without it)
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Query profiler - every request in development, a sample in production
+    production = os.environ.get('SAFERIDE_ENV') == 'production'
+    app.config['QUERY_PROFILE_SAMPLE_RATE'] = float(os.environ.get('QUERY_PROFILE_SAMPLE_RATE', '0.01' if production else '1'))
+    app.config['QUERY_PROFILE_HEADER'] = os.environ.get('QUERY_PROFILE_HEADER', 'false' if production else 'true').lower() == 'true'
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', '200'))
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5'))
+    # Sampling profiler - admin-only endpoints under /api/v1/admin/profiler, off unless enabled
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
     
     # Initialize Flask extensions
     from models import db
     db.init_app(app)  # Initialize SQLAlchemy with app
+    if is_sqlite and not in_memory:
+        from services import sqlite_writer
+        with app.app_context():
+            sqlite_writer.init_app(app, db.engine)
     jwt.init_app(app)  # Initialize JWT manager
+    from services.replicas import router as replica_router
+    replica_router.init_app(app, db)  # Route read-only endpoints to replicas
+    from services import db_pool
+    with app.app_context():
+        engines = [db.engine] + replica_router.engines
+        for engine in engines:
+            db_pool.instrument(engine, app.config['DB_PRE_PING'], app.config['DB_PRE_PING_IDLE_SECONDS'])
+    # Request, database and external call metrics (registered first so latency covers later hooks)
+    from services import metrics
+    metrics.init_app(app, engines)
+    from services.jobs import backlog_metrics
+    metrics.register_collector(backlog_metrics)  # Job queue depth, read once per scrape
+    from services.outbox import pending_metrics
+    metrics.register_collector(pending_metrics)  # Unpublished outbox events
+    from services.query_profiler import profiler as query_profiler
+    query_profiler.init_app(app, engines)  # Per-request query counts, N+1 and slow-query logging
+    from services import profiler as sampling_profiler
+    sampling_profiler.init_app(app)  # Route-targeted stack sampling
     # Configure CORS for API access from frontend
     CORS(app, 
          resources={r"/api/*": {"origins": "*"}},  # Allow all origins for API routes
-         allow_headers=["Content-Type", "Authorization"],  # Required headers
+         allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],  # Required headers
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])  # Allowed HTTP methods
     
-    # Database initialization and migrations
-    with app.app_context():
-        try:
-            # Create all database tables
-            db.create_all()
-            
-            # Handle legacy database migrations - remove problematic columns
-            try:
-                with db.engine.connect() as conn:
-                    # Check for columns that cause deployment issues
-                    result = conn.execute(db.text("""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = 'users' AND column_name IN ('is_online', 'last_seen');
-                    """))
-                    existing_columns = [row[0] for row in result]
-                    
-                    # Remove problematic columns if they exist
-                    if 'is_online' in existing_columns:
-                        conn.execute(db.text("ALTER TABLE users DROP COLUMN is_online;"))
-                        conn.commit()
-                    
-                    if 'last_seen' in existing_columns:
-                        conn.execute(db.text("ALTER TABLE users DROP COLUMN last_seen;"))
-                        conn.commit()
-            except Exception:
-                pass  # Ignore migration errors for SQLite or if columns don't exist
-            
-            # Seed initial configuration data on first run
-            from models import Config
-            if Config.query.count() == 0:
-                from seed_config import run_seeds
-                run_seeds()
-        except Exception:
-            pass  # Continue if database setup fails
+    # Register API route blueprints with API versioning (imported on first app build)
+    for module_name, blueprint_name, url_prefix in BLUEPRINTS:
+        module = importlib.import_module(module_name)
+        app.register_blueprint(getattr(module, blueprint_name), url_prefix=url_prefix)
     
-    # Register API route blueprints
-    from routes.auth import auth_bp          # Authentication routes
-    from routes.users import users_bp        # User management routes
-    from routes.trips import trips_bp        # Trip booking and management
-    from routes.drivers import drivers_bp    # Driver registration and profile
-    from routes.payments import payments_bp  # M-Pesa payment integration
-    from routes.admin import admin_bp        # Admin dashboard routes
+    # Management commands (init-db, seed)
+    from commands import register_commands
+    register_commands(app)
     
-    # Register all blueprints with API versioning
-    app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
-    app.register_blueprint(users_bp, url_prefix='/api/v1/users')
-    app.register_blueprint(trips_bp, url_prefix='/api/v1/trips')
-    app.register_blueprint(drivers_bp, url_prefix='/api/v1/drivers')
-    app.register_blueprint(payments_bp, url_prefix='/api/v1/payments')
-    app.register_blueprint(admin_bp, url_prefix='/api/v1/admin')
+    # Read-through cache for hot reads
+    from services import cache as response_cache
+    response_cache.init_app(app)
     
-    # Database migration endpoint
-    from routes.migrate import migrate_bp
-    app.register_blueprint(migrate_bp, url_prefix='/api/v1/migrate')
+    # Fare quotes from in-memory pricing config, with per-zone surge and learned ETAs
+    from services import pricing, surge, eta
+    pricing.init_app(app)
+    surge.init_app(app)
+    eta.init_app(app)
+    
+    # Conditional GET (ETag / 304) and response compression
+    from services import http_cache
+    http_cache.init_app(app)
+    
+    # Presence tracking for authenticated requests
+    from services.presence import presence, flush_presence
+    presence.ttl_seconds = app.config['PRESENCE_TTL_SECONDS']
+    presence.flush_interval = app.config['PRESENCE_FLUSH_INTERVAL']
+    
+    @app.before_request
+    def track_presence():
+        """Refresh last-seen for the authenticated user and flush expired drivers"""
+        try:
+            if verify_jwt_in_request(optional=True):
+                presence.touch(get_jwt_identity(), get_jwt().get('role'))
+        except Exception:
+            pass  # Invalid tokens are rejected by the route itself
+        if presence.flush_due():
+            try:
+                flush_presence()
+            except Exception:
+                db.session.rollback()
     
     # Health check endpoint for monitoring
     @app.route('/api/v1/health')
@@ -130,10 +235,24 @@ def create_app():
     
     return app
 
-# Create app instance for production deployment (Gunicorn)
-app = create_app()
+def __getattr__(name):
+    """Build the app instance on first access (``app:app`` for Gunicorn)
+
+    Importing this module stays cheap for the CLI, benchmarks and tooling;
+    Gunicorn builds the app once in the master with ``preload_app``.
+    """
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 # Development server entry point
 if __name__ == '__main__':
+    app = create_app()
+    # Create tables and seed on first run for local development
+    with app.app_context():
+        from commands import init_db
+        init_db()
     # Run development server on all interfaces, port 5002
-    app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5002)
@@ -0,0 +1,161 @@
+# SafeRide Backend - Worker Concurrency Benchmark
+# Requests per second a single worker sustains on an I/O-bound route, per worker profile
+
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+# Worker profile -> module it needs beyond the requirements
+PROFILES = {
+    'sync': None,
+    'gthread': None,
+    'gevent': 'gevent',
+}
+
+
+def seed(database_url, payments):
+    """One passenger with many pending M-Pesa payments; returns (token, payment ids)"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from commands import init_db
+    from models import db, User, Trip, Payment
+    from flask_jwt_extended import create_access_token
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        passenger = User(email=f'bench-{uuid.uuid4().hex[:6]}@saferide.test', name='Bench', phone='+254700000001', role='passenger')
+        passenger.set_password('benchmark')
+        db.session.add(passenger)
+        db.session.flush()
+        now = datetime.utcnow()
+        trips = [{'id': f't_bench_{i}', 'passenger_id': passenger.id, 'pickup_lat': -1.2864, 'pickup_lng': 36.8172,
+                  'pickup_address': 'CBD', 'dropoff_lat': -1.2676, 'dropoff_lng': 36.8108, 'dropoff_address': 'Westlands',
+                  'status': 'completed', 'fare': 300, 'distance': 3, 'duration': 10, 'payment_status': 'pending',
+                  'created_at': now} for i in range(payments)]
+        db.session.execute(Trip.__table__.insert(), trips)
+        db.session.execute(Payment.__table__.insert(), [
+            {'id': f'p_bench_{i}', 'trip_id': f't_bench_{i}', 'amount': 300, 'phone': '+254700000001',
+             'checkout_request_id': f'ws_CO_bench_{i}', 'status': 'pending', 'created_at': now}
+            for i in range(payments)
+        ])
+        db.session.commit()
+        token = create_access_token(identity=passenger.id, additional_claims={'role': 'passenger'})
+    return token, [f'p_bench_{i}' for i in range(payments)]
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'{url}/api/v1/health', timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+
+def run_profile(profile, args, env, token, payment_ids):
+    port = args.port
+    url = f'http://127.0.0.1:{port}'
+    server_env = dict(env, GUNICORN_WORKER_CLASS=profile, GUNICORN_WORKERS='1', GUNICORN_BIND=f'127.0.0.1:{port}',
+                      GUNICORN_THREADS=str(args.threads), GUNICORN_WORKER_CONNECTIONS=str(args.concurrency * 2))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                              cwd=ROOT, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_up(url):
+            return {'profile': profile, 'error': 'server did not start'}
+        ids = iter(payment_ids)
+        lock = threading.Lock()
+        latencies, errors = [], [0]
+        deadline = time.monotonic() + args.duration
+
+        def client():
+            session = requests.Session()
+            headers = {'Authorization': f'Bearer {token}'}
+            while time.monotonic() < deadline:
+                with lock:
+                    payment_id = next(ids, None)
+                if payment_id is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    ok = session.get(f'{url}/api/v1/payments/status/{payment_id}', headers=headers, timeout=30).status_code == 200
+                except requests.RequestException:
+                    ok = False
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                    errors[0] += not ok
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        latencies.sort()
+        throughput = len(latencies) / elapsed
+        return {
+            'profile': profile,
+            'requests': len(latencies),
+            'errors': errors[0],
+            'throughput': throughput,
+            'p50': latencies[len(latencies) // 2] if latencies else 0,
+            # Little's law: requests the worker overlaps = throughput x time each spends waiting on M-Pesa
+            'concurrency': throughput * args.latency_ms / 1000,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare one-worker concurrency across Gunicorn worker profiles')
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--concurrency', type=int, default=64, help='Concurrent client connections')
+    parser.add_argument('--threads', type=int, default=32, help='Threads per gthread worker')
+    parser.add_argument('--latency-ms', type=float, default=200, help='Simulated Daraja latency')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5097)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='saferide-concurrency-')
+    database_url = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+    per_profile = int(args.concurrency * args.duration * 1000 / args.latency_ms * 1.5) + args.concurrency
+    profiles = [p.strip() for p in args.profiles.split(',') if p.strip()]
+    token, payment_ids = seed(database_url, per_profile * len(profiles))
+    env = dict(os.environ, DATABASE_URL=database_url, MPESA_MOCK_LATENCY_MS=str(args.latency_ms),
+               CACHE_ENABLED='false', QUERY_PROFILE_HEADER='false')
+
+    print(f'{args.concurrency} connections, {args.latency_ms:.0f} ms simulated M-Pesa latency, 1 worker\n')
+    print(f'{"profile":10} {"req/s":>8} {"p50 ms":>8} {"concurrent":>10} {"errors":>7}')
+    chunks = iter([payment_ids[i:i + per_profile] for i in range(0, len(payment_ids), per_profile)])
+    for profile in profiles:
+        module = PROFILES.get(profile)
+        ids = next(chunks)
+        if module and importlib.util.find_spec(module) is None:
+            print(f'{profile:10} skipped ({module} not installed)')
+            continue
+        result = run_profile(profile, args, env, token, ids)
+        if 'error' in result:
+            print(f'{profile:10} {result["error"]}')
+            continue
+        print(f'{profile:10} {result["throughput"]:8.1f} {result["p50"] * 1000:8.1f} '
+              f'{result["concurrency"]:10.1f} {result["errors"]:7d}')
+
+
+if __name__ == '__main__':
+    main()
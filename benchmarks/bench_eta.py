@@ -0,0 +1,119 @@
+# SafeRide Backend - ETA Benchmark
+# Lookup cost of the learned speed grid per fallback level, and accuracy on held-out trips
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.nairobi import HOTSPOTS, HOURLY_DEMAND, random_trip, random_hour, distance_km
+
+WEEK_START = datetime(2024, 1, 1)  # A Monday, hour of week 0
+
+
+def synthetic_speed(rng, pickup, dropoff, started_at):
+    """km/h that slows with demand at rush hour and varies by route, with trip-to-trip noise"""
+    route = random.Random(f'{pickup[2]}-{dropoff[2]}').uniform(0.7, 1.3)
+    weekend = 1.25 if started_at.weekday() >= 5 else 1.0
+    speed = 38 / (1 + HOURLY_DEMAND[started_at.hour]) * route * weekend
+    return speed * rng.lognormvariate(0, 0.15)
+
+
+def seed_trips(db, Trip, count, days, rng):
+    """Completed trips with ride times drawn from ``synthetic_speed``"""
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        pickup, dropoff = random_trip(rng)
+        distance = max(distance_km(pickup[0], pickup[1], dropoff[0], dropoff[1]), 0.5)
+        day = now - timedelta(days=rng.randint(1, days))
+        started_at = day.replace(hour=random_hour(rng), minute=rng.randint(0, 59))
+        minutes = distance / synthetic_speed(rng, pickup, dropoff, started_at) * 60
+        rows.append({
+            'id': f't_eta_{i}', 'passenger_id': 'u_eta', 'driver_id': 'u_eta_d',
+            'pickup_lat': pickup[0], 'pickup_lng': pickup[1], 'pickup_address': pickup[2],
+            'dropoff_lat': dropoff[0], 'dropoff_lng': dropoff[1], 'dropoff_address': dropoff[2],
+            'status': 'completed', 'fare': 0, 'distance': round(distance, 2), 'duration': int(minutes),
+            'payment_status': 'paid', 'created_at': started_at - timedelta(minutes=8),
+            'started_at': started_at, 'completed_at': started_at + timedelta(minutes=minutes),
+        })
+    for start in range(0, len(rows), 5000):
+        db.session.execute(Trip.__table__.insert(), rows[start:start + 5000])
+    db.session.commit()
+
+
+def per_call(fn, repeat=5):
+    """Best seconds per call"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ETA lookups and report accuracy on held-out trips')
+    parser.add_argument('--trips', type=int, default=50000)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--holdout', type=float, default=0.1)
+    parser.add_argument('--max-us', type=float, default=10.0, help='Fail if any lookup is slower than this')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('SQLITE_WRITE_QUEUE', 'false')
+
+    from app import create_app
+    from commands import init_db
+    from models import db, Trip
+    from services import eta as eta_service
+    from services.eta import eta
+    from services.geo import cell_center
+
+    app = create_app()
+    config = app.config
+    with app.app_context():
+        init_db()
+        seed_trips(db, Trip, args.trips, args.days, random.Random(args.seed))
+        built = eta_service.build(config['ETA_CELL_DEGREES'], config['ETA_COARSE_CELL_DEGREES'],
+                                  config['ETA_MIN_SAMPLES'], args.days + 1)
+        eta.refresh()
+        grid = eta.grid
+
+        # A trip for each fallback level; the last one misses every finer level
+        origin, dest, how = eta_service.unpack(next(iter(grid.fine)))
+        cbd, westlands = HOTSPOTS[0][1:3], HOTSPOTS[1][1:3]
+        nowhere = ((10.0, 10.0), (10.1, 10.1))
+        cases = (
+            ('fine', cell_center(origin, grid.fine_degrees), cell_center(dest, grid.fine_degrees), how),
+            ('coarse', cbd, westlands, 8),
+            ('hourly', nowhere[0], nowhere[1], 8),
+            ('overall', nowhere[0], nowhere[1], 8),
+        )
+        lookups = {}
+        for name, pickup, dropoff, how in cases:
+            if name == 'overall':
+                grid.hourly = [None] * 168
+            when = WEEK_START + timedelta(hours=how)
+            level = grid.lookup(pickup, dropoff, how)[1]
+            seconds = per_call(lambda: eta.speed(pickup, dropoff, when))
+            lookups[name] = {'level': eta_service.LEVEL_NAMES[level] if level is not None else None,
+                             'us': round(seconds * 1e6, 3)}
+
+        report = eta_service.evaluate(config['ETA_CELL_DEGREES'], config['ETA_COARSE_CELL_DEGREES'], 30.0,
+                                      config['ETA_MIN_SAMPLES'], args.days + 1, args.holdout)
+
+    print(json.dumps({'trips': args.trips, 'grid': built, 'lookups': lookups, 'accuracy': report}, indent=2))
+    slow = [name for name, result in lookups.items() if result['us'] > args.max_us]
+    if slow:
+        print(f'ETA lookups slower than {args.max_us} us: {", ".join(slow)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# SafeRide Backend - Serialization Benchmark
+# Compares ORM to_dict() + json against compiled column encoders + orjson
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed_trips(db, Trip, User, count):
+    """Insert a passenger and a page worth of trips"""
+    passenger = User(email='bench@saferide.test', name='Bench', phone='0700000000', role='passenger')
+    passenger.set_password('benchmark')
+    db.session.add(passenger)
+    db.session.flush()
+    now = datetime.utcnow()
+    db.session.add_all([
+        Trip(
+            passenger_id=passenger.id,
+            pickup_lat=-1.2921 + i * 1e-5, pickup_lng=36.8219, pickup_address='Kenyatta Avenue, Nairobi',
+            dropoff_lat=-1.3032, dropoff_lng=36.7073 + i * 1e-5, dropoff_address='Karen, Nairobi',
+            fare=450.5, distance=12.3, duration=25, status='completed', payment_status='paid',
+            created_at=now - timedelta(minutes=i), accepted_at=now, started_at=now, completed_at=now
+        )
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def best_of(fn, repeat):
+    """Best wall time over several runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark list-endpoint serialization')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app
+    from models import db, Trip, User
+    from services.serializers import trip_serializer, dumps
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_trips(db, Trip, User, args.rows)
+
+        def orm_path():
+            db.session.expire_all()
+            trips = Trip.query.order_by(Trip.created_at.desc()).limit(args.rows).all()
+            return json.dumps({'trips': [trip.to_dict() for trip in trips]}).encode('utf-8')
+
+        def compiled_path():
+            rows = trip_serializer.select().order_by(Trip.created_at.desc()).limit(args.rows).all()
+            return dumps({'trips': trip_serializer.encode_all(rows)})
+
+        # Both paths must produce the same document
+        assert json.loads(orm_path()) == json.loads(compiled_path())
+
+        orm_seconds = best_of(orm_path, args.repeat)
+        compiled_seconds = best_of(compiled_path, args.repeat)
+
+    print(json.dumps({
+        'rows': args.rows,
+        'orm_to_dict_ms': round(orm_seconds * 1000, 3),
+        'compiled_encoder_ms': round(compiled_seconds * 1000, 3),
+        'speedup': round(orm_seconds / compiled_seconds, 2)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
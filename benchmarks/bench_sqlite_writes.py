@@ -0,0 +1,97 @@
+# SafeRide Backend - SQLite Write Throughput Benchmark
+# Concurrent writers on the default SQLite setup vs WAL + pragmas + single writer queue
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sqlite_writer import WriteQueue, apply_pragmas
+
+INSERT = text('INSERT INTO pings (driver_id, lat, lng, created_at) VALUES (:driver_id, :lat, :lng, :created_at)')
+
+
+def make_engine(path, busy_timeout):
+    engine = create_engine(
+        f'sqlite:///{path}',
+        connect_args={'check_same_thread': False, 'timeout': busy_timeout}
+    )
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS pings (id INTEGER PRIMARY KEY, driver_id TEXT, lat REAL, lng REAL, created_at REAL)'
+        ))
+    return engine
+
+
+def run_threads(threads, writes_per_thread, write_one):
+    """Run writers concurrently; returns (elapsed seconds, successful writes, errors)"""
+    counts = {'ok': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker(index):
+        for i in range(writes_per_thread):
+            params = {'driver_id': f'd{index}', 'lat': -1.29, 'lng': 36.82, 'created_at': time.time()}
+            try:
+                write_one(params)
+                outcome = 'ok'
+            except Exception:
+                outcome = 'errors'
+            with lock:
+                counts[outcome] += 1
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, counts['ok'], counts['errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent SQLite writes')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--writes', type=int, default=200, help='Writes per thread')
+    parser.add_argument('--busy-timeout', type=float, default=0.1, help='Seconds a blocked writer waits before "database is locked"')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+
+    # Before: rollback journal, FULL sync, one transaction per write from each thread
+    before_engine = make_engine(os.path.join(directory, 'before.db'), args.busy_timeout)
+
+    def direct_write(params):
+        with before_engine.begin() as conn:
+            conn.execute(INSERT, params)
+
+    before = run_threads(args.threads, args.writes, direct_write)
+
+    # After: WAL + pragmas, all writes funnelled through one thread with group commit
+    after_engine = make_engine(os.path.join(directory, 'after.db'), args.busy_timeout)
+    apply_pragmas(after_engine, busy_timeout_ms=args.busy_timeout * 1000)
+    after_engine.dispose()  # Reconnect so the pragmas apply
+    queue = WriteQueue(after_engine)
+    after = run_threads(args.threads, args.writes, lambda params: queue.run(lambda conn: conn.execute(INSERT, params)))
+
+    def summary(result):
+        elapsed, ok, errors = result
+        return {'seconds': round(elapsed, 3), 'writes': ok, 'errors': errors, 'writes_per_second': round(ok / elapsed, 1)}
+
+    print(json.dumps({
+        'threads': args.threads,
+        'writes_per_thread': args.writes,
+        'before': summary(before),
+        'after': dict(summary(after), commits=queue.batches),
+        'speedup': round((after[1] / after[0]) / (before[1] / before[0]), 2) if before[1] else None
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# SafeRide Backend - Startup Benchmark
+# Measures module import, app build and first request time in fresh interpreters
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+application = app_module.create_app()
+built = time.perf_counter()
+response = application.test_client().get('/api/v1/health')
+served = time.perf_counter()
+assert response.status_code == 200
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (built - imported) * 1000,
+    'first_request_ms': (served - built) * 1000,
+    'total_ms': (served - start) * 1000
+}))
+'''
+
+
+def run_probe(env):
+    """Run one cold start in a fresh interpreter"""
+    output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=ROOT, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark application cold start')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(tempfile.mkdtemp(), "startup.db")}')
+
+    samples = [run_probe(env) for _ in range(args.runs)]
+    report = {'runs': args.runs}
+    for metric in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = [sample[metric] for sample in samples]
+        report[metric] = {
+            'median': round(statistics.median(values), 2),
+            'min': round(min(values), 2),
+            'max': round(max(values), 2)
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+# SafeRide Backend - Load Test Driver
+# Runs a scripted ride-hailing workload against a running server and reports per-endpoint latency
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from benchmarks.nairobi import random_point, random_trip
+from benchmarks.seed_workload import EMAIL_DOMAIN, PASSWORD, account_email
+
+# Scenario -> relative weight in the mix
+DEFAULT_MIX = {
+    'ride': 3,            # create trip -> accept -> arrive -> start -> complete -> pay
+    'location_ping': 10,  # driver location update
+    'browse': 4,          # passenger trip history and driver trip feed
+    'login': 2,
+    'register': 1,
+    'admin_dashboard': 0.2,
+}
+
+
+class Recorder:
+    """Latencies and errors per endpoint label"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = errors = 0
+        for label, values in sorted(self.latencies.items()):
+            values.sort()
+            count = len(values)
+            total += count
+            errors += self.errors.get(label, 0)
+            endpoints[label] = {
+                'count': count,
+                'errors': self.errors.get(label, 0),
+                'throughput': round(count / elapsed, 2),
+                'meanMs': round(sum(values) / count * 1000, 2),
+                'p50Ms': percentile(values, 50),
+                'p95Ms': percentile(values, 95),
+                'p99Ms': percentile(values, 99),
+                'maxMs': round(values[-1] * 1000, 2),
+            }
+        return {
+            'durationSeconds': round(elapsed, 2),
+            'requests': total,
+            'errors': errors,
+            'throughput': round(total / elapsed, 2) if elapsed else 0,
+            'endpoints': endpoints,
+        }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile in milliseconds"""
+    if not sorted_values:
+        return None
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return round(sorted_values[index] * 1000, 2)
+
+
+class Client:
+    """One virtual user's HTTP session"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/') + '/api/v1'
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def call(self, label, method, path, token=None, expect=(200, 201), **kwargs):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, headers=headers, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(label, time.perf_counter() - start, False)
+            return None
+        self.recorder.record(label, time.perf_counter() - start, response.status_code in expect)
+        if response.status_code not in expect:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def login(self, email):
+        body = self.call('POST /auth/login', 'POST', '/auth/login', json={'email': email, 'password': PASSWORD})
+        return (body or {}).get('token')
+
+
+class Workload:
+    """Scenario implementations sharing a pool of seeded accounts"""
+
+    def __init__(self, args):
+        self.args = args
+        self.mix = list(args.mix.items())
+        self.tokens = {}
+        self._registered = itertools.count()
+
+    def token(self, client, role):
+        """Log in as a random seeded account (tokens are reused like a mobile app would)"""
+        count = self.args.passengers if role == 'passenger' else self.args.drivers if role == 'driver' else 1
+        email = account_email(role, random.randrange(count))
+        token = self.tokens.get(email)
+        if token is None:
+            token = client.login(email)
+            if token:
+                self.tokens[email] = token
+        return token
+
+    def run_one(self, client):
+        name = random.choices([m[0] for m in self.mix], weights=[m[1] for m in self.mix])[0]
+        getattr(self, f'scenario_{name}')(client)
+
+    def scenario_ride(self, client):
+        passenger = self.token(client, 'passenger')
+        driver = self.token(client, 'driver')
+        if not passenger or not driver:
+            return
+        pickup, dropoff = random_trip()
+        body = client.call('POST /trips', 'POST', '/trips', passenger, json={
+            'pickup': {'lat': pickup[0], 'lng': pickup[1], 'address': f'{pickup[2]}, Nairobi'},
+            'dropoff': {'lat': dropoff[0], 'lng': dropoff[1], 'address': f'{dropoff[2]}, Nairobi'},
+        })
+        if not body:
+            return
+        trip = body['data']
+        for action in ('accept', 'arrive', 'start'):
+            if not client.call(f'PUT /trips/:id/{action}', 'PUT', f'/trips/{trip["id"]}/{action}', driver):
+                return
+        if not client.call('PUT /trips/:id/complete', 'PUT', f'/trips/{trip["id"]}/complete', driver):
+            return
+        client.call('POST /payments/initiate', 'POST', '/payments/initiate', passenger, expect=(200, 201, 400), json={
+            'tripId': trip['id'], 'phone': '+254700000000', 'amount': trip['fare']
+        })
+
+    def scenario_location_ping(self, client):
+        driver = self.token(client, 'driver')
+        if driver:
+            lat, lng, _ = random_point()
+            client.call('PUT /drivers/location', 'PUT', '/drivers/location', driver, json={'lat': lat, 'lng': lng})
+
+    def scenario_browse(self, client):
+        passenger = self.token(client, 'passenger')
+        if passenger:
+            client.call('GET /trips', 'GET', '/trips?limit=10', passenger)
+        driver = self.token(client, 'driver')
+        if driver:
+            client.call('GET /drivers/available-trips', 'GET', '/drivers/available-trips', driver)
+
+    def scenario_login(self, client):
+        role = random.choice(('passenger', 'driver'))
+        count = self.args.passengers if role == 'passenger' else self.args.drivers
+        client.login(account_email(role, random.randrange(count)))
+
+    def scenario_register(self, client):
+        n = next(self._registered)
+        suffix = uuid.uuid4().hex[:8]
+        client.call('POST /auth/register', 'POST', '/auth/register', json={
+            'email': f'new{suffix}@register.{EMAIL_DOMAIN}', 'password': PASSWORD,
+            'name': f'New Passenger {n}', 'phone': f'+2541{int(suffix, 16) % 100000000:08d}', 'role': 'passenger'
+        })
+
+    def scenario_admin_dashboard(self, client):
+        admin = self.token(client, 'admin')
+        if admin:
+            client.call('GET /admin/stats', 'GET', '/admin/stats', admin)
+
+
+def run_closed(workload, args, recorder, deadline):
+    """Closed loop: ``--users`` virtual users, each starts its next scenario after ``--think`` seconds"""
+    def user():
+        client = Client(args.url, recorder, args.timeout)
+        while time.monotonic() < deadline:
+            workload.run_one(client)
+            if args.think:
+                time.sleep(random.expovariate(1 / args.think))
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(workload, args, recorder, deadline):
+    """Open loop: scenarios arrive at ``--rate`` per second (Poisson) regardless of response times
+
+    Arrivals that find every worker busy are counted as 'dropped', which is
+    how saturation shows up in an open model.
+    """
+    arrivals = queue.Queue(maxsize=args.users * 2)
+    dropped = [0]
+
+    def worker():
+        client = Client(args.url, recorder, args.timeout)
+        while True:
+            item = arrivals.get()
+            if item is None:
+                return
+            workload.run_one(client)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.users)]
+    for thread in threads:
+        thread.start()
+    next_arrival = time.monotonic()
+    while next_arrival < deadline:
+        time.sleep(max(next_arrival - time.monotonic(), 0))
+        try:
+            arrivals.put_nowait(True)
+        except queue.Full:
+            dropped[0] += 1
+        next_arrival += random.expovariate(args.rate)
+    for _ in threads:
+        arrivals.put(None)
+    for thread in threads:
+        thread.join()
+    return dropped[0]
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    if value:
+        for part in value.split(','):
+            name, weight = part.split('=')
+            if name not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f'Unknown scenario {name}')
+            mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive a scripted workload against a running SafeRide server')
+    parser.add_argument('--url', default='http://localhost:5002')
+    parser.add_argument('--model', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--users', type=int, default=20, help='Virtual users (closed) or worker threads (open)')
+    parser.add_argument('--rate', type=float, default=50, help='Scenario arrivals per second (open model)')
+    parser.add_argument('--think', type=float, default=0.0, help='Mean think time between scenarios (closed model)')
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds to run before recording')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--passengers', type=int, default=10000, help='Seeded passenger accounts to draw from')
+    parser.add_argument('--drivers', type=int, default=1000, help='Seeded driver accounts to draw from')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(''),
+                        help='Override scenario weights, e.g. ride=5,register=0')
+    parser.add_argument('--output', help='Write the JSON report here (default stdout)')
+    args = parser.parse_args()
+
+    workload = Workload(args)
+    if args.warmup:
+        # Fills the token pool and warms server caches; not recorded
+        run_closed(workload, args, Recorder(), time.monotonic() + args.warmup)
+    recorder = Recorder()
+
+    started = time.monotonic()
+    dropped = None
+    if args.model == 'closed':
+        run_closed(workload, args, recorder, started + args.duration)
+    else:
+        dropped = run_open(workload, args, recorder, started + args.duration)
+    report = recorder.report(time.monotonic() - started)
+    report['config'] = {
+        'url': args.url, 'model': args.model, 'users': args.users, 'duration': args.duration,
+        'rate': args.rate if args.model == 'open' else None, 'think': args.think, 'mix': args.mix,
+    }
+    if dropped is not None:
+        report['droppedArrivals'] = dropped
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+# SafeRide Backend - Micro-Benchmarks
+# Per-call cost of hot request-path helpers, with stored baselines and regression checks
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'microbench.json')
+
+# name -> setup(context) returning a zero-argument callable
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark; the decorated setup returns the callable to time"""
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+class Context:
+    """Shared app, database and sample rows, built once for all benchmarks"""
+
+    def __init__(self):
+        self._tmp = tempfile.mkdtemp(prefix='saferide-microbench-')
+        os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(self._tmp, "bench.db")}'
+        os.environ.setdefault('SQLITE_WRITE_QUEUE', 'false')
+        os.environ.setdefault('QUERY_PROFILE_HEADER', 'false')
+        from app import create_app
+        from commands import init_db
+        self.app = create_app()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        init_db()
+
+    def trips(self, count=1000):
+        from models import Trip
+        now = datetime.utcnow()
+        return [
+            Trip(id=f't_{i}', passenger_id='u_1', driver_id='u_2', pickup_lat=-1.2921, pickup_lng=36.8219,
+                 pickup_address='Kenyatta Avenue, Nairobi', dropoff_lat=-1.3032, dropoff_lng=36.7073,
+                 dropoff_address='Karen, Nairobi', status='completed', fare=450.5, distance=12.3, duration=25,
+                 payment_status='paid', created_at=now, accepted_at=now, started_at=now, completed_at=now)
+            for i in range(count)
+        ]
+
+    def users(self, count=1000):
+        from models import User
+        now = datetime.utcnow()
+        return [
+            User(id=f'u_{i}', email=f'user{i}@saferide.test', name=f'User {i}', phone='+254712345678',
+                 role='passenger', created_at=now)
+            for i in range(count)
+        ]
+
+
+@benchmark('calculate_distance')
+def bench_calculate_distance(ctx):
+    from services.geo import haversine_km
+    return lambda: haversine_km(-1.2921, 36.8219, -1.3032, 36.7073)
+
+
+@benchmark('calculate_fare')
+def bench_calculate_fare(ctx):
+    from services.pricing import calculate_fare
+    return lambda: calculate_fare(12.3, 200.0, 50.0, 30.0, 100.0)
+
+
+@benchmark('quote_memo_hit')
+def bench_quote_memo_hit(ctx):
+    from services.pricing import pricing
+    pricing.quote((-1.2921, 36.8219), (-1.3032, 36.7073))
+    return lambda: pricing.quote((-1.2921, 36.8219), (-1.3032, 36.7073))
+
+
+@benchmark('quote_memo_miss')
+def bench_quote_memo_miss(ctx):
+    from services.pricing import pricing
+    return lambda: (pricing.memo.clear(), pricing.quote((-1.2921, 36.8219), (-1.3032, 36.7073)))
+
+
+@benchmark('surge_multiplier')
+def bench_surge_multiplier(ctx):
+    from services.surge import surge
+    return lambda: surge.multiplier(-1.2921, 36.8219)
+
+
+@benchmark('quote_sign_verify')
+def bench_quote_sign_verify(ctx):
+    from services.pricing import pricing
+    quote = pricing.quote((-1.2921, 36.8219), (-1.3032, 36.7073))
+    return lambda: pricing.verify(pricing.sign(quote, 'u_1')[0], 'u_1', (-1.2921, 36.8219), (-1.3032, 36.7073))
+
+
+@benchmark('trip_to_dict_1k')
+def bench_trip_to_dict(ctx):
+    trips = ctx.trips()
+    return lambda: [trip.to_dict() for trip in trips]
+
+
+@benchmark('user_to_dict_1k')
+def bench_user_to_dict(ctx):
+    users = ctx.users()
+    return lambda: [user.to_dict() for user in users]
+
+
+@benchmark('validate_email')
+def bench_validate_email(ctx):
+    from routes.auth import validate_email
+    return lambda: validate_email('jane.wanjiku@example.co.ke')
+
+
+@benchmark('validate_phone')
+def bench_validate_phone(ctx):
+    from routes.auth import validate_phone
+    return lambda: validate_phone('+254712345678')
+
+
+@benchmark('jwt_encode')
+def bench_jwt_encode(ctx):
+    from flask_jwt_extended import create_access_token
+    return lambda: create_access_token(identity='u_0123456789ab', additional_claims={'role': 'passenger'})
+
+
+@benchmark('jwt_decode')
+def bench_jwt_decode(ctx):
+    from flask_jwt_extended import create_access_token, decode_token
+    token = create_access_token(identity='u_0123456789ab', additional_claims={'role': 'passenger'})
+    return lambda: decode_token(token)
+
+
+def measure(fn, rounds, min_time):
+    """Seconds per call: calibrate a loop count, then time ``rounds`` loops"""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+    per_call = [t / number for t in timer.repeat(repeat=rounds, number=number)]
+    return {
+        'min': min(per_call),
+        'median': statistics.median(per_call),
+        'stdev': statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        'loops': number,
+        'rounds': rounds,
+    }
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def compare(results, baseline, stat, max_regression):
+    """Print deltas against the baseline; returns names that regressed past the limit"""
+    regressed = []
+    print(f'{"benchmark":20} {"baseline":>12} {"current":>12} {"change":>9}')
+    for name, result in results.items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            print(f'{name:20} {"-":>12} {format_seconds(result[stat]):>12} {"new":>9}')
+            continue
+        change = (result[stat] - base[stat]) / base[stat] * 100
+        flag = ''
+        if change > max_regression:
+            regressed.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:20} {format_seconds(base[stat]):>12} {format_seconds(result[stat]):>12} {change:+8.1f}%{flag}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for hot request-path helpers')
+    parser.add_argument('-k', '--filter', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.1, help='Minimum seconds per round')
+    parser.add_argument('--stat', choices=('min', 'median'), default='min', help='Statistic used for comparison')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='Compare with the baseline and fail on regressions')
+    parser.add_argument('--max-regression', type=float, default=15.0, help='Allowed slowdown in percent')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    ctx = Context()
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(setup(ctx), args.rounds, args.min_time)
+        if not args.json and not args.compare:
+            print(f'{name:20} min {format_seconds(results[name]["min"]):>10}  '
+                  f'median {format_seconds(results[name]["median"]):>10}  ({results[name]["loops"]} loops)')
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': f'{platform.system()} {platform.machine()}',
+                'recordedAt': datetime.utcnow().isoformat(timespec='seconds'),
+                'benchmarks': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.stat, args.max_regression)
+        if regressed:
+            print(f'{len(regressed)} benchmark(s) regressed more than {args.max_regression}%: {", ".join(regressed)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
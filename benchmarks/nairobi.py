@@ -0,0 +1,63 @@
+# SafeRide Backend - Synthetic Nairobi Geography
+# Weighted demand hotspots and time-of-day profile for load tests and seeding
+
+import math
+import random
+
+# (name, lat, lng, spread in degrees, relative demand)
+HOTSPOTS = (
+    ('CBD', -1.2864, 36.8172, 0.006, 10),
+    ('Westlands', -1.2676, 36.8108, 0.008, 8),
+    ('Kilimani', -1.2903, 36.7856, 0.008, 6),
+    ('Upper Hill', -1.2993, 36.8148, 0.005, 5),
+    ('Parklands', -1.2600, 36.8200, 0.007, 4),
+    ('Lavington', -1.2780, 36.7700, 0.008, 3),
+    ('Karen', -1.3194, 36.7073, 0.015, 3),
+    ('Eastleigh', -1.2740, 36.8510, 0.008, 5),
+    ('South B', -1.3100, 36.8350, 0.007, 3),
+    ('Embakasi', -1.3210, 36.8950, 0.012, 4),
+    ('JKIA', -1.3192, 36.9275, 0.004, 3),
+    ('Kasarani', -1.2210, 36.8970, 0.012, 3),
+    ('Ruaka', -1.2090, 36.7780, 0.008, 2),
+    ('Rongai', -1.3960, 36.7580, 0.012, 2),
+    ('Gigiri', -1.2330, 36.8040, 0.006, 2),
+)
+
+_WEIGHTS = [h[4] for h in HOTSPOTS]
+
+# Relative demand per hour of day (0-23): morning and evening peaks
+HOURLY_DEMAND = (
+    0.2, 0.1, 0.1, 0.1, 0.2, 0.5, 1.2, 2.2, 2.4, 1.5, 1.0, 1.0,
+    1.2, 1.1, 1.0, 1.1, 1.5, 2.3, 2.5, 1.8, 1.3, 1.0, 0.7, 0.4,
+)
+
+
+def random_point(rng=random):
+    """A (lat, lng, area) drawn around a weighted hotspot"""
+    name, lat, lng, spread, _ = rng.choices(HOTSPOTS, weights=_WEIGHTS)[0]
+    return round(rng.gauss(lat, spread), 6), round(rng.gauss(lng, spread), 6), name
+
+
+def random_trip(rng=random):
+    """Pickup and dropoff in different areas (most urban trips cross areas)"""
+    pickup = random_point(rng)
+    dropoff = random_point(rng)
+    while dropoff[2] == pickup[2] and rng.random() < 0.7:
+        dropoff = random_point(rng)
+    return pickup, dropoff
+
+
+def random_hour(rng=random):
+    return rng.choices(range(24), weights=HOURLY_DEMAND)[0]
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Haversine distance"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+def random_phone(index):
+    """Unique, valid Kenyan mobile number for a seeded user"""
+    return f'+2547{index % 100000000:08d}'
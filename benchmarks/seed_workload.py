@@ -0,0 +1,137 @@
+# SafeRide Backend - Load Test Data Seeder
+# Bulk-inserts passengers, drivers, trips and payments around Nairobi
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.nairobi import random_trip, random_hour, distance_km, random_phone
+from services.pricing import PRICING_KEYS
+
+PASSWORD = 'loadtest-password'
+EMAIL_DOMAIN = 'load.saferide.test'
+BATCH_SIZE = 10000
+
+VEHICLES = (('Toyota', 'Axio'), ('Toyota', 'Vitz'), ('Mazda', 'Demio'), ('Nissan', 'Note'), ('Honda', 'Fit'))
+
+
+def account_email(role, index):
+    """Email of a seeded account; the load test logs in with these"""
+    return f'{role}{index}@{EMAIL_DOMAIN}'
+
+
+def _insert(db, table, rows):
+    if rows:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def seed_users(db, User, Driver, passengers, drivers):
+    """Passengers, approved drivers with profiles, and one admin"""
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(PASSWORD)  # Hash once, reuse for every account
+    now = datetime.utcnow()
+
+    admin = {'id': 'u_load_admin', 'email': account_email('admin', 0), 'password_hash': password_hash,
+             'name': 'Load Admin', 'phone': None, 'role': 'admin', 'created_at': now, 'updated_at': now}
+    _insert(db, User.__table__, [admin])
+
+    for role, count, offset in (('passenger', passengers, 0), ('driver', drivers, passengers)):
+        for start in range(0, count, BATCH_SIZE):
+            users, profiles = [], []
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                user_id = f'u_load_{role[0]}{i}'
+                users.append({
+                    'id': user_id, 'email': account_email(role, i), 'password_hash': password_hash,
+                    'name': f'Load {role.title()} {i}', 'phone': random_phone(offset + i), 'role': role,
+                    'created_at': now, 'updated_at': now
+                })
+                if role == 'driver':
+                    make, model = random.choice(VEHICLES)
+                    profiles.append({
+                        'id': f'd_load_{i}', 'user_id': user_id, 'vehicle_make': make, 'vehicle_model': model,
+                        'vehicle_year': random.randint(2010, 2022), 'vehicle_plate': f'KD{chr(65 + i % 26)} {i % 1000:03d}',
+                        'vehicle_color': 'White', 'rating': 0, 'total_trips': 0, 'total_earnings': 0,
+                        'status': 'approved', 'is_online': False, 'created_at': now, 'updated_at': now
+                    })
+            _insert(db, User.__table__, users)
+            _insert(db, Driver.__table__, profiles)
+
+
+def seed_trips(db, Trip, Payment, passengers, drivers, trips, days, seed_payments=True):
+    """Trips spread over the last ``days`` days with rush-hour peaks; completed trips get payments"""
+    now = datetime.utcnow()
+    base_fare, per_km, minimum_fare = PRICING_KEYS['TRIP_BASE_FARE'], PRICING_KEYS['TRIP_RATE_PER_KM'], PRICING_KEYS['TRIP_MINIMUM_FARE']
+    inserted = 0
+    for start in range(0, trips, BATCH_SIZE):
+        trip_rows, payment_rows = [], []
+        for i in range(start, min(start + BATCH_SIZE, trips)):
+            pickup, dropoff = random_trip()
+            distance = distance_km(pickup[0], pickup[1], dropoff[0], dropoff[1]) * 1.3  # Road factor
+            fare = round(max(base_fare + distance * per_km, minimum_fare), 2)
+            day = now - timedelta(days=random.randint(0, days - 1))
+            created_at = day.replace(hour=random_hour(), minute=random.randint(0, 59), second=random.randint(0, 59))
+            if created_at > now:
+                created_at -= timedelta(days=1)
+            roll = random.random()
+            status = 'completed' if roll < 0.85 else 'cancelled' if roll < 0.95 else 'requested'
+            driver_id = f'u_load_d{random.randrange(drivers)}' if status == 'completed' and drivers else None
+            duration = max(int(distance / 25 * 60), 3)
+            trip_id = f't_load_{i}'
+            trip_rows.append({
+                'id': trip_id, 'passenger_id': f'u_load_p{random.randrange(passengers)}', 'driver_id': driver_id,
+                'pickup_lat': pickup[0], 'pickup_lng': pickup[1], 'pickup_address': f'{pickup[2]}, Nairobi',
+                'dropoff_lat': dropoff[0], 'dropoff_lng': dropoff[1], 'dropoff_address': f'{dropoff[2]}, Nairobi',
+                'status': status, 'fare': fare, 'distance': round(distance, 2), 'duration': duration,
+                'payment_status': 'paid' if status == 'completed' else 'pending',
+                'created_at': created_at,
+                'accepted_at': created_at + timedelta(minutes=2) if driver_id else None,
+                'started_at': created_at + timedelta(minutes=8) if driver_id else None,
+                'completed_at': created_at + timedelta(minutes=8 + duration) if driver_id else None,
+            })
+            if seed_payments and status == 'completed':
+                payment_rows.append({
+                    'id': f'p_load_{i}', 'trip_id': trip_id, 'amount': fare, 'phone': random_phone(i),
+                    'checkout_request_id': f'ws_CO_load_{i}', 'mpesa_receipt_number': f'LOAD{i:08d}',
+                    'status': 'paid', 'created_at': created_at + timedelta(minutes=9 + duration)
+                })
+        _insert(db, Trip.__table__, trip_rows)
+        _insert(db, Payment.__table__, payment_rows)
+        inserted += len(trip_rows)
+        print(f'  trips {inserted}/{trips}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a database with synthetic Nairobi load-test data')
+    parser.add_argument('--passengers', type=int, default=10000)
+    parser.add_argument('--drivers', type=int, default=1000)
+    parser.add_argument('--trips', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=90, help='Spread trips over this many days')
+    parser.add_argument('--no-payments', action='store_true')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    from app import create_app
+    from commands import init_db
+    from models import db, User, Driver, Trip, Payment
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        if User.query.filter_by(email=account_email('admin', 0)).first():
+            sys.exit('Load-test data already present; use a fresh DATABASE_URL')
+        started = time.perf_counter()
+        seed_users(db, User, Driver, args.passengers, args.drivers)
+        seed_trips(db, Trip, Payment, args.passengers, args.drivers, args.trips, args.days, not args.no_payments)
+        print(f'Seeded {args.passengers} passengers, {args.drivers} drivers and {args.trips} trips '
+              f'in {time.perf_counter() - started:.1f}s ({app.config["SQLALCHEMY_DATABASE_URI"]})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# SafeRide Backend - Management Commands
+# Explicit schema migrations and seeding, run once per deploy instead of per worker
+
+import json
+import click
+
+
+def seed_if_empty():
+    """Seed initial configuration data when the config table is empty"""
+    from models import Config
+    if Config.query.count() == 0:
+        from seed_config import run_seeds
+        run_seeds()
+        return True
+    return False
+
+
+def init_db():
+    """Apply pending migrations and seed configuration"""
+    from services import migrations
+    migrations.upgrade()
+    seed_if_empty()
+
+
+def register_commands(app):
+    """Register management commands on the Flask CLI"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Migrate the schema and seed configuration (run once per deploy)"""
+        init_db()
+        click.echo('Database initialized')
+
+    @app.cli.command('seed')
+    def seed_command():
+        """Seed configuration data if the config table is empty"""
+        if seed_if_empty():
+            click.echo('Configuration seeded')
+        else:
+            click.echo('Configuration already present')
+
+    @app.cli.command('db-upgrade')
+    @click.option('--dry-run', is_flag=True, help='Print the plan and estimated lock times without applying it')
+    def db_upgrade_command(dry_run):
+        """Apply pending schema migrations"""
+        from services import migrations
+        try:
+            report = migrations.upgrade(dry_run=dry_run)
+        except migrations.MigrationLockError as e:
+            raise click.ClickException(str(e))
+        click.echo(json.dumps(report, indent=2))
+
+    @app.cli.command('db-status')
+    def db_status_command():
+        """List applied and pending schema migrations"""
+        from services import migrations
+        for entry in migrations.status():
+            click.echo(f"{'applied' if entry['applied'] else 'pending':8} {entry['name']}")
+
+    @app.cli.command('jobs-worker')
+    @click.option('--queues', default='default,payouts', help='Comma-separated queues to poll')
+    @click.option('--processes', default=1, help='Worker processes to fork')
+    @click.option('--concurrency', default=1, help='Threads per worker process')
+    @click.option('--poll-interval', default=1.0, help='Seconds between polls when the queue is empty')
+    def jobs_worker_command(queues, processes, concurrency, poll_interval):
+        """Run background job workers until stopped (SIGTERM finishes running jobs first)"""
+        from services import jobs
+        jobs.run_workers(
+            app,
+            processes=processes,
+            queues=[q.strip() for q in queues.split(',') if q.strip()],
+            concurrency=concurrency,
+            poll_interval=poll_interval,
+            visibility_timeout=app.config['JOBS_VISIBILITY_TIMEOUT'],
+            retention_days=app.config['JOBS_RETENTION_DAYS']
+        )
+
+    @app.cli.command('jobs-status')
+    def jobs_status_command():
+        """Show queued, running and dead jobs per queue"""
+        from services import jobs
+        click.echo(json.dumps(jobs.backlog(), indent=2))
+
+    @app.cli.command('expire-stale')
+    def expire_stale_command():
+        """Expire stale trip requests and pending payments once (workers also run this periodically)"""
+        from services import expiry
+        click.echo(json.dumps(expiry.sweep(app.config), indent=2))
+
+    @app.cli.command('archive-trips')
+    @click.option('--days', default=None, type=int, help='Archive finished trips older than this (default ARCHIVE_AFTER_DAYS)')
+    @click.option('--batch-size', default=None, type=int, help='Trips moved per transaction')
+    @click.option('--export-dir', default=None, help='Also append archived rows to gzipped NDJSON files here')
+    def archive_trips_command(days, batch_size, export_dir):
+        """Move finished trips out of the hot tables (workers also run this periodically)"""
+        from services import archive
+        moved = archive.archive_trips(
+            days if days is not None else app.config['ARCHIVE_AFTER_DAYS'],
+            batch_size or app.config['ARCHIVE_BATCH_SIZE'],
+            export_dir or app.config['ARCHIVE_EXPORT_DIR']
+        )
+        click.echo(json.dumps(dict(archive.sizes(), moved=moved), indent=2))
+
+    @app.cli.command('eta-build')
+    def eta_build_command():
+        """Relearn the ETA speed grid from completed trips (workers also run this periodically)"""
+        from services import eta
+        config = app.config
+        click.echo(json.dumps(eta.build(config['ETA_CELL_DEGREES'], config['ETA_COARSE_CELL_DEGREES'],
+                                        config['ETA_MIN_SAMPLES'], config['ETA_HISTORY_DAYS']), indent=2))
+
+    @app.cli.command('eta-report')
+    @click.option('--holdout', default=0.1, help='Fraction of trips held out for evaluation')
+    def eta_report_command(holdout):
+        """Accuracy of the ETA grid on held-out trips, against the single average speed"""
+        from services import eta
+        from services.pricing import pricing
+        config = app.config
+        click.echo(json.dumps(eta.evaluate(config['ETA_CELL_DEGREES'], config['ETA_COARSE_CELL_DEGREES'],
+                                           pricing.config()['TRIP_AVERAGE_SPEED'], config['ETA_MIN_SAMPLES'],
+                                           config['ETA_HISTORY_DAYS'], holdout), indent=2))
+
+    @app.cli.command('outbox-relay')
+    @click.option('--batch-size', default=100, help='Events published per transaction')
+    @click.option('--poll-interval', default=0.2, help='Seconds between polls when the outbox is empty')
+    @click.option('--once', is_flag=True, help='Publish pending events and exit')
+    def outbox_relay_command(batch_size, poll_interval, once):
+        """Publish outbox events to subscribers and the broker until stopped"""
+        from services.outbox import Relay
+        relay = Relay(app, batch_size=batch_size, poll_interval=poll_interval,
+                      retention_days=app.config['OUTBOX_RETENTION_DAYS'])
+        if once:
+            click.echo(f'Published {relay.run_once()} event(s)')
+            return
+        relay.run()
@@ -0,0 +1,75 @@
+# SafeRide Backend - Gunicorn Configuration
+# Usage: gunicorn -c gunicorn.conf.py app:app
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5002')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+# Build the app once in the master and fork it into workers, so a worker
+# respawn costs a fork instead of a full import and app build. Schema
+# changes and seeding run separately via `flask --app app init-db`.
+preload_app = True
+
+# Worker profiles (GUNICORN_WORKER_CLASS):
+#   sync    - one request per worker; only for CPU-bound work
+#   gthread - GUNICORN_THREADS requests per worker; default, suits DB and M-Pesa waits
+#   gevent  - GUNICORN_WORKER_CONNECTIONS greenlets per worker (pip install gevent)
+worker_profile = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_profile == 'sync':
+    worker_class = 'sync'
+    workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+elif worker_profile == 'gevent':
+    worker_class = 'gevent'
+    workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+    # Workers must monkey-patch before the app (and its locks) are imported
+    preload_app = False
+else:
+    worker_class = 'gthread'
+    workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+    # Each thread may hold a connection; size the pool so threads never queue for one
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Cache invalidations (including those from the jobs worker) only reach other
+# processes through the shared tier
+if workers > 1 and os.environ.get('CACHE_ENABLED', '').lower() == 'true' and not os.environ.get('CACHE_REDIS_URL'):
+    raise RuntimeError('CACHE_ENABLED with more than one worker requires CACHE_REDIS_URL')
+
+# Each worker keeps its own metrics; /metrics merges the snapshots in METRICS_DIR,
+# so without one a scrape would see whichever worker answered. Set before the app
+# loads (in the master, or in each worker without preload) so every process shares it.
+metrics_tempdir = None
+if not os.environ.get('METRICS_DIR'):
+    metrics_tempdir = os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='saferide-metrics-')
+
+
+def on_starting(server):
+    """Start metrics from zero: drop snapshot files left by the previous run"""
+    directory = os.environ.get('METRICS_DIR')
+    if directory and os.path.isdir(directory):
+        from services.metrics import MultiProcessStore
+        MultiProcessStore(directory).clear()
+
+
+def on_exit(server):
+    """Remove the metrics directory created for this run"""
+    if metrics_tempdir:
+        shutil.rmtree(metrics_tempdir, ignore_errors=True)
+
+
+def post_fork(server, worker):
+    """Drop any pooled connections inherited from the master"""
+    if not preload_app:
+        return
+    from models import db
+    from app import app
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,116 @@
+# Baseline schema: the tables as they stood before versioned migrations
+# (a snapshot, not the models, so every later migration applies its own change)
+
+from sqlalchemy import MetaData, Table, Column, Index, ForeignKey, String, Text, Integer, Float, Numeric, Boolean, DateTime
+
+description = 'Baseline schema'
+
+metadata = MetaData()
+
+users = Table(
+    'users', metadata,
+    Column('id', String(50), primary_key=True),
+    Column('email', String(255), nullable=False),
+    Column('password_hash', String(255), nullable=False),
+    Column('name', String(255), nullable=False),
+    Column('phone', String(20)),
+    Column('role', String(20), nullable=False),
+    Column('is_online', Boolean),
+    Column('last_seen', DateTime),
+    Column('created_at', DateTime),
+    Index('ix_users_email', 'email', unique=True),
+    Index('ix_users_phone', 'phone', unique=True),
+    Index('ix_users_name', 'name'),
+    Index('ix_users_role', 'role'),
+    Index('ix_users_created_at', 'created_at'),
+)
+
+config = Table(
+    'config', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('key', String(100), nullable=False, unique=True),
+    Column('value', Text, nullable=False),
+    Column('created_at', DateTime),
+)
+
+drivers = Table(
+    'drivers', metadata,
+    Column('id', String(50), primary_key=True),
+    Column('user_id', String(50), ForeignKey('users.id'), nullable=False, unique=True),
+    Column('vehicle_make', String(100)),
+    Column('vehicle_model', String(100)),
+    Column('vehicle_year', Integer),
+    Column('vehicle_plate', String(50)),
+    Column('vehicle_color', String(50)),
+    Column('document_id_card', String(500)),
+    Column('document_license', String(500)),
+    Column('document_insurance', String(500)),
+    Column('document_logbook', String(500)),
+    Column('rating', Numeric(3, 2)),
+    Column('total_trips', Integer),
+    Column('total_earnings', Numeric(10, 2)),
+    Column('status', String(20), nullable=False),
+    Column('is_online', Boolean),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    Index('ix_drivers_status', 'status'),
+    Index('ix_drivers_is_online', 'is_online'),
+)
+
+trips = Table(
+    'trips', metadata,
+    Column('id', String(50), primary_key=True),
+    Column('passenger_id', String(50), ForeignKey('users.id'), nullable=False),
+    Column('driver_id', String(50), ForeignKey('users.id')),
+    Column('pickup_lat', Numeric(10, 8), nullable=False),
+    Column('pickup_lng', Numeric(11, 8), nullable=False),
+    Column('pickup_address', String(500), nullable=False),
+    Column('dropoff_lat', Numeric(10, 8), nullable=False),
+    Column('dropoff_lng', Numeric(11, 8), nullable=False),
+    Column('dropoff_address', String(500), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('fare', Numeric(10, 2), nullable=False),
+    Column('distance', Numeric(10, 2), nullable=False),
+    Column('duration', Integer, nullable=False),
+    Column('payment_status', String(20), nullable=False),
+    Column('rating', Integer),
+    Column('feedback', Text),
+    Column('created_at', DateTime),
+    Column('accepted_at', DateTime),
+    Column('started_at', DateTime),
+    Column('completed_at', DateTime),
+    Index('ix_trips_status', 'status'),
+    Index('ix_trips_payment_status', 'payment_status'),
+)
+
+ratings = Table(
+    'ratings', metadata,
+    Column('id', String(50), primary_key=True),
+    Column('trip_id', String(50), ForeignKey('trips.id'), nullable=False, unique=True),
+    Column('passenger_rating', Integer),
+    Column('driver_rating', Integer),
+    Column('passenger_feedback', Text),
+    Column('driver_feedback', Text),
+    Column('cleanliness_rating', Integer),
+    Column('punctuality_rating', Integer),
+    Column('communication_rating', Integer),
+    Column('safety_rating', Integer),
+    Column('created_at', DateTime),
+)
+
+payments = Table(
+    'payments', metadata,
+    Column('id', String(36), primary_key=True),
+    Column('trip_id', String(50), ForeignKey('trips.id'), nullable=False),
+    Column('amount', Float, nullable=False),
+    Column('phone', String(20), nullable=False),
+    Column('checkout_request_id', String(100)),
+    Column('mpesa_receipt_number', String(50)),
+    Column('status', String(20)),
+    Column('created_at', DateTime),
+)
+
+
+def upgrade(op):
+    for table in metadata.sorted_tables:
+        op.create_table(table)
@@ -0,0 +1,8 @@
+# Contract: users.is_online / users.last_seen were replaced by in-memory presence tracking
+
+description = 'Drop legacy users.is_online and users.last_seen'
+
+
+def upgrade(op):
+    op.drop_column('users', 'is_online')
+    op.drop_column('users', 'last_seen')
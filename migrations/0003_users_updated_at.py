@@ -0,0 +1,8 @@
+# Expand: users.updated_at backs profile ETags
+
+description = 'Add users.updated_at and backfill from created_at'
+
+
+def upgrade(op):
+    op.add_column('users', 'updated_at', 'TIMESTAMP')
+    op.backfill('users', 'updated_at = created_at', 'updated_at IS NULL', batch_size=5000)
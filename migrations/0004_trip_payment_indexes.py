@@ -0,0 +1,11 @@
+# Indexes for the driver feed, trip history, earnings and payment lookups
+
+description = 'Add trip and payment indexes'
+
+
+def upgrade(op):
+    op.create_index('ix_trips_status_created_at', 'trips', ['status', 'created_at'])
+    op.create_index('ix_trips_driver_id_status', 'trips', ['driver_id', 'status'])
+    op.create_index('ix_trips_passenger_id_created_at', 'trips', ['passenger_id', 'created_at'])
+    op.create_index('ix_payments_trip_id_status', 'payments', ['trip_id', 'status'])
+    op.create_index('ix_payments_checkout_request_id', 'payments', ['checkout_request_id'])
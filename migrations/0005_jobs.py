@@ -0,0 +1,32 @@
+# Durable background job queue
+
+from sqlalchemy import MetaData, Table, Column, Index, String, Text, Integer, DateTime
+
+description = 'Add jobs table'
+
+metadata = MetaData()
+
+jobs = Table(
+    'jobs', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('queue', String(50), nullable=False),
+    Column('name', String(100), nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('priority', Integer, nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('run_at', DateTime, nullable=False),
+    Column('attempts', Integer, nullable=False),
+    Column('max_attempts', Integer, nullable=False),
+    Column('locked_by', String(100)),
+    Column('locked_at', DateTime),
+    Column('last_error', Text),
+    Column('created_at', DateTime),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime),
+    Index('ix_jobs_claim', 'queue', 'status', 'priority', 'run_at'),
+    Index('ix_jobs_status_locked_at', 'status', 'locked_at'),
+)
+
+
+def upgrade(op):
+    op.create_table(jobs)
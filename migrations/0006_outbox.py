@@ -0,0 +1,23 @@
+# Transactional outbox for trip and payment events
+
+from sqlalchemy import MetaData, Table, Column, Index, String, Text, Integer, DateTime
+
+description = 'Add outbox_events table'
+
+metadata = MetaData()
+
+outbox_events = Table(
+    'outbox_events', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('topic', String(100), nullable=False),
+    Column('aggregate_type', String(50), nullable=False),
+    Column('aggregate_id', String(50), nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('created_at', DateTime, nullable=False),
+    Column('published_at', DateTime),
+    Index('ix_outbox_events_published_at_id', 'published_at', 'id'),
+)
+
+
+def upgrade(op):
+    op.create_table(outbox_events)
@@ -0,0 +1,28 @@
+# Trip state machine: arrival and cancellation timestamps, transition log
+
+from sqlalchemy import MetaData, Table, Column, Index, ForeignKey, String, Integer, DateTime
+
+description = 'Add trips.arrived_at, trips.cancelled_at and trip_transitions table'
+
+metadata = MetaData()
+
+# Only the referenced key, so the foreign key below resolves
+Table('trips', metadata, Column('id', String(50), primary_key=True))
+
+trip_transitions = Table(
+    'trip_transitions', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('trip_id', String(50), ForeignKey('trips.id'), nullable=False),
+    Column('from_status', String(20), nullable=False),
+    Column('to_status', String(20), nullable=False),
+    Column('actor_id', String(50)),
+    Column('reason', String(500)),
+    Column('created_at', DateTime, nullable=False),
+    Index('ix_trip_transitions_trip_id_id', 'trip_id', 'id'),
+)
+
+
+def upgrade(op):
+    op.add_column('trips', 'arrived_at', 'TIMESTAMP')
+    op.add_column('trips', 'cancelled_at', 'TIMESTAMP')
+    op.create_table(trip_transitions)
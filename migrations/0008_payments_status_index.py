@@ -0,0 +1,7 @@
+# Index for the expiry sweeper's pending-payment scan
+
+description = 'Add payments (status, created_at) index'
+
+
+def upgrade(op):
+    op.create_index('ix_payments_status_created_at', 'payments', ['status', 'created_at'])
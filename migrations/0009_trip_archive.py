@@ -0,0 +1,8 @@
+# Cold storage for finished trips and their payments, transitions and ratings
+
+description = 'Add trips_archive (month-partitioned on Postgres) and child archive tables'
+
+
+def upgrade(op):
+    from services import archive
+    archive.create_tables(op)
@@ -0,0 +1,22 @@
+# Precomputed speed grid for trip ETAs
+
+from sqlalchemy import MetaData, Table, Column, SmallInteger, BigInteger, Integer, Float, DateTime
+
+description = 'Add eta_speeds table'
+
+metadata = MetaData()
+
+eta_speeds = Table(
+    'eta_speeds', metadata,
+    Column('level', SmallInteger, primary_key=True, autoincrement=False),
+    Column('origin_cell', BigInteger, primary_key=True, autoincrement=False),  # 0 above level 1
+    Column('dest_cell', BigInteger, primary_key=True, autoincrement=False),    # 0 above level 1
+    Column('hour_of_week', SmallInteger, primary_key=True, autoincrement=False),
+    Column('speed_kmh', Float, nullable=False),
+    Column('samples', Integer, nullable=False),
+    Column('built_at', DateTime, nullable=False),
+)
+
+
+def upgrade(op):
+    op.create_table(eta_speeds)
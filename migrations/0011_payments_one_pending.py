@@ -0,0 +1,14 @@
+# At most one pending payment per trip, so concurrent initiates cannot both send an STK push
+
+description = 'Add partial unique index on payments (trip_id) WHERE status = pending'
+
+
+def upgrade(op):
+    # Older duplicates would block the index; keep the newest pending attempt per trip
+    op.execute(
+        "UPDATE payments SET status = 'expired' WHERE status = 'pending' AND id NOT IN "
+        "(SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY trip_id ORDER BY created_at DESC) AS n "
+        "FROM payments WHERE status = 'pending') ranked WHERE n = 1)",
+        table='payments', lock='ROW'
+    )
+    op.create_index('ux_payments_trip_id_pending', 'payments', ['trip_id'], unique=True, where="status = 'pending'")
@@ -0,0 +1,28 @@
+# Idempotency keys in the database, so retries are deduplicated across workers
+
+from sqlalchemy import MetaData, Table, Column, Index, UniqueConstraint, String, Text, Integer, LargeBinary, DateTime
+
+description = 'Add idempotency_keys table'
+
+metadata = MetaData()
+
+idempotency_keys = Table(
+    'idempotency_keys', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('user_id', String(50), nullable=False),
+    Column('key_hash', String(64), nullable=False),
+    Column('fingerprint', String(64), nullable=False),
+    Column('lock_token', String(32)),
+    Column('locked_until', DateTime),
+    Column('status_code', Integer),
+    Column('body', LargeBinary),
+    Column('headers', Text),
+    Column('created_at', DateTime, nullable=False),
+    Column('expires_at', DateTime, nullable=False),
+    UniqueConstraint('user_id', 'key_hash', name='uq_idempotency_keys_user_id_key_hash'),
+    Index('ix_idempotency_keys_expires_at', 'expires_at'),
+)
+
+
+def upgrade(op):
+    op.create_table(idempotency_keys)
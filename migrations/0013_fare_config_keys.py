@@ -0,0 +1,27 @@
+# Fare settings under the TRIP_* keys the pricing engine reads
+
+description = 'Insert missing TRIP_* fare config keys and drop the unused lowercase ones'
+
+# The values fares were already computed with while the keys were absent
+FARE_KEYS = (
+    ('TRIP_BASE_FARE', '200.0'),
+    ('TRIP_RATE_PER_KM', '50.0'),
+    ('TRIP_MINIMUM_FARE', '100.0'),
+    ('TRIP_AVERAGE_SPEED', '30.0'),
+)
+
+# Seeded by earlier releases but never read by any code
+UNUSED_KEYS = ('base_fare', 'per_km_rate', 'minimum_fare')
+
+
+def upgrade(op):
+    import uuid
+    for key, value in FARE_KEYS:
+        op.execute(
+            f"INSERT INTO config (id, \"key\", value, created_at) "
+            f"SELECT '{uuid.uuid4()}', '{key}', '{value}', CURRENT_TIMESTAMP "
+            f"WHERE NOT EXISTS (SELECT 1 FROM config WHERE \"key\" = '{key}')",
+            table='config', lock='ROW'
+        )
+    keys = ', '.join(f"'{key}'" for key in UNUSED_KEYS)
+    op.execute(f'DELETE FROM config WHERE "key" IN ({keys})', table='config', lock='ROW')
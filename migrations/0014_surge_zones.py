@@ -0,0 +1,23 @@
+# Driver locations in the database and one published set of surge multipliers
+
+from sqlalchemy import MetaData, Table, Column, BigInteger, Integer, Float, DateTime
+
+description = 'Add driver location columns and surge_zones table'
+
+metadata = MetaData()
+
+surge_zones = Table(
+    'surge_zones', metadata,
+    Column('zone', BigInteger, primary_key=True, autoincrement=False),
+    Column('multiplier', Float, nullable=False),
+    Column('open_trips', Integer, nullable=False),
+    Column('idle_drivers', Integer, nullable=False),
+    Column('built_at', DateTime, nullable=False),
+)
+
+
+def upgrade(op):
+    op.add_column('drivers', 'last_lat', 'FLOAT')
+    op.add_column('drivers', 'last_lng', 'FLOAT')
+    op.add_column('drivers', 'located_at', 'TIMESTAMP')
+    op.create_table(surge_zones)
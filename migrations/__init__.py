@@ -0,0 +1 @@
+# Versioned schema migrations - applied in filename order by services/migrations.py
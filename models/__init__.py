@@ -0,0 +1,76 @@
+# SafeRide Backend - Database Models
+# SQLAlchemy models for ride-sharing application (one module per model, re-exported here)
+
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+import uuid
+
+# Initialize SQLAlchemy instance (model modules import it with ``from . import db``)
+db = SQLAlchemy()
+
+from .user import User  # noqa: E402
+from .driver import Driver  # noqa: E402
+from .trip import Trip  # noqa: E402
+from .rating import Rating  # noqa: E402
+from .job import Job  # noqa: E402
+from .outbox import OutboxEvent  # noqa: E402
+from .trip_transition import TripTransition  # noqa: E402
+from .eta_speed import EtaSpeed  # noqa: E402
+from .idempotency_key import IdempotencyKey  # noqa: E402
+from .surge_zone import SurgeZone  # noqa: E402
+
+
+class Payment(db.Model):
+    """Payment model for M-Pesa transactions"""
+    __tablename__ = 'payments'
+    __table_args__ = (
+        # At most one payment in flight per trip: concurrent initiates cannot both push
+        db.Index('ux_payments_trip_id_pending', 'trip_id', unique=True,
+                 sqlite_where=db.text("status = 'pending'"), postgresql_where=db.text("status = 'pending'")),
+    )
+    
+    # Primary key
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # Foreign key to Trip
+    trip_id = db.Column(db.String(50), db.ForeignKey('trips.id'), nullable=False)
+    # Payment details
+    amount = db.Column(db.Float, nullable=False)         # Payment amount
+    phone = db.Column(db.String(20), nullable=False)     # M-Pesa phone number
+    # M-Pesa transaction details
+    checkout_request_id = db.Column(db.String(100))      # M-Pesa STK push ID
+    mpesa_receipt_number = db.Column(db.String(50))      # M-Pesa receipt number
+    status = db.Column(db.String(20), default='pending') # pending, paid, failed, expired, duplicate
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationship to Trip model
+    trip = db.relationship('Trip', backref='payments')
+    
+    def to_dict(self):
+        """Convert payment object to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'tripId': self.trip_id,
+            'amount': self.amount,
+            'phone': self.phone,
+            'status': self.status,
+            'createdAt': self.created_at.isoformat() if self.created_at else None
+        }
+
+class Config(db.Model):
+    """Configuration model for dynamic app settings"""
+    __tablename__ = 'config'
+    
+    # Primary key
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # Configuration key-value pairs
+    key = db.Column(db.String(100), unique=True, nullable=False)  # Configuration key
+    value = db.Column(db.Text, nullable=False)                    # Configuration value
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert config object to dictionary for JSON serialization"""
+        return {
+            'id': self.id,
+            'key': self.key,
+            'value': self.value
+        }
@@ -30,6 +30,11 @@ class Driver(db.Model):
     status = db.Column(db.String(20), default='pending', nullable=False, index=True)  # pending, approved, suspended
     is_online = db.Column(db.Boolean, default=False, index=True)
     
+    # Last location ping, shared by every worker (surge supply)
+    last_lat = db.Column(db.Float)
+    last_lng = db.Column(db.Float)
+    located_at = db.Column(db.DateTime)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -0,0 +1,27 @@
+from . import db
+from datetime import datetime
+
+class EtaSpeed(db.Model):
+    __tablename__ = 'eta_speeds'
+
+    # level 0: (origin cell, destination cell, hour of week) on the fine grid
+    # level 1: the same on the coarse grid; level 2: hour of week only; level 3: overall
+    level = db.Column(db.SmallInteger, primary_key=True)
+    origin_cell = db.Column(db.BigInteger, primary_key=True)  # 0 above level 1
+    dest_cell = db.Column(db.BigInteger, primary_key=True)    # 0 above level 1
+    hour_of_week = db.Column(db.SmallInteger, primary_key=True)  # 0-167 from Monday 00:00 UTC; 0 at level 3
+    speed_kmh = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'level': self.level,
+            'originCell': self.origin_cell,
+            'destCell': self.dest_cell,
+            'hourOfWeek': self.hour_of_week,
+            'speedKmh': self.speed_kmh,
+            'samples': self.samples,
+            'builtAt': self.built_at.isoformat() if self.built_at else None
+        }
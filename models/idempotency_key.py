@@ -0,0 +1,25 @@
+from . import db
+from datetime import datetime
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        # One row per user and key: the insert that wins is the request that runs
+        db.UniqueConstraint('user_id', 'key_hash', name='uq_idempotency_keys_user_id_key_hash'),
+        # Purge of expired keys
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(50), nullable=False)
+    key_hash = db.Column(db.String(64), nullable=False)     # SHA-256 of the Idempotency-Key header
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    # In flight until status_code is set; lock_token identifies the request holding it
+    lock_token = db.Column(db.String(32))
+    locked_until = db.Column(db.DateTime)
+    # Stored response
+    status_code = db.Column(db.Integer)
+    body = db.Column(db.LargeBinary)
+    headers = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
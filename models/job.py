@@ -0,0 +1,48 @@
+from . import db
+from datetime import datetime
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Claim query: next runnable jobs per queue by priority
+        db.Index('ix_jobs_claim', 'queue', 'status', 'priority', 'run_at'),
+        # Recovery of jobs whose worker died
+        db.Index('ix_jobs_status_locked_at', 'status', 'locked_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    name = db.Column(db.String(100), nullable=False)  # Registered task name
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+
+    # Scheduling
+    priority = db.Column(db.Integer, nullable=False, default=5)  # Lower runs first
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, dead
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+
+    # Worker lease
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'queue': self.queue,
+            'name': self.name,
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'maxAttempts': self.max_attempts,
+            'runAt': self.run_at.isoformat() if self.run_at else None,
+            'lastError': self.last_error,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,29 @@
+from . import db
+from datetime import datetime
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # Relay scan: unpublished events in commit order
+        db.Index('ix_outbox_events_published_at_id', 'published_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # Publish order
+    topic = db.Column(db.String(100), nullable=False)  # e.g. trip.accepted, payment.paid
+    aggregate_type = db.Column(db.String(50), nullable=False)  # trip, payment
+    aggregate_id = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    published_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'aggregateType': self.aggregate_type,
+            'aggregateId': self.aggregate_id,
+            'payload': self.payload,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'publishedAt': self.published_at.isoformat() if self.published_at else None
+        }
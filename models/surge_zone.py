@@ -0,0 +1,22 @@
+from . import db
+from datetime import datetime
+
+class SurgeZone(db.Model):
+    __tablename__ = 'surge_zones'
+
+    # One row per zone with open requests, idle drivers or surge, replaced on every tick
+    zone = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # services.geo.cell_id
+    multiplier = db.Column(db.Float, nullable=False)
+    open_trips = db.Column(db.Integer, nullable=False)
+    idle_drivers = db.Column(db.Integer, nullable=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'zone': self.zone,
+            'multiplier': self.multiplier,
+            'openTrips': self.open_trips,
+            'idleDrivers': self.idle_drivers,
+            'builtAt': self.built_at.isoformat() if self.built_at else None
+        }
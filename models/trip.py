@@ -4,6 +4,13 @@ import uuid
 
 class Trip(db.Model):
     __tablename__ = 'trips'
+    __table_args__ = (
+        # Serves the driver feed: status filter ordered by newest first
+        db.Index('ix_trips_status_created_at', 'status', 'created_at'),
+        # Driver earnings and history, passenger history
+        db.Index('ix_trips_driver_id_status', 'driver_id', 'status'),
+        db.Index('ix_trips_passenger_id_created_at', 'passenger_id', 'created_at'),
+    )
     
     id = db.Column(db.String(50), primary_key=True, default=lambda: f't_{uuid.uuid4().hex[:12]}')
     passenger_id = db.Column(db.String(50), db.ForeignKey('users.id'), nullable=False)
@@ -20,7 +27,7 @@ class Trip(db.Model):
     dropoff_address = db.Column(db.String(500), nullable=False)
     
     # Trip details
-    status = db.Column(db.String(20), default='requested', nullable=False, index=True)  # Add index for filtering
+    status = db.Column(db.String(20), default='requested', nullable=False, index=True)  # requested, accepted, arrived, driving, completed, cancelled
     fare = db.Column(db.Numeric(10, 2), nullable=False)
     distance = db.Column(db.Numeric(10, 2), nullable=False)  # km
     duration = db.Column(db.Integer, nullable=False)  # minutes
@@ -35,8 +42,10 @@ class Trip(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     accepted_at = db.Column(db.DateTime)
+    arrived_at = db.Column(db.DateTime)
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
+    cancelled_at = db.Column(db.DateTime)
     
     # Relationships
     passenger = db.relationship('User', foreign_keys=[passenger_id])
@@ -67,6 +76,8 @@ class Trip(db.Model):
             'feedback': self.feedback,
             'createdAt': self.created_at.isoformat(),
             'acceptedAt': self.accepted_at.isoformat() if self.accepted_at else None,
+            'arrivedAt': self.arrived_at.isoformat() if self.arrived_at else None,
             'startedAt': self.started_at.isoformat() if self.started_at else None,
-            'completedAt': self.completed_at.isoformat() if self.completed_at else None
+            'completedAt': self.completed_at.isoformat() if self.completed_at else None,
+            'cancelledAt': self.cancelled_at.isoformat() if self.cancelled_at else None
         }
\ No newline at end of file
@@ -0,0 +1,29 @@
+from . import db
+from datetime import datetime
+
+class TripTransition(db.Model):
+    __tablename__ = 'trip_transitions'
+    __table_args__ = (
+        # A trip's history in order
+        db.Index('ix_trip_transitions_trip_id_id', 'trip_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    trip_id = db.Column(db.String(50), db.ForeignKey('trips.id'), nullable=False)
+    from_status = db.Column(db.String(20), nullable=False)
+    to_status = db.Column(db.String(20), nullable=False)
+    actor_id = db.Column(db.String(50))  # User who made the change; NULL for system changes
+    reason = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'tripId': self.trip_id,
+            'from': self.from_status,
+            'to': self.to_status,
+            'actorId': self.actor_id,
+            'reason': self.reason,
+            'createdAt': self.created_at.isoformat() if self.created_at else None
+        }
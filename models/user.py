@@ -13,6 +13,7 @@ class User(db.Model):
     phone = db.Column(db.String(20), unique=True, nullable=True, index=True)
     role = db.Column(db.String(20), nullable=False, index=True)  # passenger, driver, admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def set_password(self, password):
         """Hash and set password"""
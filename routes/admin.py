@@ -1,9 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User, Driver, Trip, Payment
+from models import User, Driver, Trip, Payment, Job
 from models import db
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, select, case, and_
+from services.presence import presence
+from services.profiler import profiler
+from services.cache import cache
+from services.replicas import use_replica
+from services.trip_states import ACTIVE_STATUSES
+from services import archive
+from services.serializers import driver_serializer, trip_serializer, payment_serializer, json_response
+import json
+import math
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -15,6 +24,7 @@ def admin_required():
 
 @admin_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_dashboard_stats():
     """Get admin dashboard statistics"""
     try:
@@ -37,11 +47,15 @@ def get_dashboard_stats():
         pending_drivers = Driver.query.filter_by(status='pending').count()
         online_drivers = Driver.query.filter_by(status='approved', is_online=True).count()
         
-        # Trip stats
-        total_trips = Trip.query.count()
-        completed_trips = Trip.query.filter_by(status='completed').count()
+        # Trip stats (totals include archived trips)
+        total_trips, completed_trips, total_revenue = archive.count_across(lambda tier: select(
+            func.count(),
+            func.sum(case((tier.trips.c.status == 'completed', 1), else_=0)),
+            func.sum(case((and_(tier.trips.c.status == 'completed', tier.trips.c.payment_status == 'paid'),
+                           tier.trips.c.fare), else_=0))
+        ).select_from(tier.trips))
         active_trips = Trip.query.filter(
-            Trip.status.in_(['requested', 'accepted', 'driving'])
+            Trip.status.in_(ACTIVE_STATUSES)
         ).count()
         
         # Today's trips
@@ -49,11 +63,6 @@ def get_dashboard_stats():
         today_trips = Trip.query.filter(Trip.created_at >= today_start).count()
         
         # Revenue stats
-        total_revenue = db.session.query(func.sum(Trip.fare)).filter(
-            Trip.status == 'completed',
-            Trip.payment_status == 'paid'
-        ).scalar() or 0
-        
         today_revenue = db.session.query(func.sum(Trip.fare)).filter(
             Trip.status == 'completed',
             Trip.payment_status == 'paid',
@@ -98,6 +107,7 @@ def get_dashboard_stats():
 
 @admin_bp.route('/drivers', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_all_drivers():
     """Get all drivers"""
     try:
@@ -110,12 +120,14 @@ def get_all_drivers():
                 }
             }), 403
         
-        drivers = Driver.query.order_by(Driver.created_at.desc()).all()
+        rows = driver_serializer.select().outerjoin(
+            User, Driver.user_id == User.id
+        ).order_by(Driver.created_at.desc()).all()
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': {
-                'drivers': [driver.to_dict() for driver in drivers]
+                'drivers': driver_serializer.encode_all(rows)
             }
         }), 200
         
@@ -155,6 +167,7 @@ def approve_driver(driver_id):
         
         driver.status = 'approved'
         db.session.commit()
+        cache.invalidate(f'driver:{driver.user_id}')
         
         return jsonify({
             'success': True,
@@ -174,6 +187,7 @@ def approve_driver(driver_id):
 
 @admin_bp.route('/trips', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_all_trips():
     """Get all trips"""
     try:
@@ -186,12 +200,12 @@ def get_all_trips():
                 }
             }), 403
         
-        trips = Trip.query.order_by(Trip.created_at.desc()).limit(50).all()
+        rows = trip_serializer.select().order_by(Trip.created_at.desc()).limit(50).all()
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': {
-                'trips': [trip.to_dict() for trip in trips]
+                'trips': trip_serializer.encode_all(rows)
             }
         }), 200
         
@@ -206,6 +220,7 @@ def get_all_trips():
 
 @admin_bp.route('/payments', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_all_payments():
     """Get all payments"""
     try:
@@ -218,12 +233,12 @@ def get_all_payments():
                 }
             }), 403
         
-        payments = Payment.query.order_by(Payment.created_at.desc()).limit(50).all()
+        rows = payment_serializer.select().order_by(Payment.created_at.desc()).limit(50).all()
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': {
-                'payments': [payment.to_dict() for payment in payments]
+                'payments': payment_serializer.encode_all(rows)
             }
         }), 200
         
@@ -238,8 +253,9 @@ def get_all_payments():
 
 @admin_bp.route('/users/online', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_online_users():
-    """Get all online users (drivers and passengers)"""
+    """Get users seen recently (drivers and passengers), paginated"""
     try:
         if not admin_required():
             return jsonify({
@@ -250,25 +266,39 @@ def get_online_users():
                 }
             }), 403
         
-        # Get all approved drivers and passengers (simplified)
-        online_drivers = db.session.query(User).join(Driver).filter(
-            User.role == 'driver',
-            Driver.status == 'approved'
-        ).all()
+        page = max(request.args.get('page', 1, type=int), 1)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        role = request.args.get('role')
+        roles = (role,) if role in ('driver', 'passenger') else ('driver', 'passenger')
+        
+        # Counts come straight from this worker's presence tracker (presence is per process)
+        counts = presence.summary()
+        total_drivers = counts.get('driver', 0)
+        total_passengers = counts.get('passenger', 0)
+        total = sum(counts.get(r, 0) for r in roles)
         
-        online_passengers = User.query.filter(
-            User.role == 'passenger'
-        ).all()
+        # Only load the users on the requested page
+        user_ids = presence.page(roles=roles, page=page, limit=limit)
+        users_by_id = {
+            user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()
+        } if user_ids else {}
+        users = [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
         
         return jsonify({
             'success': True,
             'data': {
-                'drivers': [user.to_dict() for user in online_drivers],
-                'passengers': [user.to_dict() for user in online_passengers],
+                'drivers': [user.to_dict() for user in users if user.role == 'driver'],
+                'passengers': [user.to_dict() for user in users if user.role == 'passenger'],
                 'summary': {
-                    'totalDrivers': len(online_drivers),
-                    'totalPassengers': len(online_passengers),
-                    'totalUsers': len(online_drivers) + len(online_passengers)
+                    'totalDrivers': total_drivers,
+                    'totalPassengers': total_passengers,
+                    'totalUsers': total_drivers + total_passengers
+                },
+                'pagination': {
+                    'page': page,
+                    'limit': limit,
+                    'total': total,
+                    'pages': math.ceil(total / limit)
                 }
             }
         }), 200
@@ -280,4 +310,242 @@ def get_online_users():
                 'code': 'ONLINE_USERS_FAILED',
                 'message': str(e)
             }
-        }), 500
\ No newline at end of file
+        }), 500
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Get read-through cache hit rate and counters for this worker"""
+    if not admin_required():
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ADMIN_REQUIRED',
+                'message': 'Admin access required'
+            }
+        }), 403
+    
+    return jsonify({
+        'success': True,
+        'data': cache.metrics()
+    }), 200
+
+@admin_bp.route('/surge', methods=['GET'])
+@jwt_required()
+def get_surge():
+    """Get surging zones with their open trips and idle drivers from the last published build"""
+    if not admin_required():
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ADMIN_REQUIRED',
+                'message': 'Admin access required'
+            }
+        }), 403
+    
+    from services.surge import surge
+    
+    return jsonify({
+        'success': True,
+        'data': surge.snapshot()
+    }), 200
+
+@admin_bp.route('/metrics/pool', methods=['GET'])
+@jwt_required()
+def get_pool_metrics():
+    """Get database connection pool metrics for this worker"""
+    if not admin_required():
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ADMIN_REQUIRED',
+                'message': 'Admin access required'
+            }
+        }), 403
+    
+    from services import db_pool
+    from services.replicas import router
+    
+    return jsonify({
+        'success': True,
+        'data': db_pool.snapshot([db.engine] + router.engines)
+    }), 200
+
+def profiler_error():
+    """Error response when the caller may not use the profiler, else None"""
+    if not current_app.config.get('PROFILER_ENABLED'):
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'PROFILER_DISABLED',
+                'message': 'Profiling is disabled (set PROFILER_ENABLED=true)'
+            }
+        }), 404
+    if not admin_required():
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ADMIN_REQUIRED',
+                'message': 'Admin access required'
+            }
+        }), 403
+    return None
+
+@admin_bp.route('/profiler/start', methods=['POST'])
+@jwt_required()
+def start_profiler():
+    """Start sampling this worker, or a fraction of requests to one route"""
+    error = profiler_error()
+    if error:
+        return error
+    
+    data = request.get_json(silent=True) or {}
+    route = data.get('route')  # Endpoint name, e.g. 'trips.create_trip'
+    if route and route not in current_app.view_functions:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'UNKNOWN_ROUTE',
+                'message': f'Unknown endpoint {route}'
+            }
+        }), 400
+    
+    try:
+        session = profiler.start(
+            seconds=data.get('seconds', 10),
+            interval=data.get('interval', 0.005),
+            route=route,
+            fraction=data.get('fraction', 1.0)
+        )
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'VALIDATION_ERROR',
+                'message': 'seconds, interval and fraction must be numbers'
+            }
+        }), 400
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'PROFILER_BUSY',
+                'message': str(e)
+            }
+        }), 409
+    
+    return jsonify({
+        'success': True,
+        'data': session.summary()
+    }), 202
+
+@admin_bp.route('/profiler/stop', methods=['POST'])
+@jwt_required()
+def stop_profiler():
+    """Stop the running profiling session early"""
+    error = profiler_error()
+    if error:
+        return error
+    
+    session = profiler.stop()
+    return jsonify({
+        'success': True,
+        'data': session.summary() if session else None
+    }), 200
+
+@admin_bp.route('/profiler', methods=['GET'])
+@jwt_required()
+def list_profiles():
+    """List this worker's recent profiling sessions"""
+    error = profiler_error()
+    if error:
+        return error
+    
+    return jsonify({
+        'success': True,
+        'data': [session.summary() for session in profiler.history]
+    }), 200
+
+@admin_bp.route('/profiler/<session_id>/download', methods=['GET'])
+@jwt_required()
+def download_profile(session_id):
+    """Download a profile as collapsed stacks or speedscope JSON"""
+    error = profiler_error()
+    if error:
+        return error
+    
+    session = profiler.get(session_id)
+    if not session:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'NOT_FOUND',
+                'message': 'Profile not found on this worker'
+            }
+        }), 404
+    
+    if request.args.get('format', 'speedscope') == 'collapsed':
+        body, mimetype, extension = session.collapsed(), 'text/plain', 'txt'
+    else:
+        body, mimetype, extension = json.dumps(session.speedscope()), 'application/json', 'speedscope.json'
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=profile-{session.id}.{extension}'
+    })
+
+@admin_bp.route('/jobs', methods=['GET'])
+@jwt_required()
+def get_job_stats():
+    """Get background job backlog and recent failures"""
+    if not admin_required():
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ADMIN_REQUIRED',
+                'message': 'Admin access required'
+            }
+        }), 403
+    
+    from services import jobs
+    dead = Job.query.filter_by(status='dead').order_by(Job.finished_at.desc()).limit(20).all()
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'queues': jobs.backlog(),
+            'dead': [job.to_dict() for job in dead]
+        }
+    }), 200
+
+@admin_bp.route('/jobs/<int:job_id>/retry', methods=['POST'])
+@jwt_required()
+def retry_job(job_id):
+    """Requeue a dead job for another round of attempts"""
+    if not admin_required():
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ADMIN_REQUIRED',
+                'message': 'Admin access required'
+            }
+        }), 403
+    
+    job = Job.query.get(job_id)
+    if not job or job.status != 'dead':
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'JOB_NOT_FOUND',
+                'message': 'No dead job with that id'
+            }
+        }), 404
+    
+    job.status = 'queued'
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.finished_at = None
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    }), 200
@@ -133,7 +133,7 @@ def register():
             db.session.commit()
         
         # Generate JWT token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': user.role})
         
         return jsonify({
             'success': True,
@@ -185,7 +185,7 @@ def login():
             }), 401
         
         # Generate JWT token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=user.id, additional_claims={'role': user.role})
         
         return jsonify({
             'success': True,
@@ -2,12 +2,21 @@
 # Driver registration, profile management, and vehicle information
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models import Driver, User, Trip
 from models import db
 from datetime import datetime, timedelta
+from sqlalchemy import func, select, case
 import os
 from werkzeug.utils import secure_filename
+from services.presence import presence
+from services.http_cache import etag_from
+from services.cache import cache, cached
+from services.sqlite_writer import run_write
+from services.replicas import use_replica
+from services.serializers import trip_serializer, negotiated_response, InvalidFieldsError
+from services.tasks import submit_payout, process_document
+from services import archive
 import uuid
 
 # Create drivers blueprint
@@ -19,8 +28,21 @@ ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def profile_version(user_id):
+    """Driver profile version (driver and user rows) for conditional GETs"""
+    return db.session.query(Driver.updated_at, User.updated_at).join(
+        User, Driver.user_id == User.id
+    ).filter(Driver.user_id == user_id).first()
+
+def earnings_version(user_id):
+    """Earnings version: the driver row (bumped on trip completion and by the stats and rating tasks), today's date
+    (the today/week windows) and the query string"""
+    updated_at = db.session.query(Driver.updated_at).filter_by(user_id=user_id).scalar()
+    return (updated_at, datetime.utcnow().date(), request.query_string)
+
 @drivers_bp.route('/available-trips', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_available_trips():
     """Get available trips for driver"""
     try:
@@ -37,18 +59,30 @@ def get_available_trips():
                 }
             }), 403
         
-        # Get trips with status 'requested' with optimization
-        trips = Trip.query.options(
-            db.joinedload(Trip.passenger)
-        ).filter_by(status='requested').order_by(Trip.created_at.desc()).limit(20).all()
+        # Get trips with status 'requested'
+        serializer = trip_serializer.for_request()
+        trips = cache.remember(
+            f'drivers:available-trips:{sorted(request.args.items())}', 5, ['trips:available'],
+            lambda: serializer.encode_all(serializer.select().filter(
+                Trip.status == 'requested'
+            ).order_by(Trip.created_at.desc()).limit(20).all())
+        )
         
-        return jsonify({
+        return negotiated_response({
             'success': True,
             'data': {
-                'trips': [trip.to_dict() for trip in trips]
+                'trips': trips
             }
         }), 200
         
+    except InvalidFieldsError as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INVALID_FIELDS',
+                'message': str(e)
+            }
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -88,21 +122,30 @@ def update_driver_status():
                 }
             }), 400
         
-        driver = Driver.query.filter_by(user_id=user_id).first()
+        # Single UPDATE through the write path (the writer thread in SQLite mode)
+        statement = Driver.__table__.update().where(
+            Driver.user_id == user_id
+        ).values(is_online=bool(is_online), updated_at=datetime.utcnow())
+        updated = run_write(lambda conn: conn.execute(statement).rowcount)
         
-        if not driver:
+        if not updated:
             # Create driver profile if it doesn't exist
-            driver = Driver(user_id=user_id, status='approved')  # Auto-approve for demo
+            driver = Driver(user_id=user_id, status='approved', is_online=bool(is_online))  # Auto-approve for demo
             db.session.add(driver)
+            db.session.commit()
+        cache.invalidate(f'driver:{user_id}')
         
-        driver.is_online = is_online
-        db.session.commit()
+        # Keep presence in step with the explicit online toggle
+        if is_online:
+            presence.touch(user_id, 'driver')
+        else:
+            presence.remove(user_id)
         
         return jsonify({
             'success': True,
             'message': 'Status updated',
             'data': {
-                'isOnline': driver.is_online
+                'isOnline': bool(is_online)
             }
         }), 200
         
@@ -116,8 +159,63 @@ def update_driver_status():
             }
         }), 500
 
+@drivers_bp.route('/location', methods=['PUT'])
+@jwt_required()
+def update_driver_location():
+    """Record a driver location ping"""
+    try:
+        user_id = get_jwt_identity()
+        
+        if get_jwt().get('role') not in (None, 'driver'):
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'UNAUTHORIZED',
+                    'message': 'Only drivers can send location updates'
+                }
+            }), 403
+        
+        data = request.json or {}
+        try:
+            location = (float(data['lat']), float(data['lng']))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'INVALID_LOCATION',
+                    'message': 'lat and lng are required'
+                }
+            }), 400
+        
+        presence.touch(user_id, 'driver', location=location)
+        # Stored for surge supply, which the job worker counts across all workers;
+        # updated_at is kept as is so a ping does not change the driver's ETags
+        statement = Driver.__table__.update().where(Driver.user_id == user_id).values(
+            last_lat=location[0], last_lng=location[1], located_at=datetime.utcnow(), updated_at=Driver.updated_at
+        )
+        run_write(lambda conn: conn.execute(statement))
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'lat': location[0],
+                'lng': location[1]
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'UPDATE_FAILED',
+                'message': str(e)
+            }
+        }), 500
+
 @drivers_bp.route('/profile', methods=['GET'])
 @jwt_required()
+@etag_from(profile_version)
+@cached(60, tags=['driver:{user_id}'])
 def get_driver_profile():
     """Get driver profile"""
     try:
@@ -199,6 +297,7 @@ def update_driver_profile():
         
         driver.updated_at = datetime.utcnow()
         db.session.commit()
+        cache.invalidate(f'driver:{user_id}')
         
         return jsonify({
             'success': True,
@@ -300,12 +399,16 @@ def upload_document():
             elif document_type == 'logbook':
                 driver.document_logbook = filepath
             
+            # Verify the file contents in the background
+            process_document.delay(driver_user_id=user_id, document_type=document_type, filepath=filepath)
+            
             # Check if all required documents are uploaded
             if (driver.document_id_card and driver.document_license and 
                 driver.vehicle_make and driver.vehicle_plate):
                 driver.status = 'pending'  # Ready for admin review
             
             db.session.commit()
+            cache.invalidate(f'driver:{user_id}')
             
             return jsonify({
                 'success': True,
@@ -335,6 +438,9 @@ def upload_document():
 
 @drivers_bp.route('/earnings', methods=['GET'])
 @jwt_required()
+@use_replica
+@etag_from(earnings_version)
+@cached(60, tags=['driver:{user_id}'])
 def get_driver_earnings():
     """Get driver earnings summary"""
     try:
@@ -350,26 +456,25 @@ def get_driver_earnings():
                 }
             }), 403
         
-        # Get completed trips
-        completed_trips = Trip.query.filter_by(
-            driver_id=user_id,
-            status='completed'
-        ).all()
-        
-        # Calculate earnings
-        total_earnings = sum(float(trip.fare) for trip in completed_trips)
-        total_trips = len(completed_trips)
-        
-        # Get today's earnings
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_trips = [t for t in completed_trips if t.completed_at and t.completed_at >= today_start]
-        today_earnings = sum(float(trip.fare) for trip in today_trips)
-        
-        # Get this week's earnings
         week_start = datetime.utcnow() - timedelta(days=datetime.utcnow().weekday())
         week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_trips = [t for t in completed_trips if t.completed_at and t.completed_at >= week_start]
-        week_earnings = sum(float(trip.fare) for trip in week_trips)
+        
+        # Aggregate completed trips in SQL, over live and archived trips
+        def earnings(tier):
+            trips = tier.trips.c
+            return select(
+                func.count(),
+                func.sum(trips.fare),
+                func.sum(case((trips.completed_at >= today_start, 1), else_=0)),
+                func.sum(case((trips.completed_at >= today_start, trips.fare), else_=0)),
+                func.sum(case((trips.completed_at >= week_start, 1), else_=0)),
+                func.sum(case((trips.completed_at >= week_start, trips.fare), else_=0))
+            ).where(trips.driver_id == user_id, trips.status == 'completed')
+        
+        total_trips, total_earnings, today_count, today_earnings, week_count, week_earnings = [
+            float(value) if index % 2 else int(value) for index, value in enumerate(archive.count_across(earnings))
+        ]
         
         # Get driver rating
         driver = Driver.query.filter_by(user_id=user_id).first()
@@ -381,9 +486,9 @@ def get_driver_earnings():
                 'totalEarnings': total_earnings,
                 'totalTrips': total_trips,
                 'todayEarnings': today_earnings,
-                'todayTrips': len(today_trips),
+                'todayTrips': today_count,
                 'weekEarnings': week_earnings,
-                'weekTrips': len(week_trips),
+                'weekTrips': week_count,
                 'averagePerTrip': total_earnings / total_trips if total_trips > 0 else 0,
                 'rating': rating
             }
@@ -428,8 +533,10 @@ def request_payout():
                 }
             }), 400
         
-        # Mock payout processing
+        # Submit the M-Pesa B2C payout in the background (retried until accepted)
         payout_id = f'po_{uuid.uuid4().hex[:12]}'
+        submit_payout.delay(payout_id=payout_id, driver_user_id=user_id, amount=amount, phone=phone)
+        db.session.commit()
         
         return jsonify({
             'success': True,
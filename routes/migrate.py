@@ -1,18 +1,36 @@
 # SafeRide Backend - Database Migration Routes
-# Manual database migration utilities
+# Read-only migration status; schema changes run via `flask --app app db-upgrade`
 
 from flask import Blueprint, jsonify
-from models import db
+from flask_jwt_extended import jwt_required
+from routes.admin import admin_required
 
 # Create migration blueprint
 migrate_bp = Blueprint('migrate', __name__)
 
-@migrate_bp.route('/run', methods=['POST'])
-def run_migration():
-    """Manually run database migrations (create all tables)"""
+@migrate_bp.route('/status', methods=['GET'])
+@jwt_required()
+def migration_status():
+    """List applied and pending migrations (admin only)"""
     try:
-        # Create all database tables based on models
-        db.create_all()
-        return jsonify({'success': True, 'message': 'Migration completed'}), 200
+        if not admin_required():
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'ADMIN_REQUIRED',
+                    'message': 'Admin access required'
+                }
+            }), 403
+        
+        from services import migrations
+        entries = migrations.status()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'migrations': entries,
+                'pending': [entry['name'] for entry in entries if not entry['applied']]
+            }
+        }), 200
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': {'code': 'STATUS_FAILED', 'message': str(e)}}), 500
@@ -2,14 +2,35 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Payment, Trip
 from models import db
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 import uuid
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.mpesa import MpesaService
+from services.serializers import payment_serializer, json_response
+from services.cache import cache
+from services.replicas import use_replica
+from services.tasks import update_driver_stats
+from services import outbox, archive
+from services.idempotency import idempotent
+from services.sqlite_writer import retry_busy
 
 payments_bp = Blueprint('payments', __name__)
 
+
+def claim_trip_payment(trip_id):
+    """Mark a trip paid in one conditional UPDATE; False if another payment already paid it
+
+    A payment that expired and then succeeds late (its callback arrives
+    after the passenger retried and paid) must not pay the trip twice.
+    """
+    updated = db.session.execute(
+        update(Trip).where(Trip.id == trip_id, Trip.payment_status != 'paid').values(payment_status='paid')
+    ).rowcount
+    return bool(updated) or db.session.query(Trip.id).filter(Trip.id == trip_id).first() is None
+
 @payments_bp.route('/callback', methods=['POST'])
 def mpesa_callback():
     """Handle M-Pesa callback"""
@@ -18,30 +39,42 @@ def mpesa_callback():
         checkout_request_id = data.get('Body', {}).get('stkCallback', {}).get('CheckoutRequestID')
         result_code = data.get('Body', {}).get('stkCallback', {}).get('ResultCode')
         
-        if checkout_request_id:
+        def record_result():
             payment = Payment.query.filter_by(checkout_request_id=checkout_request_id).first()
+            if not payment:
+                return
             
-            if payment:
-                if result_code == 0:  # Success
-                    # Safety: Only process if not already paid
-                    if payment.status != 'paid':
+            if result_code == 0:  # Success
+                # Safety: Only process if not already paid
+                if payment.status not in ('paid', 'duplicate'):
+                    callback_metadata = data.get('Body', {}).get('stkCallback', {}).get('CallbackMetadata', {}).get('Item', [])
+                    
+                    for item in callback_metadata:
+                        if item.get('Name') == 'MpesaReceiptNumber':
+                            payment.mpesa_receipt_number = item.get('Value')
+                    
+                    # Update trip payment status safely
+                    if claim_trip_payment(payment.trip_id):
                         payment.status = 'paid'
-                        callback_metadata = data.get('Body', {}).get('stkCallback', {}).get('CallbackMetadata', {}).get('Item', [])
-                        
-                        for item in callback_metadata:
-                            if item.get('Name') == 'MpesaReceiptNumber':
-                                payment.mpesa_receipt_number = item.get('Value')
-                        
-                        # Update trip payment status safely
-                        trip = Trip.query.get(payment.trip_id)
-                        if trip and trip.payment_status != 'paid':
-                            trip.payment_status = 'paid'
-                else:
-                    # Safety: Only mark as failed if currently pending
-                    if payment.status == 'pending':
-                        payment.status = 'failed'
-                
-                db.session.commit()
+                        outbox.record('payment.paid', 'payment', payment.id, tripId=payment.trip_id,
+                                      amount=payment.amount, receipt=payment.mpesa_receipt_number, source='callback')
+                    else:
+                        # Late success of an expired attempt after a retry paid the trip: flag for refund
+                        payment.status = 'duplicate'
+                        outbox.record('payment.duplicate', 'payment', payment.id, tripId=payment.trip_id,
+                                      amount=payment.amount, receipt=payment.mpesa_receipt_number, source='callback')
+            else:
+                # Safety: Only mark as failed if currently pending
+                if payment.status == 'pending':
+                    payment.status = 'failed'
+                    outbox.record('payment.failed', 'payment', payment.id, tripId=payment.trip_id,
+                                  resultCode=result_code, source='callback')
+            
+            db.session.commit()
+        
+        if checkout_request_id:
+            # On SQLite busy only the write transaction runs again
+            retry_busy(record_result)
         
         return jsonify({'ResultCode': 0, 'ResultDesc': 'Success'}), 200
         
@@ -50,6 +83,7 @@ def mpesa_callback():
 
 @payments_bp.route('/initiate', methods=['POST'])
 @jwt_required()
+@idempotent
 def initiate_payment():
     """Initiate M-Pesa payment"""
     try:
@@ -114,7 +148,27 @@ def initiate_payment():
                 }
             }), 400
         
-        # Initialize M-Pesa service and initiate STK Push
+        def reserve_payment():
+            # Reserve the trip before the push: the partial unique index on pending
+            # payments makes a concurrent initiate fail here instead of pushing too
+            payment = Payment(trip_id=trip_id, amount=amount, phone=phone, status='pending')
+            db.session.add(payment)
+            db.session.commit()
+            return payment.id
+        
+        try:
+            payment_id = retry_busy(reserve_payment)
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'PAYMENT_IN_PROGRESS',
+                    'message': 'Payment already in progress for this trip'
+                }
+            }), 400
+        
+        # The commit released the pooled connection while waiting on Daraja
         mpesa = MpesaService()
         stk_result = mpesa.stk_push(
             phone_number=phone,
@@ -131,23 +185,28 @@ def initiate_payment():
                 'response_description': 'Mock payment initiated for demo'
             }
         
-        # Create payment record
-        payment = Payment(
-            trip_id=trip_id,
-            amount=amount,
-            phone=phone,
-            checkout_request_id=stk_result.get('checkout_request_id'),
-            status='pending'
-        )
-        
-        # For mock payments, auto-complete for demo
-        if stk_result.get('checkout_request_id', '').startswith('mock_'):
-            payment.status = 'paid'
-            payment.mpesa_receipt_number = f'MOCK{uuid.uuid4().hex[:8].upper()}'
-            trip.payment_status = 'paid'
+        def record_payment():
+            payment = Payment.query.get(payment_id)
+            payment.checkout_request_id = stk_result.get('checkout_request_id')
+            outbox.record('payment.initiated', 'payment', payment.id, tripId=trip_id, amount=payment.amount,
+                          checkoutRequestId=payment.checkout_request_id)
+            
+            # For mock payments, auto-complete for demo (paying the trip only once, as a callback would)
+            if payment.checkout_request_id.startswith('mock_'):
+                payment.mpesa_receipt_number = f'MOCK{uuid.uuid4().hex[:8].upper()}'
+                if claim_trip_payment(trip_id):
+                    payment.status = 'paid'
+                    outbox.record('payment.paid', 'payment', payment.id, tripId=trip_id, amount=payment.amount,
+                                  receipt=payment.mpesa_receipt_number, source='mock')
+                else:
+                    payment.status = 'duplicate'
+                    outbox.record('payment.duplicate', 'payment', payment.id, tripId=trip_id, amount=payment.amount,
+                                  receipt=payment.mpesa_receipt_number, source='mock')
+            db.session.commit()
+            return payment
         
-        db.session.add(payment)
-        db.session.commit()
+        # The STK push already went out: on SQLite busy retry only the write, never the push
+        payment = retry_busy(record_payment)
         
         return jsonify({
             'success': True,
@@ -196,37 +255,50 @@ def check_payment_status(payment_id):
         
         # Query actual M-Pesa payment status
         if payment.status == 'pending' and payment.checkout_request_id:
+            checkout_request_id = payment.checkout_request_id
+            # Release the pooled connection while waiting on Daraja; payment is re-read afterwards
+            db.session.rollback()
             mpesa = MpesaService()
-            status_result = mpesa.query_stk_status(payment.checkout_request_id)
+            status_result = mpesa.query_stk_status(checkout_request_id)
             
             if status_result['success']:
                 status_data = status_result['data']
                 result_code = status_data.get('ResultCode')
                 
-                if result_code == '0':  # Success
-                    # Safety check: Verify payment hasn't been processed already
-                    if payment.status != 'paid':
-                        payment.status = 'paid'
+                def record_result():
+                    """Apply the queried result; returns the driver whose earnings may have changed"""
+                    if result_code == '0':  # Success
+                        # Safety check: Verify payment hasn't been processed already
+                        if payment.status in ('paid', 'duplicate'):
+                            return None
                         payment.mpesa_receipt_number = status_data.get('MpesaReceiptNumber', f'MPE{uuid.uuid4().hex[:8].upper()}')
                         
                         # Update trip payment status safely
                         trip = Trip.query.get(payment.trip_id)
-                        if trip and trip.payment_status != 'paid':
-                            trip.payment_status = 'paid'
-                            
-                            # Safety: Update driver earnings only once
-                            if trip.driver_id and trip.status == 'completed':
-                                driver = Driver.query.filter_by(user_id=trip.driver_id).first()
-                                if driver:
-                                    # Check if earnings already added
-                                    if not hasattr(trip, '_earnings_added'):
-                                        driver.total_earnings += trip.fare
-                                        trip._earnings_added = True
-                        
+                        if claim_trip_payment(payment.trip_id):
+                            payment.status = 'paid'
+                            # Earnings are recomputed from completed trips, so this never double counts
+                            if trip and trip.driver_id and trip.status == 'completed':
+                                update_driver_stats.delay(driver_user_id=trip.driver_id)
+                            outbox.record('payment.paid', 'payment', payment.id, tripId=payment.trip_id,
+                                          amount=payment.amount, receipt=payment.mpesa_receipt_number, source='status_query')
+                        else:
+                            payment.status = 'duplicate'
+                            outbox.record('payment.duplicate', 'payment', payment.id, tripId=payment.trip_id,
+                                          amount=payment.amount, receipt=payment.mpesa_receipt_number, source='status_query')
                         db.session.commit()
-                elif result_code in ['1032', '1037']:  # Cancelled or timeout
-                    payment.status = 'failed'
-                    db.session.commit()
+                        return trip.driver_id if trip else None
+                    if result_code in ['1032', '1037']:  # Cancelled or timeout
+                        payment.status = 'failed'
+                        outbox.record('payment.failed', 'payment', payment.id, tripId=payment.trip_id,
+                                      resultCode=result_code, source='status_query')
+                        db.session.commit()
+                    return None
+                
+                # The query already went out: on SQLite busy retry only the write, never the query
+                driver_id = retry_busy(record_result)
+                if driver_id:
+                    cache.invalidate(f'driver:{driver_id}')
         
         return jsonify({
             'success': True,
@@ -244,20 +316,24 @@ def check_payment_status(payment_id):
 
 @payments_bp.route('', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_payments():
     """Get user payments"""
     try:
         user_id = get_jwt_identity()
         
-        # Get payments for user's trips
-        payments = db.session.query(Payment).join(Trip).filter(
-            Trip.passenger_id == user_id
-        ).order_by(Payment.created_at.desc()).all()
+        # Get payments for user's trips, live and archived
+        rows = archive.read_across(
+            lambda tier: select(*tier.columns(payment_serializer.columns), tier.payments.c.created_at).join(
+                tier.trips, tier.payments.c.trip_id == tier.trips.c.id
+            ).where(tier.trips.c.passenger_id == user_id),
+            limit=request.args.get('limit', 500, type=int)
+        )
         
-        return jsonify({
+        return json_response({
             'success': True,
             'data': {
-                'payments': [payment.to_dict() for payment in payments]
+                'payments': payment_serializer.encode_all(rows)
             }
         }), 200
         
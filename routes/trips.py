@@ -2,29 +2,75 @@
 # Trip booking, tracking, and management system
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models import Trip, User, Driver, db
+from services.serializers import trip_serializer, negotiated_response, InvalidFieldsError
+from services.cache import cache
+from services.replicas import use_replica
+from services.tasks import update_driver_stats, recompute_driver_rating, notify_drivers
+from services import outbox
+from services.idempotency import idempotent
+from services.sqlite_writer import retry_busy
+from services import trip_states, archive
+from services.pricing import pricing, parse_point, QuoteError
+from services.geo import haversine_km
 from datetime import datetime
+from sqlalchemy import func, select
 import math
 
 # Create trips blueprint
 trips_bp = Blueprint('trips', __name__)
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance using Haversine formula"""
+def quote_error(e):
+    """JSON error response for an unusable location or quote token"""
+    return jsonify({
+        'success': False,
+        'error': {
+            'code': e.code,
+            'message': e.message
+        }
+    }), 400
+
+@trips_bp.route('/quote', methods=['POST'])
+@jwt_required()
+def quote_trip():
+    """Price a trip without booking it; the signed quote can be passed to create_trip"""
     try:
-        from models import Config
-        R = float(Config.get_value('EARTH_RADIUS_KM', '6371'))
-    except:
-        R = 6371  # Earth's radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
+        data = request.get_json(silent=True) or {}
+        if not data.get('pickup') or not data.get('dropoff'):
+            return jsonify({
+                'success': False,
+                'error': {
+                    'code': 'MISSING_LOCATION',
+                    'message': 'Pickup and dropoff locations are required'
+                }
+            }), 400
+        
+        quote = pricing.quote(parse_point(data['pickup']), parse_point(data['dropoff']))
+        token, expires_at = pricing.sign(quote, get_jwt_identity())
+        body = quote.to_dict()
+        body['expiresAt'] = expires_at.isoformat()
+        body['quoteToken'] = token
+        
+        return jsonify({
+            'success': True,
+            'data': body
+        }), 200
+        
+    except QuoteError as e:
+        return quote_error(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'QUOTE_FAILED',
+                'message': str(e)
+            }
+        }), 500
 
 @trips_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_trip():
     """Create new trip request"""
     try:
@@ -55,55 +101,44 @@ def create_trip():
                 }
             }), 400
         
-        # Calculate distance
-        distance = calculate_distance(
-            float(pickup['lat']), float(pickup['lng']),
-            float(dropoff['lat']), float(dropoff['lng'])
-        )
-        
-        # Calculate fare using cached config values
-        try:
-            from models import Config
-            # Cache config values to avoid repeated DB queries
-            if not hasattr(create_trip, '_config_cache'):
-                create_trip._config_cache = {
-                    'BASE_FARE': float(Config.get_value('TRIP_BASE_FARE', '200')),
-                    'RATE_PER_KM': float(Config.get_value('TRIP_RATE_PER_KM', '50')),
-                    'AVERAGE_SPEED': float(Config.get_value('TRIP_AVERAGE_SPEED', '30'))
-                }
-            BASE_FARE = create_trip._config_cache['BASE_FARE']
-            RATE_PER_KM = create_trip._config_cache['RATE_PER_KM']
-            AVERAGE_SPEED = create_trip._config_cache['AVERAGE_SPEED']
-        except:
-            BASE_FARE = 200
-            RATE_PER_KM = 50
-            AVERAGE_SPEED = 30
-        
-        fare = BASE_FARE + (distance * RATE_PER_KM)
-        duration = int((distance / AVERAGE_SPEED) * 60)  # minutes
-        
-        # Create trip
-        trip = Trip(
-            passenger_id=user_id,
-            pickup_lat=pickup['lat'],
-            pickup_lng=pickup['lng'],
-            pickup_address=pickup['address'],
-            dropoff_lat=dropoff['lat'],
-            dropoff_lng=dropoff['lng'],
-            dropoff_address=dropoff['address'],
-            fare=round(fare, 2),
-            distance=round(distance, 2),
-            duration=duration,
-            status='requested'
-        )
-        
-        # Save trip to database
-        db.session.add(trip)
-        db.session.commit()
-        
-        # If notifyDrivers flag is set, find nearby online drivers
-        if data.get('notifyDrivers'):
-            online_drivers = Driver.query.filter_by(is_online=True, status='approved').all()
+        # Price the trip: a signed quote from /trips/quote is honoured as issued
+        pickup_point, dropoff_point = parse_point(pickup), parse_point(dropoff)
+        if data.get('quoteToken'):
+            quote = pricing.verify(data['quoteToken'], user_id, pickup_point, dropoff_point)
+        else:
+            quote = pricing.quote(pickup_point, dropoff_point)
+        
+        def save_trip():
+            # Create trip
+            trip = Trip(
+                passenger_id=user_id,
+                pickup_lat=pickup['lat'],
+                pickup_lng=pickup['lng'],
+                pickup_address=pickup['address'],
+                dropoff_lat=dropoff['lat'],
+                dropoff_lng=dropoff['lng'],
+                dropoff_address=dropoff['address'],
+                fare=quote.fare,
+                # Quotes measure between grid cell centres; the trip keeps the real distance
+                distance=round(haversine_km(*pickup_point, *dropoff_point), 2),
+                duration=quote.duration,
+                status='requested'
+            )
+            
+            # Save trip to database
+            db.session.add(trip)
+            db.session.flush()
+            
+            # If notifyDrivers flag is set, notify online drivers in the background
+            if data.get('notifyDrivers'):
+                notify_drivers.delay(trip_id=trip.id)
+            
+            db.session.commit()
+            return trip
+        
+        # On SQLite busy only the write transaction runs again
+        trip = retry_busy(save_trip)
+        cache.invalidate('trips:available')
         
         return jsonify({
             'success': True,
@@ -111,6 +146,9 @@ def create_trip():
             'data': trip.to_dict()
         }), 201
         
+    except QuoteError as e:
+        db.session.rollback()
+        return quote_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -123,6 +161,7 @@ def create_trip():
 
 @trips_bp.route('', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_trips():
     """Get user's trips"""
     try:
@@ -134,28 +173,32 @@ def get_trips():
         limit = request.args.get('limit', 10, type=int)
         status = request.args.get('status')
         
-        # Build query based on user role
-        if user.role == 'passenger':
-            query = Trip.query.filter_by(passenger_id=user_id)
-        elif user.role == 'driver':
-            query = Trip.query.filter_by(driver_id=user_id)
-        else:  # admin
-            query = Trip.query
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        # Get trips with eager loading for better performance
-        trips = query.options(
-            db.joinedload(Trip.passenger),
-            db.joinedload(Trip.driver)
-        ).order_by(Trip.created_at.desc()).limit(limit).offset((page-1)*limit).all()
-        total = query.count()
+        # Build filters based on user role (for the live or archived trips table)
+        def filters(tier):
+            columns = tier.trips.c
+            conditions = []
+            if user.role == 'passenger':
+                conditions.append(columns.passenger_id == user_id)
+            elif user.role == 'driver':
+                conditions.append(columns.driver_id == user_id)
+            if status:
+                conditions.append(columns.status == status)
+            return conditions
+        
+        # Column-only query for just the requested fields, across live and archived trips
+        serializer = trip_serializer.for_request()
+        rows = archive.read_across(
+            lambda tier: select(*tier.columns(serializer.columns), tier.trips.c.created_at).where(*filters(tier)),
+            limit, (page-1)*limit
+        )
+        total = archive.count_across(
+            lambda tier: select(func.count()).select_from(tier.trips).where(*filters(tier))
+        )[0]
         
-        return jsonify({
+        return negotiated_response({
             'success': True,
             'data': {
-                'trips': [trip.to_dict() for trip in trips],
+                'trips': serializer.encode_all(rows),
                 'pagination': {
                     'page': page,
                     'limit': limit,
@@ -165,6 +208,14 @@ def get_trips():
             }
         }), 200
         
+    except InvalidFieldsError as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INVALID_FIELDS',
+                'message': str(e)
+            }
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -174,8 +225,19 @@ def get_trips():
             }
         }), 500
 
+def transition_error(e):
+    """JSON error response for a refused trip transition"""
+    return jsonify({
+        'success': False,
+        'error': {
+            'code': e.code,
+            'message': e.message
+        }
+    }), e.status
+
 @trips_bp.route('/<trip_id>/accept', methods=['PUT'])
 @jwt_required()
+@idempotent
 def accept_trip(trip_id):
     """Driver accepts trip"""
     try:
@@ -191,32 +253,16 @@ def accept_trip(trip_id):
                 }
             }), 403
         
-        trip = Trip.query.get(trip_id)
-        
-        if not trip:
-            return jsonify({
-                'success': False,
-                'error': {
-                    'code': 'TRIP_NOT_FOUND',
-                    'message': 'Trip not found'
-                }
-            }), 404
-        
-        if trip.status != 'requested':
-            return jsonify({
-                'success': False,
-                'error': {
-                    'code': 'INVALID_STATUS',
-                    'message': 'Trip is not available'
-                }
-            }), 400
-        
-        # Update trip
-        trip.driver_id = user_id
-        trip.status = 'accepted'
-        trip.accepted_at = datetime.utcnow()
+        def accept():
+            # Conditional update: only one driver can take a requested trip
+            trip_states.transition(trip_id, 'accept', user_id)
+            trip = Trip.query.get(trip_id)
+            outbox.record('trip.accepted', 'trip', trip_id, driverId=user_id, passengerId=trip.passenger_id,
+                          acceptedAt=trip.accepted_at)
+            db.session.commit()
+            return trip
         
-        db.session.commit()
+        trip = retry_busy(accept)
         
         # Return trips as JSON
         return jsonify({
@@ -225,6 +271,9 @@ def accept_trip(trip_id):
             'data': trip.to_dict()
         }), 200
         
+    except trip_states.TransitionError as e:
+        db.session.rollback()
+        return transition_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -235,40 +284,107 @@ def accept_trip(trip_id):
             }
         }), 500
 
+@trips_bp.route('/<trip_id>/arrive', methods=['PUT'])
+@jwt_required()
+def arrive_trip(trip_id):
+    """Driver has arrived at pickup"""
+    try:
+        user_id = get_jwt_identity()
+        
+        def arrive():
+            trip_states.transition(trip_id, 'arrive', user_id)
+            trip = Trip.query.get(trip_id)
+            outbox.record('trip.arrived', 'trip', trip_id, driverId=user_id, passengerId=trip.passenger_id,
+                          arrivedAt=trip.arrived_at)
+            db.session.commit()
+            return trip
+        
+        trip = retry_busy(arrive)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Driver arrived',
+            'data': trip.to_dict()
+        }), 200
+        
+    except trip_states.TransitionError as e:
+        db.session.rollback()
+        return transition_error(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'ARRIVE_FAILED',
+                'message': str(e)
+            }
+        }), 500
+
+@trips_bp.route('/<trip_id>/start', methods=['PUT'])
+@jwt_required()
+def start_trip(trip_id):
+    """Driver starts the ride after pickup"""
+    try:
+        user_id = get_jwt_identity()
+        
+        def start():
+            trip_states.transition(trip_id, 'start', user_id)
+            trip = Trip.query.get(trip_id)
+            outbox.record('trip.started', 'trip', trip_id, driverId=user_id, passengerId=trip.passenger_id,
+                          startedAt=trip.started_at)
+            db.session.commit()
+            return trip
+        
+        trip = retry_busy(start)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Trip started',
+            'data': trip.to_dict()
+        }), 200
+        
+    except trip_states.TransitionError as e:
+        db.session.rollback()
+        return transition_error(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'START_FAILED',
+                'message': str(e)
+            }
+        }), 500
+
 @trips_bp.route('/<trip_id>/complete', methods=['PUT'])
 @jwt_required()
 def complete_trip(trip_id):
     """Complete trip"""
     try:
         user_id = get_jwt_identity()
-        trip = Trip.query.get(trip_id)
-        
-        if not trip or trip.driver_id != user_id:
-            return jsonify({
-                'success': False,
-                'error': {
-                    'code': 'UNAUTHORIZED',
-                    'message': 'Unauthorized'
-                }
-            }), 403
         
-        trip.status = 'completed'
-        trip.completed_at = datetime.utcnow()
         # Update payment status based on config
         try:
             from models import Config
             auto_payment = Config.get_value('AUTO_COMPLETE_PAYMENT', 'true').lower() == 'true'
-            trip.payment_status = 'paid' if auto_payment else 'pending'
+            payment_status = 'paid' if auto_payment else 'pending'
         except:
-            trip.payment_status = 'paid'  # Default behavior
-        
-        # Update driver stats
-        driver = Driver.query.filter_by(user_id=user_id).first()
-        if driver:
-            driver.total_trips += 1
-            driver.total_earnings += trip.fare
-        
-        db.session.commit()
+            payment_status = 'paid'  # Default behavior
+        
+        def complete():
+            trip_states.transition(trip_id, 'complete', user_id, payment_status=payment_status)
+            trip = Trip.query.get(trip_id)
+            
+            # Earnings change now: bump the driver version their ETag is built from
+            Driver.query.filter_by(user_id=user_id).update({'updated_at': datetime.utcnow()}, synchronize_session=False)
+            # Driver trip count and earnings are recomputed in the background
+            update_driver_stats.delay(driver_user_id=user_id)
+            outbox.record('trip.completed', 'trip', trip_id, driverId=user_id, passengerId=trip.passenger_id,
+                          fare=trip.fare, paymentStatus=trip.payment_status, completedAt=trip.completed_at)
+            db.session.commit()
+            return trip
+        
+        trip = retry_busy(complete)
         
         return jsonify({
             'success': True,
@@ -276,6 +392,9 @@ def complete_trip(trip_id):
             'data': trip.to_dict()
         }), 200
         
+    except trip_states.TransitionError as e:
+        db.session.rollback()
+        return transition_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -286,6 +405,65 @@ def complete_trip(trip_id):
             }
         }), 500
 
+@trips_bp.route('/<trip_id>/cancel', methods=['PUT'])
+@jwt_required()
+def cancel_trip(trip_id):
+    """Passenger or assigned driver cancels a trip before the ride starts"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        reason = (data.get('reason') or '')[:500] or None
+        
+        def cancel():
+            previous_status = trip_states.transition(trip_id, 'cancel', user_id, reason=reason)
+            trip = Trip.query.get(trip_id)
+            outbox.record('trip.cancelled', 'trip', trip_id, cancelledBy=user_id, passengerId=trip.passenger_id,
+                          driverId=trip.driver_id, previousStatus=previous_status, reason=reason,
+                          cancelledAt=trip.cancelled_at)
+            db.session.commit()
+            return trip
+        
+        trip = retry_busy(cancel)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Trip cancelled',
+            'data': trip.to_dict()
+        }), 200
+        
+    except trip_states.TransitionError as e:
+        db.session.rollback()
+        return transition_error(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'CANCEL_FAILED',
+                'message': str(e)
+            }
+        }), 500
+
+@trips_bp.route('/<trip_id>/transitions', methods=['GET'])
+@jwt_required()
+def get_trip_transitions(trip_id):
+    """Status history of a trip for its passenger, driver or an admin"""
+    user_id = get_jwt_identity()
+    trip = Trip.query.get(trip_id)
+    if not trip or user_id not in (trip.passenger_id, trip.driver_id) and get_jwt().get('role') != 'admin':
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'TRIP_NOT_FOUND',
+                'message': 'Trip not found'
+            }
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': [transition.to_dict() for transition in trip_states.history(trip_id)]
+    }), 200
+
 @trips_bp.route('/<trip_id>/rate', methods=['POST'])
 @jwt_required()
 def rate_trip(trip_id):
@@ -316,22 +494,19 @@ def rate_trip(trip_id):
                 }
             }), 400
         
-        trip.rating = rating
-        trip.feedback = feedback
-        
-        # Update driver rating
+        def save_rating():
+            trip.rating = rating
+            trip.feedback = feedback
+            
+            # Driver average rating is recomputed in the background
+            if trip.driver_id:
+                recompute_driver_rating.delay(driver_user_id=trip.driver_id)
+            
+            db.session.commit()
+        
+        retry_busy(save_rating)
         if trip.driver_id:
-            driver = Driver.query.filter_by(user_id=trip.driver_id).first()
-            if driver:
-                # Calculate new average rating efficiently
-                avg_rating = db.session.query(db.func.avg(Trip.rating)).filter(
-                    Trip.driver_id == trip.driver_id,
-                    Trip.rating.isnot(None)
-                ).scalar()
-                
-                driver.rating = round(float(avg_rating), 2) if avg_rating else 0
-        
-        db.session.commit()
+            cache.invalidate(f'driver:{trip.driver_id}')
         
         return jsonify({
             'success': True,
@@ -351,6 +526,7 @@ def rate_trip(trip_id):
 
 @trips_bp.route('/available', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_available_trips():
     """Get available trips for drivers"""
     try:
@@ -366,16 +542,29 @@ def get_available_trips():
                 }
             }), 403
         
-        # Get trips that are requested and not assigned with optimization
-        trips = Trip.query.options(
-            db.joinedload(Trip.passenger)
-        ).filter_by(status='requested', driver_id=None).order_by(Trip.created_at.desc()).limit(20).all()
+        # Get trips that are requested and not assigned (shared by all drivers)
+        serializer = trip_serializer.for_request()
+        trips = cache.remember(
+            f'trips:available:{sorted(request.args.items())}', 5, ['trips:available'],
+            lambda: serializer.encode_all(serializer.select().filter(
+                Trip.status == 'requested',
+                Trip.driver_id.is_(None)
+            ).order_by(Trip.created_at.desc()).limit(20).all())
+        )
         
-        return jsonify({
+        return negotiated_response({
             'success': True,
-            'data': [trip.to_dict() for trip in trips]
+            'data': trips
         }), 200
         
+    except InvalidFieldsError as e:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'INVALID_FIELDS',
+                'message': str(e)
+            }
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
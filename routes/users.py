@@ -1,12 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User, db
+from services.http_cache import etag_from
+from services.cache import cache, cached
 
 # Create users blueprint
 users_bp = Blueprint('users', __name__)
 
+def profile_version(user_id):
+    """Profile version for conditional GETs"""
+    return db.session.query(User.updated_at).filter_by(id=user_id).scalar()
+
 @users_bp.route('/profile', methods=['GET'])
 @jwt_required()
+@etag_from(profile_version)
+@cached(300, tags=['user:{user_id}'])
 def get_user_profile():
     """Get user profile"""
     try:
@@ -76,6 +84,7 @@ def update_user_profile():
             user.phone = data['phone']
         
         db.session.commit()
+        cache.invalidate(f'user:{user_id}', f'driver:{user_id}')
         
         # Return user list as JSON
         return jsonify({
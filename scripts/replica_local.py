@@ -0,0 +1,59 @@
+# SafeRide Backend - Local Read Replica Setup
+# Two SQLite files: a primary and a replica refreshed from it with simulated lag
+#
+# Usage:
+#   python scripts/replica_local.py --lag 1.0
+# then, in another shell, start the app with the printed environment.
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def copy_database(source_path, target_path):
+    """Copy a live SQLite database with the online backup API"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local primary + replica SQLite pair')
+    parser.add_argument('--dir', default=tempfile.gettempdir())
+    parser.add_argument('--lag', type=float, default=1.0, help='Seconds between replica refreshes')
+    args = parser.parse_args()
+
+    primary_path = os.path.join(args.dir, 'saferide_primary.db')
+    replica_path = os.path.join(args.dir, 'saferide_replica.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{primary_path}'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+    # Create and seed the primary schema
+    from app import create_app
+    from commands import init_db
+    app = create_app()
+    with app.app_context():
+        init_db()
+
+    print('Start the app with:')
+    print(f'  DATABASE_URL=sqlite:///{primary_path} DATABASE_REPLICA_URLS=sqlite:///{replica_path} python3 app.py')
+    print(f'Replicating every {args.lag}s (Ctrl+C to stop)')
+    try:
+        while True:
+            copy_database(primary_path, replica_path)
+            time.sleep(args.lag)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
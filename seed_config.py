@@ -6,11 +6,12 @@ from models import db, Config
 def run_seeds():
     """Seed initial configuration data into the database"""
     try:
-        # Default fare calculation configuration
+        # Default fare calculation configuration (keys read by services/pricing.py)
         configs = [
-            {'key': 'base_fare', 'value': '50.0'},      # Base fare in KES
-            {'key': 'per_km_rate', 'value': '25.0'},    # Rate per kilometer in KES
-            {'key': 'minimum_fare', 'value': '100.0'}   # Minimum fare in KES
+            {'key': 'TRIP_BASE_FARE', 'value': '200.0'},     # Base fare in KES
+            {'key': 'TRIP_RATE_PER_KM', 'value': '50.0'},    # Rate per kilometer in KES
+            {'key': 'TRIP_MINIMUM_FARE', 'value': '100.0'},  # Minimum fare in KES
+            {'key': 'TRIP_AVERAGE_SPEED', 'value': '30.0'}   # Average speed in km/h for duration estimates
         ]
         
         # Insert configuration if it doesn't exist
@@ -0,0 +1,235 @@
+# SafeRide Backend - Trip Archive
+# Move finished trips out of the hot tables into archive tables and read history across both
+
+from datetime import datetime, timedelta
+from sqlalchemy import MetaData, Table, Column, Index, select, insert, delete, union_all, and_, or_, text
+from sqlalchemy.schema import CreateTable, CreateIndex
+import gzip
+import json
+import logging
+import os
+
+from models import db, Trip, Payment, TripTransition, Rating
+from services import metrics
+
+logger = logging.getLogger('saferide.archive')
+
+# Archive tables live outside the models' metadata so create_all never builds
+# them; migration 0009 creates them (month-partitioned on Postgres)
+archive_metadata = MetaData()
+
+
+def _cold_copy(hot, *indexes):
+    """Archive table with the hot table's columns, no foreign keys and its own indexes"""
+    table = Table(f'{hot.name}_archive', archive_metadata, *[
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in hot.columns
+    ])
+    for name, columns in indexes:
+        Index(name, *[table.c[column] for column in columns])
+    return table
+
+
+trips_archive = _cold_copy(
+    Trip.__table__,
+    ('ix_trips_archive_passenger_id_created_at', ('passenger_id', 'created_at')),
+    ('ix_trips_archive_driver_id_created_at', ('driver_id', 'created_at')),
+)
+payments_archive = _cold_copy(Payment.__table__, ('ix_payments_archive_trip_id', ('trip_id',)))
+trip_transitions_archive = _cold_copy(TripTransition.__table__, ('ix_trip_transitions_archive_trip_id_id', ('trip_id', 'id')))
+ratings_archive = _cold_copy(Rating.__table__, ('ix_ratings_archive_trip_id', ('trip_id',)))
+
+# Rows that reference trips move with them: (hot table, archive table)
+CHILDREN = (
+    (Payment.__table__, payments_archive),
+    (TripTransition.__table__, trip_transitions_archive),
+    (Rating.__table__, ratings_archive),
+)
+
+
+class Tier:
+    """The trips and payments tables of one storage tier"""
+
+    def __init__(self, name, trips, payments):
+        self.name = name
+        self.trips = trips
+        self.payments = payments
+
+    def columns(self, columns):
+        """This tier's copies of hot-table columns (e.g. a serializer's), positionally labelled"""
+        tables = {Trip.__tablename__: self.trips, Payment.__tablename__: self.payments}
+        resolved = []
+        for index, column in enumerate(columns):
+            column = getattr(column, 'expression', column)
+            resolved.append(tables[column.table.name].c[column.name].label(f'c{index}'))
+        return resolved
+
+
+HOT = Tier('hot', Trip.__table__, Payment.__table__)
+COLD = Tier('cold', trips_archive, payments_archive)
+TIERS = (HOT, COLD)
+
+
+def read_across(build, limit, offset=0):
+    """Page through hot and archived rows together, newest first
+
+    ``build(tier)`` returns a select whose last column is the sort key.
+    Each tier is sorted and cut to ``offset + limit`` rows before the merge,
+    so both halves are served by their (owner, created_at) indexes.
+    """
+    branches = []
+    for tier in TIERS:
+        query = build(tier)
+        sort_key = list(query.selected_columns)[-1]
+        branches.append(select(query.order_by(sort_key.desc()).limit(offset + limit).subquery()))
+    merged = union_all(*branches).subquery()
+    return db.session.execute(
+        select(merged).order_by(list(merged.c)[-1].desc()).limit(limit).offset(offset)
+    ).all()
+
+
+def count_across(build):
+    """Sum a single-row aggregate select over both tiers, column by column"""
+    totals = None
+    for tier in TIERS:
+        row = db.session.execute(build(tier)).one()
+        values = [value or 0 for value in row]
+        totals = values if totals is None else [a + b for a, b in zip(totals, values)]
+    return totals
+
+
+def archivable(cutoff):
+    """Trips old enough to archive: cancelled, or completed and paid"""
+    return and_(
+        Trip.status.in_(('completed', 'cancelled')),
+        Trip.created_at < cutoff,
+        or_(Trip.status == 'cancelled', Trip.payment_status == 'paid')
+    )
+
+
+def create_tables(op):
+    """Create the archive tables and indexes (migration helper; a partitioned trips archive on Postgres)"""
+    for table in archive_metadata.sorted_tables:
+        if op.has_table(table.name):
+            continue
+        if table is trips_archive and op.dialect == 'postgresql':
+            op.execute(
+                'CREATE TABLE trips_archive (LIKE trips INCLUDING DEFAULTS, PRIMARY KEY (id, created_at)) '
+                'PARTITION BY RANGE (created_at)', table=table.name, lock=None
+            )
+        else:
+            op.execute(str(CreateTable(table).compile(db.engine)), table=table.name, lock=None)
+        for index in table.indexes:
+            # New, empty tables: plain (non-concurrent) builds are instant
+            op.execute(str(CreateIndex(index).compile(db.engine)), table=table.name, lock=None)
+
+
+_partitioned = None
+
+
+def _is_partitioned(conn):
+    global _partitioned
+    if _partitioned is None:
+        _partitioned = conn.dialect.name == 'postgresql' and conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'trips_archive'"
+        )).first() is not None
+    return _partitioned
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ensure_partitions(conn, first, last):
+    """Create the monthly trips_archive partitions covering [first, last]"""
+    month = _month_start(first)
+    while month <= last:
+        following = _month_start(month + timedelta(days=32))
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS trips_archive_{month:%Y_%m} PARTITION OF trips_archive '
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+        ))
+        month = following
+
+
+def _export(export_dir, rows_by_table):
+    """Append archived rows to monthly gzipped NDJSON files (one gzip member per batch)"""
+    os.makedirs(export_dir, exist_ok=True)
+    for table_name, rows in rows_by_table.items():
+        by_month = {}
+        for row in rows:
+            created_at = row.get('created_at') or datetime.utcnow()
+            by_month.setdefault(f'{created_at:%Y-%m}', []).append(row)
+        for month, month_rows in by_month.items():
+            path = os.path.join(export_dir, f'{table_name}-{month}.ndjson.gz')
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for row in month_rows:
+                    f.write(json.dumps(row, default=str, separators=(',', ':')) + '\n')
+
+
+def archive_batch(cutoff, batch_size=1000, export_dir=None):
+    """Move one batch of archivable trips and their child rows; returns the number of trips moved
+
+    Rows are copied with INSERT ... SELECT and deleted in the same
+    transaction, so a trip is always in exactly one tier. On Postgres the
+    picked trips are locked (SKIP LOCKED) so a concurrent rating or payment
+    callback either finishes first or waits for the move.
+    """
+    hot_trips = Trip.__table__
+    with db.engine.begin() as conn:
+        pick = select(hot_trips.c.id, hot_trips.c.created_at).where(archivable(cutoff)) \
+            .order_by(hot_trips.c.created_at).limit(batch_size)
+        if conn.dialect.name == 'postgresql':
+            pick = pick.with_for_update(skip_locked=True)
+        picked = conn.execute(pick).all()
+        if not picked:
+            return 0
+        ids = [row[0] for row in picked]
+        if _is_partitioned(conn):
+            created = [row[1] for row in picked]
+            _ensure_partitions(conn, min(created), max(created))
+
+        moved = {}
+        for hot, cold in CHILDREN:
+            names = [column.name for column in cold.columns]
+            conn.execute(insert(cold).from_select(names, select(*[hot.c[n] for n in names]).where(hot.c.trip_id.in_(ids))))
+            if export_dir:
+                moved[cold.name] = [dict(row) for row in conn.execute(select(cold).where(cold.c.trip_id.in_(ids))).mappings()]
+            conn.execute(delete(hot).where(hot.c.trip_id.in_(ids)))
+        names = [column.name for column in trips_archive.columns]
+        conn.execute(insert(trips_archive).from_select(names, select(*[hot_trips.c[n] for n in names]).where(hot_trips.c.id.in_(ids))))
+        if export_dir:
+            moved[trips_archive.name] = [dict(row) for row in conn.execute(select(trips_archive).where(trips_archive.c.id.in_(ids))).mappings()]
+        conn.execute(delete(hot_trips).where(hot_trips.c.id.in_(ids)))
+
+    if export_dir:
+        try:
+            _export(export_dir, moved)
+        except OSError:
+            logger.exception('Archive export to %s failed (rows are in the archive tables)', export_dir)
+    metrics.registry.inc('saferide_archived_trips_total', (), len(ids))
+    return len(ids)
+
+
+def archive_trips(after_days, batch_size=1000, export_dir=None, max_batches=None):
+    """Archive trips older than ``after_days`` in batches; returns the number moved"""
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size, export_dir)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+    if total:
+        logger.info('Archived %d trip(s) created before %s', total, cutoff.date())
+    return total
+
+
+def sizes():
+    """Row counts of the hot and archived trips tables"""
+    with db.engine.connect() as conn:
+        return {
+            'hot': conn.execute(select(db.func.count()).select_from(Trip.__table__)).scalar(),
+            'archived': conn.execute(select(db.func.count()).select_from(trips_archive)).scalar()
+        }
@@ -0,0 +1,260 @@
+# SafeRide Backend - Read-Through Cache
+# Per-process LRU tier, optional shared tier and tag-based invalidation
+
+from collections import OrderedDict
+from flask import g, request, make_response
+from functools import wraps
+from flask_jwt_extended import get_jwt_identity
+import pickle
+import threading
+import time
+import uuid
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTLs"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key, value, ttl):
+        """Set only if the key is absent (or expired); returns True if stored"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return False
+            self._data[key] = (time.monotonic() + ttl, value)
+            return True
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedCache(LRUCache):
+    """In-memory stand-in for the shared tier (tests and single-process development)"""
+
+
+class RedisCache:
+    """Shared tier backed by Redis"""
+
+    def __init__(self, url, prefix='saferide:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1), nx=True))
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [pickle.loads(value) if value is not None else None for value in values]
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class Cache:
+    """Two-tier read-through cache with tag-based invalidation
+
+    Every entry is stored under a key that embeds the current version of
+    each of its tags. Invalidating a tag gives it a new random version,
+    which makes all entries carrying it unreachable in both tiers at once;
+    they then age out of the LRU or expire by TTL. Versions expire after
+    ``tag_ttl`` and entry TTLs are capped at it, so a version that has
+    expired (read as 0) can no longer match a live entry. Tag versions
+    live in the shared tier when there is one, so invalidation reaches
+    every worker. Without it they live in a bounded per-process LRU; if it
+    evicts a version, every key moves to a new epoch rather than letting
+    the tag fall back to 0. Run more than one worker only with
+    CACHE_REDIS_URL set.
+    """
+
+    def __init__(self, local=None, shared=None, enabled=True, tag_ttl=3600):
+        self.local = local if local is not None else LRUCache()
+        self.tags = LRUCache(self.local.max_entries)
+        self.shared = shared
+        self.enabled = enabled
+        self.tag_ttl = tag_ttl
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0}
+
+    def configure(self, max_entries=None, shared=None, enabled=None, tag_ttl=None):
+        """Apply app configuration to the process-wide cache"""
+        if max_entries is not None:
+            self.local.max_entries = max_entries
+            self.tags.max_entries = max_entries
+        if tag_ttl is not None:
+            self.tag_ttl = tag_ttl
+        if shared is not None:
+            self.shared = shared
+        if enabled is not None:
+            self.enabled = enabled
+
+    def _versioned_key(self, key, tags):
+        """Embed the current tag versions in a key"""
+        if not tags:
+            return key
+        if self.shared is not None:
+            versions = self.shared.get_many([f'tag:{tag}' for tag in tags])
+            return f'{key}|' + ','.join(version or '0' for version in versions)
+        versions = self.tags.get_many([f'tag:{tag}' for tag in tags])
+        return f'{key}|{self.tags.evictions}:' + ','.join(version or '0' for version in versions)
+
+    def get(self, key, tags=()):
+        """Look up a value in the local tier, then the shared tier"""
+        if not self.enabled:
+            return None
+        return self._get(self._versioned_key(key, tags))
+
+    def _get(self, full_key):
+        value = self.local.get(full_key)
+        if value is not None:
+            self.stats['local_hits'] += 1
+            return value
+        if self.shared is not None:
+            value = self.shared.get(full_key)
+            if value is not None:
+                self.stats['shared_hits'] += 1
+                self.local.set(full_key, value, 5)  # Short local copy of shared hits
+                return value
+        self.stats['misses'] += 1
+        return None
+
+    def set(self, key, value, ttl, tags=()):
+        """Store a value in both tiers"""
+        if not self.enabled:
+            return
+        self._set(self._versioned_key(key, tags), value, ttl)
+
+    def _set(self, full_key, value, ttl):
+        ttl = min(ttl, self.tag_ttl)
+        self.local.set(full_key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(full_key, value, ttl)
+        self.stats['sets'] += 1
+
+    def remember(self, key, ttl, tags, compute):
+        """Return the cached value for key, computing and storing it on a miss
+
+        The value is stored under the tag versions read before computing, so
+        an invalidation that lands mid-compute leaves it unreachable rather
+        than cached under the new version.
+        """
+        if not self.enabled:
+            return compute()
+        full_key = self._versioned_key(key, tags)
+        value = self._get(full_key)
+        if value is None:
+            value = compute()
+            self._set(full_key, value, ttl)
+        return value
+
+    def invalidate(self, *tags):
+        """Invalidate every entry carrying any of the tags"""
+        store = self.shared if self.shared is not None else self.tags
+        for tag in tags:
+            if tag:
+                store.set(f'tag:{tag}', uuid.uuid4().hex[:16], self.tag_ttl)
+                self.stats['invalidations'] += 1
+
+    def hit_rate(self):
+        hits = self.stats['local_hits'] + self.stats['shared_hits']
+        lookups = hits + self.stats['misses']
+        return hits / lookups if lookups else 0.0
+
+    def metrics(self):
+        """Counters and hit rate for monitoring"""
+        return dict(self.stats, hit_rate=round(self.hit_rate(), 4), local_entries=len(self.local))
+
+
+# Shared cache for the process
+cache = Cache()
+
+
+def init_app(app):
+    """Configure the process-wide cache from app config"""
+    shared = None
+    if app.config.get('CACHE_REDIS_URL'):
+        shared = RedisCache(app.config['CACHE_REDIS_URL'])
+    cache.configure(
+        max_entries=app.config.get('CACHE_MAX_ENTRIES', 10000),
+        shared=shared,
+        enabled=app.config.get('CACHE_ENABLED', False),
+        tag_ttl=app.config.get('CACHE_TAG_TTL', 3600)
+    )
+
+
+def cached(ttl, tags=()):
+    """Cache a route's successful responses per user and request parameters
+
+    Tags may reference ``{user_id}`` and the view's URL arguments, e.g.
+    ``'driver:{user_id}'``. Must be applied below ``@jwt_required()`` (and
+    below ``@etag_from`` when both are used).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = get_jwt_identity()
+            resolved_tags = [tag.format(user_id=user_id, **kwargs) for tag in tags]
+            # Includes the @etag_from version, so the body always matches the ETag sent with it
+            key = 'view:{}:{}:{}:{}:{!r}'.format(
+                request.endpoint, user_id,
+                sorted(kwargs.items()), sorted(request.args.items(multi=True)), g.get('etag_version')
+            )
+            if not cache.enabled:
+                return view(*args, **kwargs)
+            # Versions read before the view runs, as in Cache.remember
+            full_key = cache._versioned_key(key, resolved_tags)
+            hit = cache._get(full_key)
+            if hit is not None:
+                body, mimetype = hit
+                return make_response(body, 200, {'Content-Type': mimetype})
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache._set(full_key, (response.get_data(), response.content_type), ttl)
+            return response
+        return wrapper
+    return decorator
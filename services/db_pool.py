@@ -0,0 +1,180 @@
+# SafeRide Backend - Connection Pool Configuration and Instrumentation
+# Per-environment pool sizing, pre-ping strategies and pool metrics
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+import os
+import threading
+import time
+
+# Defaults per SAFERIDE_ENV; every value can be overridden with DB_* variables.
+# Size pools against workers: total connections = workers x (pool_size + max_overflow).
+POOL_PROFILES = {
+    'development': {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10, 'pool_recycle': 300, 'pre_ping': 'always'},
+    'test': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 5, 'pool_recycle': 300, 'pre_ping': 'never'},
+    'production': {'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 5, 'pool_recycle': 1800, 'pre_ping': 'idle'},
+}
+
+# Pre-ping strategies:
+#   always - round trip on every checkout (SQLAlchemy pool_pre_ping)
+#   idle   - only ping connections idle longer than DB_PRE_PING_IDLE_SECONDS
+#   never  - rely on pool_recycle and SQLAlchemy's invalidation on disconnect errors
+PRE_PING_STRATEGIES = ('always', 'idle', 'never')
+
+
+class PoolStats:
+    """Counters for one engine's pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.checkout_wait_max = 0.0
+        self.overflow_events = 0
+        self.connections_created = 0
+        self.connection_age_total = 0.0
+        self.connection_age_max = 0.0
+        self.pings = 0
+        self.ping_failures = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_seconds += seconds
+            if seconds > self.checkout_wait_max:
+                self.checkout_wait_max = seconds
+
+    def record_age(self, seconds):
+        with self._lock:
+            self.connection_age_total += seconds
+            if seconds > self.connection_age_max:
+                self.connection_age_max = seconds
+
+    def snapshot(self, pool=None):
+        data = {
+            'checkouts': self.checkouts,
+            'checkoutWaitSecondsTotal': round(self.checkout_wait_seconds, 6),
+            'checkoutWaitSecondsMax': round(self.checkout_wait_max, 6),
+            'checkoutWaitSecondsAvg': round(self.checkout_wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+            'overflowEvents': self.overflow_events,
+            'connectionsCreated': self.connections_created,
+            'connectionAgeSecondsAvg': round(self.connection_age_total / self.checkouts, 3) if self.checkouts else 0.0,
+            'connectionAgeSecondsMax': round(self.connection_age_max, 3),
+            'pings': self.pings,
+            'pingFailures': self.ping_failures,
+            'invalidations': self.invalidations,
+            'timeouts': self.timeouts,
+        }
+        if isinstance(pool, QueuePool):
+            data.update({
+                'size': pool.size(),
+                'checkedOut': pool.checkedout(),
+                'checkedIn': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+            })
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long checkouts wait for a connection"""
+
+    stats = None  # Set per engine by instrument()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.timeouts += 1
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - start)
+
+
+def engine_options(is_sqlite, in_memory=False, environ=os.environ):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the current environment"""
+    profile = dict(POOL_PROFILES.get(environ.get('SAFERIDE_ENV', 'development'), POOL_PROFILES['development']))
+    pre_ping = environ.get('DB_PRE_PING', profile['pre_ping']).lower()
+    if pre_ping not in PRE_PING_STRATEGIES:
+        pre_ping = 'always'
+
+    options = {
+        'pool_pre_ping': pre_ping == 'always',
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', profile['pool_recycle'])),
+    }
+    if not in_memory:
+        options.update({
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': int(environ.get('DB_POOL_SIZE', profile['pool_size'])),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', profile['max_overflow'])),
+            'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', profile['pool_timeout'])),
+        })
+    return options, pre_ping
+
+
+# Stats per engine URL for the process
+pool_stats = {}
+
+
+def instrument(engine, pre_ping='always', idle_seconds=30.0):
+    """Attach pool event listeners (and the idle pre-ping strategy) to an engine"""
+    stats = pool_stats.setdefault(engine.url.render_as_string(hide_password=True), PoolStats())
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.stats = stats
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info['created_at'] = time.monotonic()
+        stats.connections_created += 1
+        pool = engine.pool
+        if isinstance(pool, QueuePool) and pool.checkedout() >= pool.size():
+            stats.overflow_events += 1
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        now = time.monotonic()
+        stats.record_age(now - connection_record.info.get('created_at', now))
+        if pre_ping != 'idle':
+            return
+        last_used = connection_record.info.get('last_checkin')
+        if last_used is None or now - last_used < idle_seconds:
+            return
+        stats.pings += 1
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        except Exception:
+            stats.ping_failures += 1
+            # The pool discards this connection and retries with a fresh one
+            raise exc.DisconnectionError()
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info['last_checkin'] = time.monotonic()
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.invalidations += 1
+
+    return stats
+
+
+def snapshot(engines):
+    """Pool metrics for a set of engines keyed by (password-free) URL"""
+    return {
+        engine.url.render_as_string(hide_password=True): pool_stats.get(
+            engine.url.render_as_string(hide_password=True), PoolStats()
+        ).snapshot(engine.pool)
+        for engine in engines
+    }
@@ -0,0 +1,271 @@
+# SafeRide Backend - Trip ETAs
+# Driving speeds per (origin cell, destination cell, hour of week) learned from completed trips
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert
+import logging
+import math
+import time
+import zlib
+
+from models import db, EtaSpeed
+from services import archive
+from services.geo import cell_id
+
+logger = logging.getLogger('saferide.eta')
+
+# Levels of the speed grid, most specific first
+FINE, COARSE, HOURLY, OVERALL = 0, 1, 2, 3
+LEVEL_NAMES = ('fine', 'coarse', 'hourly', 'overall')
+
+# Trips outside these bounds (GPS glitches, forgotten completes) are not learned from
+MIN_MINUTES, MAX_MINUTES = 1, 240
+MIN_SPEED, MAX_SPEED = 2.0, 130.0
+
+_CELL_MASK = (1 << 48) - 1
+
+
+def hour_of_week(when):
+    """0-167 counted from Monday 00:00 (UTC, like every stored timestamp)"""
+    return when.weekday() * 24 + when.hour
+
+
+def pack(origin, dest, how):
+    """One int key for (origin cell, destination cell, hour of week)"""
+    return (origin << 48 | dest) << 8 | how
+
+
+def unpack(key):
+    """(origin cell, destination cell, hour of week) of a packed key"""
+    return key >> 56, key >> 8 & _CELL_MASK, key & 0xFF
+
+
+class SpeedGrid:
+    """Learned speeds in flat dicts keyed by packed ints, with fallback to coarser levels"""
+
+    __slots__ = ('fine_degrees', 'coarse_degrees', 'fine', 'coarse', 'hourly', 'overall')
+
+    def __init__(self, fine_degrees, coarse_degrees):
+        self.fine_degrees = fine_degrees
+        self.coarse_degrees = coarse_degrees
+        self.fine = {}
+        self.coarse = {}
+        self.hourly = [None] * 168
+        self.overall = None
+
+    def add(self, level, origin, dest, how, speed):
+        if level == FINE:
+            self.fine[pack(origin, dest, how)] = speed
+        elif level == COARSE:
+            self.coarse[pack(origin, dest, how)] = speed
+        elif level == HOURLY:
+            self.hourly[how] = speed
+        else:
+            self.overall = speed
+
+    def lookup(self, pickup, dropoff, how):
+        """(speed in km/h, level) for a trip, or (None, None) if nothing was learned"""
+        size = self.fine_degrees
+        speed = self.fine.get(pack(cell_id(pickup[0], pickup[1], size), cell_id(dropoff[0], dropoff[1], size), how))
+        if speed is not None:
+            return speed, FINE
+        size = self.coarse_degrees
+        speed = self.coarse.get(pack(cell_id(pickup[0], pickup[1], size), cell_id(dropoff[0], dropoff[1], size), how))
+        if speed is not None:
+            return speed, COARSE
+        speed = self.hourly[how]
+        if speed is not None:
+            return speed, HOURLY
+        if self.overall is not None:
+            return self.overall, OVERALL
+        return None, None
+
+    def __len__(self):
+        return len(self.fine) + len(self.coarse) + sum(speed is not None for speed in self.hourly) + \
+            (self.overall is not None)
+
+
+def learn(trips, fine_degrees, coarse_degrees, min_samples=3):
+    """Aggregate (pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, km, started_at, completed_at) rows
+
+    Returns (level, origin, dest, hour_of_week, speed_kmh, samples) rows.
+    Speeds are total km over total hours, so long trips weigh more than
+    short ones; buckets with fewer than ``min_samples`` trips are left to
+    the coarser levels.
+    """
+    sums = ({}, {}, {}, {})  # level -> key -> [km, hours, trips]
+    for pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, km, started_at, completed_at in trips:
+        sample = _sample(km, started_at, completed_at)
+        if sample is None:
+            continue
+        km, hours = sample
+        how = hour_of_week(started_at)
+        keys = (
+            (cell_id(pickup_lat, pickup_lng, fine_degrees), cell_id(dropoff_lat, dropoff_lng, fine_degrees), how),
+            (cell_id(pickup_lat, pickup_lng, coarse_degrees), cell_id(dropoff_lat, dropoff_lng, coarse_degrees), how),
+            (0, 0, how),
+            (0, 0, 0),
+        )
+        for level, key in enumerate(keys):
+            total = sums[level].get(key)
+            if total is None:
+                sums[level][key] = [km, hours, 1]
+            else:
+                total[0] += km
+                total[1] += hours
+                total[2] += 1
+
+    rows = []
+    for level, buckets in enumerate(sums):
+        for (origin, dest, how), (km, hours, count) in buckets.items():
+            if count >= min_samples or level == OVERALL:
+                rows.append((level, origin, dest, how, round(km / hours, 2), count))
+    return rows
+
+
+def _sample(km, started_at, completed_at):
+    """(km, hours) of a completed trip, or None if it looks wrong"""
+    if not km or started_at is None or completed_at is None:
+        return None
+    km = float(km)
+    minutes = (completed_at - started_at).total_seconds() / 60
+    if not MIN_MINUTES <= minutes <= MAX_MINUTES or not MIN_SPEED <= km / minutes * 60 <= MAX_SPEED:
+        return None
+    return km, minutes / 60
+
+
+def grid_from_rows(rows, fine_degrees, coarse_degrees):
+    grid = SpeedGrid(fine_degrees, coarse_degrees)
+    for level, origin, dest, how, speed, _ in rows:
+        grid.add(level, origin, dest, how, speed)
+    return grid
+
+
+def completed_trips(history_days, with_ids=False):
+    """Stream completed trips with ride timestamps from the hot and archive tables"""
+    since = datetime.utcnow() - timedelta(days=history_days)
+    for tier in archive.TIERS:
+        trips = tier.trips.c
+        columns = [trips.pickup_lat, trips.pickup_lng, trips.dropoff_lat, trips.dropoff_lng, trips.distance,
+                   trips.started_at, trips.completed_at]
+        if with_ids:
+            columns.append(trips.id)
+        query = select(*columns).where(
+            trips.status == 'completed',
+            trips.started_at.isnot(None),
+            trips.created_at >= since
+        ).execution_options(yield_per=10000)
+        for row in db.session.execute(query):
+            yield (float(row[0]), float(row[1]), float(row[2]), float(row[3])) + tuple(row[4:])
+
+
+def held_out(trip_id, fraction):
+    """Stable pick of ``fraction`` of trips for evaluation (same trips on every run)"""
+    return zlib.crc32(trip_id.encode()) % 10000 < fraction * 10000
+
+
+def build(fine_degrees, coarse_degrees, min_samples=3, history_days=90):
+    """Relearn the speed grid from completed trips and replace eta_speeds; returns row counts per level"""
+    rows = learn(completed_trips(history_days), fine_degrees, coarse_degrees, min_samples)
+    built_at = datetime.utcnow()
+    table = EtaSpeed.__table__
+    with db.engine.begin() as conn:
+        conn.execute(delete(table))
+        for start in range(0, len(rows), 5000):
+            conn.execute(insert(table), [
+                {'level': level, 'origin_cell': origin, 'dest_cell': dest, 'hour_of_week': how,
+                 'speed_kmh': speed, 'samples': samples, 'built_at': built_at}
+                for level, origin, dest, how, speed, samples in rows[start:start + 5000]
+            ])
+    counts = {name: 0 for name in LEVEL_NAMES}
+    for row in rows:
+        counts[LEVEL_NAMES[row[0]]] += 1
+    logger.info('Built ETA speed grid: %s', counts)
+    return counts
+
+
+def evaluate(fine_degrees, coarse_degrees, default_speed, min_samples=3, history_days=90, holdout=0.1):
+    """Accuracy on held-out trips of a grid learned from the rest, against the single-speed estimate"""
+    training, testing = [], []
+    for row in completed_trips(history_days, with_ids=True):
+        (testing if held_out(row[7], holdout) else training).append(row[:7])
+    grid = grid_from_rows(learn(training, fine_degrees, coarse_degrees, min_samples), fine_degrees, coarse_degrees)
+
+    model_errors, baseline_errors, actuals = [], [], []
+    levels = {name: 0 for name in LEVEL_NAMES + ('none',)}
+    for pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, km, started_at, completed_at in testing:
+        if _sample(km, started_at, completed_at) is None:
+            continue
+        km = float(km)
+        actual = (completed_at - started_at).total_seconds() / 60
+        speed, level = grid.lookup((pickup_lat, pickup_lng), (dropoff_lat, dropoff_lng), hour_of_week(started_at))
+        levels[LEVEL_NAMES[level] if level is not None else 'none'] += 1
+        model_errors.append(km / (speed or default_speed) * 60 - actual)
+        baseline_errors.append(km / default_speed * 60 - actual)
+        actuals.append(actual)
+    return {
+        'trainingTrips': len(training),
+        'heldOutTrips': len(actuals),
+        'gridEntries': len(grid),
+        'levelsUsed': levels,
+        'model': _accuracy(model_errors, actuals),
+        'singleSpeed': _accuracy(baseline_errors, actuals),
+    }
+
+
+def _accuracy(errors, actuals):
+    if not errors:
+        return None
+    absolute = sorted(abs(error) for error in errors)
+    return {
+        'maeMinutes': round(sum(absolute) / len(absolute), 2),
+        'p90AbsErrorMinutes': round(absolute[math.ceil(len(absolute) * 0.9) - 1], 2),
+        'biasMinutes': round(sum(errors) / len(errors), 2),
+        'mape': round(sum(abs(e) / a for e, a in zip(errors, actuals)) / len(errors) * 100, 1),
+        'within20Percent': round(sum(abs(e) <= 0.2 * a for e, a in zip(errors, actuals)) / len(errors), 3),
+    }
+
+
+class EtaModel:
+    """The speed grid served from memory, reloaded when a new build lands"""
+
+    def __init__(self, fine_degrees=0.01, coarse_degrees=0.05, reload_seconds=300):
+        self.fine_degrees = fine_degrees
+        self.coarse_degrees = coarse_degrees
+        self.reload_seconds = reload_seconds
+        self.grid = SpeedGrid(fine_degrees, coarse_degrees)
+        self.built_at = None
+        self._checked_at = None
+
+    def speed(self, pickup, dropoff, when=None):
+        """Learned speed (km/h) for a trip starting at ``when`` (default now), or None"""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.reload_seconds:
+            self._checked_at = now
+            self.refresh()
+        return self.grid.lookup(pickup, dropoff, hour_of_week(when or datetime.utcnow()))[0]
+
+    def refresh(self):
+        """Load the grid if eta_speeds holds a newer build; keeps the current grid if it can't"""
+        try:
+            built_at = db.session.query(db.func.max(EtaSpeed.built_at)).scalar()
+            if built_at is not None and built_at != self.built_at:
+                rows = db.session.query(EtaSpeed.level, EtaSpeed.origin_cell, EtaSpeed.dest_cell,
+                                        EtaSpeed.hour_of_week, EtaSpeed.speed_kmh, EtaSpeed.samples).all()
+                self.grid = grid_from_rows(rows, self.fine_degrees, self.coarse_degrees)
+                self.built_at = built_at
+        except Exception:
+            db.session.rollback()
+            logger.exception('Could not load the ETA speed grid; keeping the current one')
+
+
+# Shared model for the process
+eta = EtaModel()
+
+
+def init_app(app):
+    """Configure the process-wide ETA model from app config"""
+    eta.fine_degrees = app.config['ETA_CELL_DEGREES']
+    eta.coarse_degrees = app.config['ETA_COARSE_CELL_DEGREES']
+    eta.reload_seconds = app.config['ETA_RELOAD_SECONDS']
+    eta.grid = SpeedGrid(eta.fine_degrees, eta.coarse_degrees)
@@ -0,0 +1,100 @@
+# SafeRide Backend - Expiry Sweeper
+# Cancel trips and expire payments that have waited too long in a non-final status
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+import logging
+
+from models import db, Trip, Payment
+from services import idempotency, metrics, outbox, trip_states
+
+logger = logging.getLogger('saferide.expiry')
+
+# Trip status -> column holding when the trip entered it
+TRIP_STATUS_SINCE = {
+    'requested': Trip.created_at,
+    'accepted': Trip.accepted_at,
+    'arrived': Trip.arrived_at,
+}
+
+
+def expire_trips(status, timeout_seconds, batch_size=500):
+    """Cancel trips that have been in ``status`` longer than the timeout; returns how many
+
+    Each batch picks the oldest candidates through ix_trips_status_created_at
+    and cancels them through the state machine's 'expire' transition, one
+    conditional UPDATE limited to ``status``, so a trip a driver accepts
+    mid-sweep is left alone. The batch's transition log and outbox rows
+    commit with it; the state machine then refreshes the available-trips
+    cache.
+    """
+    since = TRIP_STATUS_SINCE[status]
+    expired = 0
+    while True:
+        now = datetime.utcnow()
+        ids = db.session.execute(
+            select(Trip.id).where(Trip.status == status, since < now - timedelta(seconds=timeout_seconds))
+            .order_by(since).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        rows = trip_states.transition_many(ids, 'expire', reason='expired', sources=(status,), now=now)
+        for trip_id, previous_status, passenger_id, driver_id in rows:
+            outbox.record('trip.expired', 'trip', trip_id, passengerId=passenger_id, driverId=driver_id,
+                          previousStatus=previous_status, cancelledAt=now)
+        db.session.commit()
+        expired += len(rows)
+        if len(ids) < batch_size:
+            break
+    if expired:
+        metrics.registry.inc('saferide_expired_total', ('trip', status), expired)
+        logger.info('Expired %d %s trip(s) older than %ss', expired, status, timeout_seconds)
+    return expired
+
+
+def expire_payments(timeout_seconds, batch_size=500):
+    """Mark pending payments older than the timeout as expired; returns how many
+
+    Frees the trip for a new payment attempt. A late M-Pesa callback for
+    an expired payment still records it as paid, unless a retry has paid
+    the trip meanwhile; then it is recorded as 'duplicate' for a refund.
+    """
+    expired = 0
+    while True:
+        now = datetime.utcnow()
+        ids = db.session.execute(
+            select(Payment.id).where(Payment.status == 'pending',
+                                     Payment.created_at < now - timedelta(seconds=timeout_seconds))
+            .order_by(Payment.created_at).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        rows = db.session.execute(
+            update(Payment).where(Payment.id.in_(ids), Payment.status == 'pending')
+            .values(status='expired')
+            .returning(Payment.id, Payment.trip_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for payment_id, trip_id in rows:
+            outbox.record('payment.expired', 'payment', payment_id, tripId=trip_id)
+        db.session.commit()
+        expired += len(rows)
+        if len(ids) < batch_size:
+            break
+    if expired:
+        metrics.registry.inc('saferide_expired_total', ('payment', 'pending'), expired)
+        logger.info('Expired %d pending payment(s) older than %ss', expired, timeout_seconds)
+    return expired
+
+
+def sweep(config):
+    """One pass over every configured timeout (0 disables a timeout) and expired idempotency keys; returns counts"""
+    batch_size = config['EXPIRY_BATCH_SIZE']
+    counts = {}
+    for status, timeout in config['TRIP_EXPIRY_SECONDS'].items():
+        if timeout > 0:
+            counts[f'trips.{status}'] = expire_trips(status, timeout, batch_size)
+    if config['PAYMENT_EXPIRY_SECONDS'] > 0:
+        counts['payments.pending'] = expire_payments(config['PAYMENT_EXPIRY_SECONDS'], batch_size)
+    counts['idempotency_keys'] = idempotency.purge_expired(batch_size)
+    return counts
@@ -0,0 +1,37 @@
+# SafeRide Backend - Geo Helpers
+# Great-circle distance and a fixed lat/lng grid of cells shared by pricing, surge and ETA
+
+import math
+
+EARTH_RADIUS_KM = 6371.0
+
+# Cell ids pack (row, col) into one int; columns fit in 24 bits for cells >= 0.0001 degrees
+_COL_BITS = 24
+_COL_MASK = (1 << _COL_BITS) - 1
+
+
+def haversine_km(lat1, lng1, lat2, lng2, radius=EARTH_RADIUS_KM):
+    """Great-circle distance in km"""
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * radius * math.asin(math.sqrt(a))
+
+
+def cell_id(lat, lng, size):
+    """Id of the ``size``-degree grid cell containing a point"""
+    row = int((lat + 90.0) // size)
+    col = int((lng + 180.0) // size)
+    return row << _COL_BITS | col
+
+
+def cell_center(cell, size):
+    """(lat, lng) of a cell's center"""
+    row, col = cell >> _COL_BITS, cell & _COL_MASK
+    return (row + 0.5) * size - 90.0, (col + 0.5) * size - 180.0
+
+
+def coarser(cell, size, coarse_size):
+    """Id of the ``coarse_size`` cell containing a ``size`` cell"""
+    lat, lng = cell_center(cell, size)
+    return cell_id(lat, lng, coarse_size)
@@ -0,0 +1,123 @@
+# SafeRide Backend - HTTP Caching and Compression
+# Weak ETags, conditional GET (304) and gzip/brotli response compression
+
+from flask import g, request, make_response
+from functools import wraps
+from flask_jwt_extended import get_jwt_identity
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/msgpack', 'application/x-msgpack', 'text/plain', 'text/html')
+
+
+def weak_etag(*parts):
+    """Build a weak ETag from arbitrary parts"""
+    digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _not_modified(etag):
+    """Empty 304 response carrying the current ETag"""
+    response = make_response('', 304)
+    response.headers['ETag'] = etag
+    return response
+
+
+def _matches(etag):
+    """Check the request's If-None-Match against an ETag (weak comparison)"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def etag_from(version_fn):
+    """Answer conditional GETs from a cheap version lookup before running the view
+
+    ``version_fn(user_id)`` returns anything that changes whenever the
+    resource does (typically an ``updated_at``), or None to skip. A matching
+    If-None-Match short-circuits with 304 without the full query and
+    serialization; otherwise the view runs and the response carries the ETag.
+    The version is left in ``g.etag_version`` so a ``@cached`` layer below
+    keys its entries by it, and a cached body can never be served under a
+    newer ETag than the one it was built for.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = get_jwt_identity()
+            version = version_fn(user_id)
+            if version is None:
+                return view(*args, **kwargs)
+            etag = weak_etag(request.endpoint, user_id, version)
+            if _matches(etag):
+                return _not_modified(etag)
+            g.etag_version = version
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+def _add_etag(response):
+    """Hash the body of a GET response into a weak ETag and honour If-None-Match"""
+    if request.method != 'GET' or response.status_code != 200:
+        return response
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    etag = response.headers.get('ETag')
+    if etag is None:
+        etag = weak_etag(response.get_data())
+        response.headers['ETag'] = etag
+    if _matches(etag):
+        return _not_modified(etag)
+    return response
+
+
+def _compress(response, min_size):
+    """Compress eligible responses with brotli or gzip"""
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=4))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_app(app):
+    """Register the ETag and compression hooks on an app"""
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def cache_and_compress(response):
+        response = _add_etag(response)
+        return _compress(response, min_size)
@@ -0,0 +1,168 @@
+# SafeRide Backend - Idempotency Keys
+# Replay stored responses for client retries carrying the same Idempotency-Key header
+
+from datetime import datetime, timedelta
+from flask import current_app, request, jsonify, make_response
+from functools import wraps
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+import hashlib
+import json
+import time
+import uuid
+
+from models import db, IdempotencyKey
+from services import metrics
+from services.sqlite_writer import run_write
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+REPLAYED_HEADERS = ('Content-Type', 'Location')
+
+keys = IdempotencyKey.__table__
+
+
+def _error(status, code, message):
+    response = jsonify({'success': False, 'error': {'code': code, 'message': message}})
+    response.status_code = status
+    return response
+
+
+def _replay(row):
+    response = make_response(row.body, row.status_code, json.loads(row.headers or '{}'))
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.path.encode(), request.get_data(cache=True)):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _claim(user_id, key_hash, fingerprint, token, lock_seconds, ttl):
+    """Insert the key as in flight; False if a row for it already exists"""
+    now = datetime.utcnow()
+    statement = insert(keys).values(
+        user_id=user_id, key_hash=key_hash, fingerprint=fingerprint, lock_token=token,
+        locked_until=now + timedelta(seconds=lock_seconds), created_at=now, expires_at=now + timedelta(seconds=ttl)
+    )
+    try:
+        run_write(lambda conn: conn.execute(statement))
+    except IntegrityError:
+        return False
+    return True
+
+
+def _load(user_id, key_hash):
+    # Own connection: the view's session must not start its transaction this early
+    with db.engine.connect() as conn:
+        return conn.execute(select(keys).where(keys.c.user_id == user_id, keys.c.key_hash == key_hash)).first()
+
+
+def _take_over(row, fingerprint, token, lock_seconds):
+    """Claim a key whose holder died before storing a response; False if another request got there first"""
+    now = datetime.utcnow()
+    statement = update(keys).where(
+        keys.c.id == row.id, keys.c.status_code.is_(None), keys.c.locked_until < now
+    ).values(fingerprint=fingerprint, lock_token=token, locked_until=now + timedelta(seconds=lock_seconds))
+    return run_write(lambda conn: conn.execute(statement).rowcount) == 1
+
+
+def _drop_expired(row):
+    statement = delete(keys).where(keys.c.id == row.id, keys.c.expires_at < datetime.utcnow())
+    run_write(lambda conn: conn.execute(statement))
+
+
+def purge_expired(batch_size=1000):
+    """Delete keys past their TTL in batches; returns how many"""
+    purged = 0
+    while True:
+        statement = delete(keys).where(keys.c.id.in_(
+            select(keys.c.id).where(keys.c.expires_at < datetime.utcnow()).limit(batch_size).scalar_subquery()
+        ))
+        deleted = run_write(lambda conn: conn.execute(statement).rowcount)
+        purged += deleted
+        if deleted < batch_size:
+            return purged
+
+
+def idempotent(view):
+    """Run a mutating view at most once per user and Idempotency-Key
+
+    The first request under a key inserts its row in idempotency_keys (the
+    unique (user_id, key_hash) constraint lets only one insert win, across
+    every worker), runs the view and stores its response on the row (5xx
+    responses are not stored, so those retries run again). Retries within
+    IDEMPOTENCY_TTL_SECONDS get the stored response; duplicates arriving
+    while the first is still running wait for it for up to
+    IDEMPOTENCY_LOCK_SECONDS, then get 409, and a key whose request died
+    is taken over once that lock runs out. Reusing a key with a different
+    request body is rejected with 422. Requests without the header are
+    unaffected. Must be applied below ``@jwt_required()``.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error(400, 'INVALID_IDEMPOTENCY_KEY', f'{HEADER} must be 1-{MAX_KEY_LENGTH} characters')
+
+        endpoint = request.endpoint
+        user_id = get_jwt_identity()
+        key_hash = hashlib.sha256(key.encode()).hexdigest()
+        fingerprint = _fingerprint()
+        lock_seconds = current_app.config['IDEMPOTENCY_LOCK_SECONDS']
+        token = uuid.uuid4().hex
+        owner = (keys.c.user_id == user_id, keys.c.key_hash == key_hash, keys.c.lock_token == token)
+
+        deadline = time.monotonic() + lock_seconds
+        while not _claim(user_id, key_hash, fingerprint, token, lock_seconds, current_app.config['IDEMPOTENCY_TTL_SECONDS']):
+            row = _load(user_id, key_hash)
+            if row is None:
+                continue  # Released (5xx) or purged meanwhile
+            if row.expires_at < datetime.utcnow():
+                _drop_expired(row)
+                continue
+            if row.fingerprint != fingerprint:
+                metrics.registry.inc('saferide_idempotency_total', (endpoint, 'mismatch'))
+                return _error(422, 'IDEMPOTENCY_KEY_REUSED', f'{HEADER} was already used for a different request')
+            if row.status_code is not None:
+                metrics.registry.inc('saferide_idempotency_total', (endpoint, 'replayed'))
+                return _replay(row)
+            # A duplicate is in flight; wait for its response instead of running the handler again
+            if row.locked_until < datetime.utcnow() and _take_over(row, fingerprint, token, lock_seconds):
+                break
+            if time.monotonic() >= deadline:
+                metrics.registry.inc('saferide_idempotency_total', (endpoint, 'conflict'))
+                response = _error(409, 'IDEMPOTENCY_IN_PROGRESS', 'A request with this key is still being processed')
+                response.headers['Retry-After'] = '1'
+                return response
+            time.sleep(POLL_SECONDS)
+
+        stored = False
+        try:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code < 500:
+                statement = update(keys).where(*owner).values(
+                    status_code=response.status_code,
+                    body=response.get_data(),
+                    headers=json.dumps({name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}),
+                    lock_token=None,
+                    locked_until=None
+                )
+                stored = run_write(lambda conn: conn.execute(statement).rowcount) == 1
+                if stored:
+                    metrics.registry.inc('saferide_idempotency_total', (endpoint, 'stored'))
+            return response
+        finally:
+            if not stored:
+                # Release the key (one conditional DELETE) so a retry runs the view again
+                statement = delete(keys).where(*owner, keys.c.status_code.is_(None))
+                run_write(lambda conn: conn.execute(statement))
+    return wrapper
@@ -0,0 +1,484 @@
+# SafeRide Backend - Background Jobs
+# Durable job queue in the jobs table with priorities, retries with backoff and worker processes
+
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, event, text
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from models import db, Job
+from services import metrics
+from services.sqlite_writer import retry_busy
+
+logger = logging.getLogger('saferide.jobs')
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+TASK_MODULES = ('services.tasks',)
+
+# Periodic tasks: task name -> app config key holding the interval in seconds (0 disables)
+SCHEDULES = {
+    'maintenance.expire_stale': 'EXPIRY_SWEEP_INTERVAL',
+    'maintenance.archive_trips': 'ARCHIVE_INTERVAL',
+    'maintenance.build_eta': 'ETA_BUILD_INTERVAL',
+    'maintenance.surge': 'SURGE_TICK_SECONDS',
+}
+
+# Task name -> Task
+TASKS = {}
+
+
+class Task:
+    """A function that can run in a worker"""
+
+    def __init__(self, fn, name, queue, priority, max_attempts):
+        self.fn = fn
+        self.name = name
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.fn(**kwargs)
+
+    def delay(self, **kwargs):
+        """Enqueue with keyword arguments (must be JSON-serializable)"""
+        return enqueue(self.name, kwargs)
+
+
+def task(name, queue='default', priority=PRIORITY_NORMAL, max_attempts=5):
+    """Register a function as a background task"""
+    def decorator(fn):
+        TASKS[name] = Task(fn, name, queue, priority, max_attempts)
+        return TASKS[name]
+    return decorator
+
+
+def _load_tasks():
+    for module in TASK_MODULES:
+        importlib.import_module(module)
+
+
+def enqueue(name, payload=None, priority=None, delay=0, queue=None):
+    """Add a job to the current session
+
+    The job commits (or rolls back) with the caller's transaction, so a
+    request never enqueues work for changes that did not persist. With
+    JOBS_EAGER the task runs in-process right after that commit instead
+    (local development without a worker), so it sees the caller's rows and
+    never commits the caller's half-built transaction.
+    """
+    if name not in TASKS:
+        _load_tasks()
+    registered = TASKS[name]
+    payload = payload or {}
+    if has_app_context() and current_app.config.get('JOBS_EAGER'):
+        db.session.info.setdefault('eager_jobs', []).append((registered, payload))
+        return None
+    job = Job(
+        queue=queue or registered.queue,
+        name=name,
+        payload=json.dumps(payload),
+        priority=registered.priority if priority is None else priority,
+        max_attempts=registered.max_attempts,
+        status='queued',
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    return job
+
+
+def _run_eager_jobs(session):
+    """Run the session's JOBS_EAGER tasks now that its transaction committed"""
+    pending = session.info.pop('eager_jobs', None)
+    if not pending:
+        return
+    # A fresh app context gets its own session; this one cannot emit SQL inside after_commit
+    for registered, payload in pending:
+        with current_app.app_context():
+            try:
+                registered(**payload)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Eager job %s failed', registered.name)
+
+
+def _drop_eager_jobs(session):
+    """Tasks enqueued in a rolled-back transaction never run"""
+    session.info.pop('eager_jobs', None)
+
+
+event.listen(db.session, 'after_commit', _run_eager_jobs)
+event.listen(db.session, 'after_rollback', _drop_eager_jobs)
+
+
+def schedule_interval(name):
+    """Seconds between runs of a periodic task, or 0 if it is not scheduled"""
+    key = SCHEDULES.get(name)
+    return current_app.config.get(key, 0) if key else 0
+
+
+def ensure_scheduled(queues):
+    """Queue each periodic task on these queues that has no queued or running job
+
+    Bootstraps the schedule on first start and after a periodic job dies;
+    otherwise each run queues its successor (see run_job).
+    """
+    _load_tasks()
+    for name in SCHEDULES:
+        registered = TASKS[name]
+        if registered.queue not in queues or schedule_interval(name) <= 0:
+            continue
+        exists = db.session.query(Job.id).filter(
+            Job.queue == registered.queue, Job.status.in_(('queued', 'running')), Job.name == name
+        ).first()
+        if not exists:
+            enqueue(name)
+    db.session.commit()
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter: ~5s, 10s, 20s ... capped at an hour"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.5)
+
+
+_CLAIM_COLUMNS = 'id, queue, name, payload, attempts, max_attempts, run_at'
+
+
+def claim(worker_id, queues, limit=1):
+    """Lease up to ``limit`` runnable jobs for this worker
+
+    Postgres claims with one UPDATE over a ``FOR UPDATE SKIP LOCKED``
+    subquery, so concurrent workers never wait on each other's rows.
+    SQLite has no row locks: candidates are read first and each is claimed
+    with a conditional UPDATE (status still 'queued'); a job another worker
+    took first updates zero rows and is skipped.
+    """
+    now = datetime.utcnow()
+    params = {'worker': worker_id, 'now': now, 'queues': list(queues), 'limit': limit}
+    if db.engine.dialect.name == 'postgresql':
+        statement = text(f"""
+            UPDATE jobs SET status = 'running', locked_by = :worker, locked_at = :now,
+                            started_at = :now, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status = 'queued' AND queue IN :queues AND run_at <= :now
+                ORDER BY priority, run_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {_CLAIM_COLUMNS}
+        """).bindparams(bindparam('queues', expanding=True))
+        with db.engine.begin() as conn:
+            return [dict(row) for row in conn.execute(statement, params).mappings()]
+
+    candidates_sql = text("""
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND queue IN :queues AND run_at <= :now
+        ORDER BY priority, run_at
+        LIMIT :candidates
+    """).bindparams(bindparam('queues', expanding=True))
+    with db.engine.connect() as conn:
+        candidates = conn.execute(candidates_sql, dict(params, candidates=limit * 4)).scalars().all()
+    def claim_one(job_id):
+        with db.engine.begin() as conn:
+            updated = conn.execute(text("""
+                UPDATE jobs SET status = 'running', locked_by = :worker, locked_at = :now,
+                                started_at = :now, attempts = attempts + 1
+                WHERE id = :id AND status = 'queued'
+            """), dict(params, id=job_id)).rowcount
+            if updated:
+                return dict(conn.execute(text(f'SELECT {_CLAIM_COLUMNS} FROM jobs WHERE id = :id'),
+                                         {'id': job_id}).mappings().one())
+
+    claimed = []
+    for job_id in candidates:
+        # Retried on busy so a lock blip never strands jobs already claimed in this call
+        row = retry_busy(lambda: claim_one(job_id))
+        if row:
+            claimed.append(row)
+        if len(claimed) >= limit:
+            break
+    return claimed
+
+
+def run_job(job):
+    """Run one claimed job and record success, retry or death"""
+    name = job['name']
+    started = time.perf_counter()
+    run_at = job['run_at']
+    if isinstance(run_at, str):
+        run_at = datetime.fromisoformat(run_at)
+    metrics.registry.observe('saferide_job_wait_seconds', (job['queue'],), max((datetime.utcnow() - run_at).total_seconds(), 0))
+    try:
+        if name not in TASKS:
+            _load_tasks()
+        registered = TASKS.get(name)
+        if registered is None:
+            raise LookupError(f'Unknown task {name}')
+        registered(**json.loads(job['payload'] or '{}'))
+        interval = schedule_interval(name)
+        if interval > 0 and not current_app.config.get('JOBS_EAGER'):
+            enqueue(name, delay=interval)  # Next run commits with this one's outcome
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)[-2000:]
+        dead = job['attempts'] >= job['max_attempts']
+        _finish(text("""
+            UPDATE jobs SET status = :status, run_at = :run_at, last_error = :error,
+                            locked_by = NULL, locked_at = NULL, finished_at = :finished_at
+            WHERE id = :id
+        """), {
+            'id': job['id'],
+            'status': 'dead' if dead else 'queued',
+            'run_at': datetime.utcnow() + timedelta(seconds=0 if dead else backoff_seconds(job['attempts'])),
+            'error': error,
+            'finished_at': datetime.utcnow() if dead else None
+        })
+        outcome = 'dead' if dead else 'retry'
+        logger.warning('Job %s (%s) failed on attempt %s/%s%s', job['id'], name, job['attempts'],
+                       job['max_attempts'], ', giving up' if dead else '', exc_info=dead)
+    else:
+        _finish(text("""
+            UPDATE jobs SET status = 'done', finished_at = :now, locked_by = NULL, locked_at = NULL
+            WHERE id = :id
+        """), {'id': job['id'], 'now': datetime.utcnow()})
+        outcome = 'done'
+    finally:
+        db.session.remove()
+    metrics.registry.observe('saferide_job_duration_seconds', (name,), time.perf_counter() - started)
+    metrics.registry.inc('saferide_jobs_total', (name, outcome))
+    return outcome
+
+
+def _finish(statement, params):
+    """Record a job's outcome in its own transaction, retried on SQLite busy"""
+    def write():
+        with db.engine.begin() as conn:
+            conn.execute(statement, params)
+    retry_busy(write)
+
+
+def requeue_stale(visibility_timeout):
+    """Return jobs leased by workers that died mid-run to the queue; returns (requeued, dead)
+
+    A job whose lease expired on its last attempt is marked dead instead,
+    so a task that kills its worker cannot loop forever.
+    """
+    now = datetime.utcnow()
+    params = {'cutoff': now - timedelta(seconds=visibility_timeout), 'now': now}
+    with db.engine.begin() as conn:
+        dead = conn.execute(text("""
+            UPDATE jobs SET status = 'dead', locked_by = NULL, locked_at = NULL, finished_at = :now,
+                            last_error = 'Lease expired on the last attempt (worker died or hung)'
+            WHERE status = 'running' AND locked_at < :cutoff AND attempts >= max_attempts
+        """), params).rowcount
+        requeued = conn.execute(text("""
+            UPDATE jobs SET status = 'queued', locked_by = NULL, locked_at = NULL
+            WHERE status = 'running' AND locked_at < :cutoff
+        """), params).rowcount
+    return requeued, dead
+
+
+class Lease:
+    """Renew a running job's ``locked_at`` from a background thread
+
+    Long jobs (archiving, ETA builds) would otherwise outlive the visibility
+    timeout and be handed to a second worker while still running.
+    """
+
+    def __init__(self, app, job_id, worker_id, interval):
+        self.app = app
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._renew, name=f'job-lease-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+    def _renew(self):
+        while not self._done.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(text("""
+                            UPDATE jobs SET locked_at = :now
+                            WHERE id = :id AND locked_by = :worker AND status = 'running'
+                        """), {'id': self.job_id, 'worker': self.worker_id, 'now': datetime.utcnow()})
+                except Exception:
+                    logger.exception('Renewing the lease on job %s failed', self.job_id)
+
+
+def purge_finished(retention_days, batch_size=1000):
+    """Delete finished jobs older than the retention window, in small batches"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        with db.engine.begin() as conn:
+            count = conn.execute(text("""
+                DELETE FROM jobs WHERE id IN (
+                    SELECT id FROM jobs WHERE status = 'done' AND finished_at < :cutoff LIMIT :limit
+                )
+            """), {'cutoff': cutoff, 'limit': batch_size}).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def backlog():
+    """Job counts per queue and status, plus the age of the oldest runnable job per queue"""
+    now = datetime.utcnow()
+    with db.engine.connect() as conn:
+        counts = conn.execute(text("""
+            SELECT queue, status, COUNT(*) FROM jobs
+            WHERE status IN ('queued', 'running', 'dead')
+            GROUP BY queue, status
+        """)).all()
+        oldest = conn.execute(text("""
+            SELECT queue, MIN(run_at) FROM jobs
+            WHERE status = 'queued' AND run_at <= :now
+            GROUP BY queue
+        """), {'now': now}).all()
+    summary = {}
+    for queue, status, count in counts:
+        summary.setdefault(queue, {'queued': 0, 'running': 0, 'dead': 0, 'oldestSeconds': 0})[status] = count
+    for queue, run_at in oldest:
+        if isinstance(run_at, str):
+            run_at = datetime.fromisoformat(run_at)
+        summary.setdefault(queue, {'queued': 0, 'running': 0, 'dead': 0, 'oldestSeconds': 0})['oldestSeconds'] = \
+            round((now - run_at).total_seconds(), 1)
+    return summary
+
+
+def backlog_metrics():
+    """Backlog gauges for /metrics (collected once per scrape, not per worker)"""
+    items = []
+    for queue, counts in backlog().items():
+        for status in ('queued', 'running', 'dead'):
+            items.append(('saferide_job_backlog', (queue, status), counts[status]))
+        items.append(('saferide_job_oldest_seconds', (queue,), counts['oldestSeconds']))
+    return items
+
+
+class Worker:
+    """Poll the queue from ``concurrency`` threads until stopped
+
+    Each thread claims one job at a time and renews its lease every third
+    of the visibility timeout while it runs. SIGTERM/SIGINT stop claiming
+    new jobs and let running ones finish.
+    """
+
+    def __init__(self, app, queues=('default',), concurrency=1, poll_interval=1.0, visibility_timeout=300,
+                 retention_days=7):
+        self.app = app
+        self.queues = tuple(queues)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.retention_days = retention_days
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.processed = 0
+        _load_tasks()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info('Worker %s polling %s with %d thread(s)', self.worker_id, ','.join(self.queues), self.concurrency)
+        threads = [threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        next_maintenance = 0.0
+        while not self.stopping.is_set():
+            if time.monotonic() >= next_maintenance:
+                next_maintenance = time.monotonic() + 60
+                with self.app.app_context():
+                    try:
+                        requeued, dead = requeue_stale(self.visibility_timeout)
+                        if requeued:
+                            logger.warning('Requeued %d job(s) from dead workers', requeued)
+                        if dead:
+                            logger.error('Gave up on %d job(s) whose last attempt never finished', dead)
+                        purge_finished(self.retention_days)
+                        ensure_scheduled(self.queues)
+                    except Exception:
+                        logger.exception('Job maintenance failed')
+            if metrics.store is not None and metrics.store.flush_due():
+                metrics.store.flush(metrics.registry.items())
+            self.stopping.wait(1)
+        for thread in threads:
+            thread.join()
+        if metrics.store is not None:
+            metrics.store.flush(metrics.registry.items())
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            with self.app.app_context():
+                try:
+                    jobs = claim(self.worker_id, self.queues)
+                except Exception:
+                    logger.exception('Claiming jobs failed')
+                    jobs = []
+                for job in jobs:
+                    with Lease(self.app, job['id'], self.worker_id, self.visibility_timeout / 3):
+                        run_job(job)
+                    self.processed += 1
+            if not jobs:
+                # Jitter so idle workers do not poll in lockstep
+                self.stopping.wait(self.poll_interval * random.uniform(0.5, 1.5))
+
+
+def _worker_process(app, options):
+    with app.app_context():
+        db.engine.dispose()  # Never share connections with the parent
+    Worker(app, **options).run()
+
+
+def run_workers(app, processes=1, **options):
+    """Run one worker in this process, or ``processes`` forked worker processes"""
+    if processes <= 1:
+        Worker(app, **options).run()
+        return
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_worker_process, args=(app, options), name=f'jobs-worker-{i}')
+                for i in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for child in children:
+        child.join()
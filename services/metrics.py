@@ -0,0 +1,364 @@
+# SafeRide Backend - Metrics
+# Prometheus-style request, database and external call metrics with a /metrics endpoint
+
+from bisect import bisect_left
+from flask import g, request, Response, has_request_context
+from functools import wraps
+from sqlalchemy import event
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('saferide.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+JOB_WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+# Clients allowed to scrape /metrics when no METRICS_TOKEN is set
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+# name -> (type, help, label names, buckets)
+METRICS = {
+    'saferide_http_request_duration_seconds': ('histogram', 'Request latency by route', ('blueprint', 'route', 'method'), LATENCY_BUCKETS),
+    'saferide_http_requests_total': ('counter', 'Requests by route and status code', ('blueprint', 'route', 'method', 'status'), None),
+    'saferide_http_requests_in_flight': ('gauge', 'Requests currently being served', (), None),
+    'saferide_db_queries_per_request': ('histogram', 'Database queries issued per request', ('blueprint', 'route'), QUERY_COUNT_BUCKETS),
+    'saferide_db_seconds_per_request': ('histogram', 'Time spent in database queries per request', ('blueprint', 'route'), LATENCY_BUCKETS),
+    'saferide_db_queries_total': ('counter', 'Database queries by engine', ('engine',), None),
+    'saferide_external_call_duration_seconds': ('histogram', 'External service call latency', ('service', 'operation'), LATENCY_BUCKETS),
+    'saferide_external_calls_total': ('counter', 'External service calls by outcome', ('service', 'operation', 'outcome'), None),
+    'saferide_db_pool_size': ('gauge', 'Configured pool size', ('engine',), None),
+    'saferide_db_pool_checked_out': ('gauge', 'Connections currently checked out', ('engine',), None),
+    'saferide_db_pool_overflow': ('gauge', 'Overflow connections currently open', ('engine',), None),
+    'saferide_db_pool_checkouts_total': ('counter', 'Pool checkouts', ('engine',), None),
+    'saferide_db_pool_checkout_wait_seconds_total': ('counter', 'Time spent waiting for a pooled connection', ('engine',), None),
+    'saferide_db_pool_timeouts_total': ('counter', 'Checkouts that timed out waiting for a connection', ('engine',), None),
+    'saferide_db_pool_invalidations_total': ('counter', 'Connections invalidated', ('engine',), None),
+    'saferide_job_wait_seconds': ('histogram', 'Time jobs waited past their run_at before starting', ('queue',), JOB_WAIT_BUCKETS),
+    'saferide_job_duration_seconds': ('histogram', 'Job run time by task', ('task',), LATENCY_BUCKETS),
+    'saferide_jobs_total': ('counter', 'Jobs run by task and outcome', ('task', 'outcome'), None),
+    'saferide_job_backlog': ('gauge', 'Jobs by queue and status', ('queue', 'status'), None),
+    'saferide_job_oldest_seconds': ('gauge', 'Age of the oldest runnable job', ('queue',), None),
+    'saferide_outbox_published_total': ('counter', 'Outbox events published by topic', ('topic',), None),
+    'saferide_outbox_lag_seconds': ('histogram', 'Time from commit to publish of outbox events', (), JOB_WAIT_BUCKETS),
+    'saferide_outbox_handler_errors_total': ('counter', 'In-process subscriber failures by topic', ('topic',), None),
+    'saferide_archived_trips_total': ('counter', 'Trips moved to the archive tables', (), None),
+    'saferide_expired_total': ('counter', 'Trips and payments expired by the sweeper', ('kind', 'status'), None),
+    'saferide_idempotency_total': ('counter', 'Idempotency-Key requests by endpoint and outcome', ('endpoint', 'outcome'), None),
+    'saferide_quote_cache_total': ('counter', 'Fare quote memo lookups by outcome', ('outcome',), None),
+    'saferide_surge_zones': ('gauge', 'Zones currently surging', (), None),
+    'saferide_surge_max_multiplier': ('gauge', 'Highest zone surge multiplier', (), None),
+    'saferide_outbox_pending': ('gauge', 'Outbox events not yet published', (), None),
+    'saferide_outbox_oldest_seconds': ('gauge', 'Age of the oldest unpublished outbox event', (), None),
+}
+
+# Functions returning (name, labels, value) for cluster-wide values (e.g. queue
+# backlog read from the database), evaluated once per scrape and never summed
+# across workers
+COLLECTORS = []
+
+
+def register_collector(fn):
+    COLLECTORS.append(fn)
+    return fn
+
+
+class Registry:
+    """Process-local metric values
+
+    Values live in one dict keyed by (name, label values). Histograms are
+    stored as per-bucket counts plus a running sum and only made cumulative
+    when rendered, so recording is a bisect and two increments under a lock.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, name, labels, value):
+        self.values[(name, labels)] = value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        key = (name, labels)
+        with self._lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                # One slot per bucket, one for +Inf, then the sum
+                histogram = self.values[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def items(self):
+        with self._lock:
+            return [(name, labels, list(value) if isinstance(value, list) else value)
+                    for (name, labels), value in self.values.items()]
+
+
+# Registry for the process
+registry = Registry()
+
+
+class MultiProcessStore:
+    """Share metrics between Gunicorn workers through per-worker snapshot files
+
+    Each worker periodically writes its registry to ``<dir>/metrics_<pid>.json``
+    (write-then-rename, so readers never see partial files) and a scrape on
+    any worker merges every file. Counters and histograms of workers that
+    have exited are kept so totals never go backwards; their gauges are
+    dropped.
+    """
+
+    def __init__(self, directory, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._next_flush = 0.0
+
+    def flush_due(self):
+        return time.monotonic() >= self._next_flush
+
+    def flush(self, items):
+        self._next_flush = time.monotonic() + self.flush_interval
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'values': items}, f)
+        os.replace(tmp_path, path)
+
+    def load(self):
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics_') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Worker is mid-write or just removed the file
+        return snapshots
+
+    def clear(self):
+        """Remove snapshots from a previous run (call once in the master)"""
+        for filename in os.listdir(self.directory):
+            if filename.startswith('metrics_'):
+                os.remove(os.path.join(self.directory, filename))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Set by init_app when METRICS_DIR is configured
+store = None
+
+
+def _route_labels():
+    rule = request.url_rule
+    return request.blueprint, rule.rule if rule is not None else 'unmatched'
+
+
+def observe_pool():
+    """Copy connection pool stats into the registry"""
+    from services import db_pool
+    from services.replicas import router
+    from models import db
+    for engine_name, stats in db_pool.snapshot([db.engine] + router.engines).items():
+        labels = (engine_name,)
+        registry.set('saferide_db_pool_checkouts_total', labels, stats['checkouts'])
+        registry.set('saferide_db_pool_checkout_wait_seconds_total', labels, stats['checkoutWaitSecondsTotal'])
+        registry.set('saferide_db_pool_timeouts_total', labels, stats['timeouts'])
+        registry.set('saferide_db_pool_invalidations_total', labels, stats['invalidations'])
+        if 'size' in stats:
+            registry.set('saferide_db_pool_size', labels, stats['size'])
+            registry.set('saferide_db_pool_checked_out', labels, stats['checkedOut'])
+            registry.set('saferide_db_pool_overflow', labels, stats['overflow'])
+
+
+def _collected():
+    items = []
+    for collector in COLLECTORS:
+        try:
+            items.extend(collector())
+        except Exception:
+            logger.exception('Metrics collector %s failed', getattr(collector, '__name__', collector))
+    return items
+
+
+def collect():
+    """Merged (name, labels, value) for this worker, or for all workers in multi-process mode"""
+    observe_pool()
+    items = registry.items()
+    if store is None:
+        return items + _collected()
+    store.flush(items)
+
+    merged = {}
+    for snapshot in store.load():
+        alive = _alive(snapshot['pid'])
+        for name, labels, value in snapshot['values']:
+            if name not in METRICS:
+                continue
+            if METRICS[name][0] == 'gauge' and not alive:
+                continue
+            key = (name, tuple(labels))
+            current = merged.get(key)
+            if current is None:
+                merged[key] = value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+    return [(name, labels, value) for (name, labels), value in merged.items()] + _collected()
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(items):
+    """Prometheus text exposition format (version 0.0.4)"""
+    by_name = {}
+    for name, labels, value in items:
+        by_name.setdefault(name, []).append((tuple(labels), value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text, label_names, buckets = METRICS[name]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(label_names, labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_format_labels(label_names, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(label_names, labels)} {_format_value(value[-1])}')
+            lines.append(f'{name}_count{_format_labels(label_names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def timed_external(service, operation):
+    """Record latency and outcome of an external service call"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = fn(*args, **kwargs)
+                outcome = 'success' if not isinstance(result, dict) or result.get('success') else 'failure'
+                return result
+            finally:
+                registry.observe('saferide_external_call_duration_seconds', (service, operation), time.perf_counter() - start)
+                registry.inc('saferide_external_calls_total', (service, operation, outcome))
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """Count queries and time spent in them, attributed to the current request"""
+    engine_name = engine.url.get_backend_name()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - getattr(context, '_metrics_start', time.perf_counter())
+        registry.inc('saferide_db_queries_total', (engine_name,))
+        if has_request_context():
+            g.db_query_count = g.get('db_query_count', 0) + 1
+            g.db_query_seconds = g.get('db_query_seconds', 0.0) + elapsed
+
+
+def init_app(app, engines=()):
+    """Register request hooks, database listeners and the /metrics endpoint
+
+    Call before other extensions register their hooks so the measured
+    latency covers them (before_request hooks run in registration order,
+    after_request hooks in reverse).
+    """
+    global store
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        store = MultiProcessStore(directory, app.config.get('METRICS_FLUSH_INTERVAL', 5.0))
+
+    for engine in engines:
+        instrument_engine(engine)
+
+    in_flight = [0]
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        with lock:
+            in_flight[0] += 1
+            registry.set('saferide_http_requests_in_flight', (), in_flight[0])
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        blueprint, route = _route_labels()
+        registry.observe('saferide_http_request_duration_seconds', (blueprint or '', route, request.method), time.perf_counter() - start)
+        registry.inc('saferide_http_requests_total', (blueprint or '', route, request.method, str(response.status_code)))
+        registry.observe('saferide_db_queries_per_request', (blueprint or '', route), g.get('db_query_count', 0))
+        registry.observe('saferide_db_seconds_per_request', (blueprint or '', route), g.get('db_query_seconds', 0.0))
+        if store is not None and store.flush_due():
+            observe_pool()
+            store.flush(registry.items())
+        return response
+
+    @app.teardown_request
+    def finish_request(exc=None):
+        with lock:
+            in_flight[0] -= 1
+            registry.set('saferide_http_requests_in_flight', (), in_flight[0])
+
+    token = app.config.get('METRICS_TOKEN')
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus scrape endpoint"""
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        elif request.remote_addr not in LOCAL_ADDRESSES or 'X-Forwarded-For' in request.headers:
+            # Without a token only direct scrapes from this host (not through a proxy) are answered
+            return Response('Forbidden: set METRICS_TOKEN to scrape /metrics remotely\n', status=403,
+                            mimetype='text/plain')
+        return Response(render(collect()), mimetype='text/plain; version=0.0.4')
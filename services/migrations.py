@@ -0,0 +1,297 @@
+# SafeRide Backend - Schema Migration Runner
+# Versioned, online-safe migrations with a cluster-wide lock and dry-run planning
+
+from datetime import datetime, timedelta
+import importlib
+import os
+import socket
+import time
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable, CreateIndex
+from models import db
+
+MIGRATIONS_PACKAGE = 'migrations'
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), MIGRATIONS_PACKAGE)
+ADVISORY_LOCK_KEY = 7305318  # Arbitrary constant shared by every node
+STALE_LOCK_AFTER = timedelta(minutes=30)
+
+# Rough throughput figures used for dry-run lock estimates
+ROWS_PER_SECOND_INDEX = 200000
+ROWS_PER_SECOND_UPDATE = 50000
+
+
+class MigrationLockError(RuntimeError):
+    """Raised when another node is already running migrations"""
+
+
+class Operations:
+    """Migration operations, either executed or only planned (dry run)
+
+    The helpers follow expand/contract rules: columns are only ever added
+    as nullable (a metadata-only change), data is backfilled in short
+    batches, and indexes are built concurrently on Postgres so writes keep
+    flowing.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.plan = []
+        self.dialect = db.engine.dialect.name
+
+    # Introspection
+
+    def has_table(self, table):
+        return db.inspect(db.engine).has_table(table)
+
+    def has_column(self, table, column):
+        if not self.has_table(table):
+            return False
+        return column in {c['name'] for c in db.inspect(db.engine).get_columns(table)}
+
+    def has_index(self, table, name):
+        if not self.has_table(table):
+            return False
+        return name in {i['name'] for i in db.inspect(db.engine).get_indexes(table)}
+
+    def estimate_rows(self, table):
+        """Cheap row estimate (planner statistics on Postgres)"""
+        if not self.has_table(table):
+            return 0
+        with db.engine.connect() as conn:
+            if self.dialect == 'postgresql':
+                rows = conn.execute(db.text(
+                    'SELECT reltuples::bigint FROM pg_class WHERE relname = :table'
+                ), {'table': table}).scalar()
+                return max(int(rows or 0), 0)
+            return conn.execute(db.text(f'SELECT COUNT(*) FROM {table}')).scalar()
+
+    # Operations
+
+    def create_table(self, table):
+        """Create a table and its indexes from a ``Table`` snapshot defined in the migration
+
+        Migrations describe tables as they were when written, never through
+        the current models, so a fresh database replays every later change.
+        """
+        if self.has_table(table.name):
+            return
+        self.execute(str(CreateTable(table).compile(db.engine)), table=table.name, lock=None)
+        for index in table.indexes:
+            # New, empty table: a plain build is instant
+            self.execute(str(CreateIndex(index).compile(db.engine)), table=table.name, lock=None)
+
+    def execute(self, sql, table=None, lock='ACCESS EXCLUSIVE'):
+        """Run raw DDL/DML"""
+        self._record('execute', table, lock, sql, 0.0)
+        if not self.dry_run:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(sql))
+
+    def add_column(self, table, column, type_sql):
+        """Expand: add a nullable column without a default (no table rewrite)"""
+        if self.has_column(table, column):
+            return
+        sql = f'ALTER TABLE {table} ADD COLUMN {column} {type_sql}'
+        self._record('add_column', table, 'ACCESS EXCLUSIVE (metadata only)', sql, 0.0)
+        if not self.dry_run:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(sql))
+
+    def drop_column(self, table, column):
+        """Contract: drop a column once no code reads it"""
+        if not self.has_column(table, column):
+            return
+        sql = f'ALTER TABLE {table} DROP COLUMN {column}'
+        self._record('drop_column', table, 'ACCESS EXCLUSIVE (metadata only)', sql, 0.0)
+        if not self.dry_run:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(sql))
+
+    def create_index(self, name, table, columns, unique=False, where=None):
+        """Build an index (partial when ``where`` is given) without blocking writes where the database allows it"""
+        if self.has_index(table, name):
+            return
+        rows = self.estimate_rows(table)
+        build_seconds = rows / ROWS_PER_SECOND_INDEX
+        unique_sql = 'UNIQUE ' if unique else ''
+        column_sql = ', '.join(columns)
+        where_sql = f' WHERE {where}' if where else ''
+        if self.dialect == 'postgresql':
+            sql = f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_sql}){where_sql}'
+            # Concurrent builds only take a SHARE UPDATE EXCLUSIVE lock; writes continue
+            self._record('create_index', table, 'SHARE UPDATE EXCLUSIVE', sql, 0.0, rows, build_seconds)
+            if not self.dry_run:
+                # CONCURRENTLY cannot run inside a transaction block
+                with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                    conn.execute(db.text(sql))
+        else:
+            sql = f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({column_sql}){where_sql}'
+            self._record('create_index', table, 'WRITE', sql, build_seconds, rows, build_seconds)
+            if not self.dry_run:
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(sql))
+
+    def backfill(self, table, set_sql, where_sql, batch_size=1000, pause=0.0):
+        """Update rows matching where_sql in short committed batches
+
+        Each batch locks at most ``batch_size`` rows, so concurrent writers
+        only ever wait for one small batch.
+        """
+        rows = self.estimate_rows(table)
+        sql = (f'UPDATE {table} SET {set_sql} WHERE id IN '
+               f'(SELECT id FROM {table} WHERE {where_sql} LIMIT {int(batch_size)})')
+        self._record('backfill', table, f'ROW ({batch_size} rows per batch)', sql,
+                     batch_size / ROWS_PER_SECOND_UPDATE, rows, rows / ROWS_PER_SECOND_UPDATE)
+        if self.dry_run:
+            return
+        while True:
+            with db.engine.begin() as conn:
+                updated = conn.execute(db.text(sql)).rowcount
+            if not updated:
+                break
+            if pause:
+                time.sleep(pause)
+
+    def _record(self, kind, table, lock, sql, lock_seconds, rows=None, total_seconds=None):
+        self.plan.append({
+            'operation': kind,
+            'table': table,
+            'lock': lock,
+            'sql': sql,
+            'rows': rows,
+            'estimatedLockSeconds': round(lock_seconds, 3),
+            'estimatedSeconds': round(total_seconds if total_seconds is not None else lock_seconds, 3)
+        })
+
+
+def discover():
+    """List (version, module name) for every migration script, in order"""
+    scripts = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.py') and filename[:4].isdigit():
+            scripts.append((filename[:4], filename[:-3]))
+    return scripts
+
+
+def _ensure_version_table():
+    with db.engine.begin() as conn:
+        conn.execute(db.text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(20) PRIMARY KEY,
+                description VARCHAR(255),
+                applied_at TIMESTAMP NOT NULL
+            )
+        """))
+        if db.engine.dialect.name != 'postgresql':
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS schema_migration_lock (
+                    id INTEGER PRIMARY KEY,
+                    owner VARCHAR(255) NOT NULL,
+                    acquired_at TIMESTAMP NOT NULL
+                )
+            """))
+
+
+def applied_versions():
+    """Versions already applied to this database"""
+    if not db.inspect(db.engine).has_table('schema_migrations'):
+        return set()
+    with db.engine.connect() as conn:
+        return {row[0] for row in conn.execute(db.text('SELECT version FROM schema_migrations'))}
+
+
+def status():
+    """Applied and pending migrations"""
+    applied = applied_versions()
+    return [
+        {'version': version, 'name': name, 'applied': version in applied}
+        for version, name in discover()
+    ]
+
+
+class _MigrationLock:
+    """Only one node migrates at a time
+
+    Postgres uses a session-level advisory lock; other databases claim a
+    single row in schema_migration_lock (stale claims are taken over).
+    """
+
+    def __init__(self):
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.conn = None
+
+    def __enter__(self):
+        if db.engine.dialect.name == 'postgresql':
+            self.conn = db.engine.connect()
+            acquired = self.conn.execute(db.text('SELECT pg_try_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY}).scalar()
+            if not acquired:
+                self.conn.close()
+                raise MigrationLockError('Another node is running migrations')
+            return self
+
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(db.text(
+                'DELETE FROM schema_migration_lock WHERE acquired_at < :stale'
+            ), {'stale': now - STALE_LOCK_AFTER})
+            try:
+                conn.execute(db.text(
+                    'INSERT INTO schema_migration_lock (id, owner, acquired_at) VALUES (1, :owner, :now)'
+                ), {'owner': self.owner, 'now': now})
+            except IntegrityError:
+                raise MigrationLockError('Another node is running migrations')
+        return self
+
+    def __exit__(self, *exc):
+        if self.conn is not None:
+            self.conn.execute(db.text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+            self.conn.close()
+            return False
+        with db.engine.begin() as conn:
+            conn.execute(db.text(
+                'DELETE FROM schema_migration_lock WHERE id = 1 AND owner = :owner'
+            ), {'owner': self.owner})
+        return False
+
+
+def upgrade(dry_run=False):
+    """Apply pending migrations in order; returns a report per migration"""
+    report = []
+    if dry_run:
+        applied = applied_versions()
+        for version, name in discover():
+            if version in applied:
+                continue
+            module = importlib.import_module(f'{MIGRATIONS_PACKAGE}.{name}')
+            op = Operations(dry_run=True)
+            module.upgrade(op)
+            report.append(_summary(version, name, module, op))
+        return report
+
+    _ensure_version_table()
+    with _MigrationLock():
+        # Re-read under the lock: another node may have just finished
+        applied = applied_versions()
+        for version, name in discover():
+            if version in applied:
+                continue
+            module = importlib.import_module(f'{MIGRATIONS_PACKAGE}.{name}')
+            op = Operations()
+            module.upgrade(op)
+            with db.engine.begin() as conn:
+                conn.execute(db.text(
+                    'INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, :now)'
+                ), {'version': version, 'description': getattr(module, 'description', name), 'now': datetime.utcnow()})
+            report.append(_summary(version, name, module, op))
+    return report
+
+
+def _summary(version, name, module, op):
+    return {
+        'version': version,
+        'name': name,
+        'description': getattr(module, 'description', ''),
+        'estimatedLockSeconds': round(sum(step['estimatedLockSeconds'] for step in op.plan), 3),
+        'steps': op.plan
+    }
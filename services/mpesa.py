@@ -1,27 +1,54 @@
 # SafeRide Backend - M-Pesa Integration Service
 # Mock M-Pesa Daraja API implementation for development
 
+from flask import current_app, has_app_context
+from services.metrics import timed_external
+import time
+
 class MpesaService:
     """M-Pesa payment service for STK Push and transaction queries"""
     
+    def __init__(self):
+        # Simulated Daraja round trip for the mock (MPESA_MOCK_LATENCY_MS), used by load tests
+        self.mock_latency = current_app.config.get('MPESA_MOCK_LATENCY_MS', 0) / 1000 if has_app_context() else 0
+    
+    @timed_external('mpesa', 'stk_push')
     def stk_push(self, phone_number, amount, account_reference, transaction_desc):
         """Initiate STK Push payment request (mock implementation)"""
         # Mock implementation for demo purposes
         # In production, this would call actual M-Pesa Daraja API
+        if self.mock_latency:
+            time.sleep(self.mock_latency)
         return {
             'success': True,
             'checkout_request_id': f'mock_{phone_number}_{amount}',
             'response_description': 'Mock STK Push initiated'
         }
     
+    @timed_external('mpesa', 'query_stk_status')
     def query_stk_status(self, checkout_request_id):
         """Query STK Push payment status (mock implementation)"""
         # Mock implementation for demo purposes
         # In production, this would query actual M-Pesa transaction status
+        if self.mock_latency:
+            time.sleep(self.mock_latency)
         return {
             'success': True,
             'data': {
                 'ResultCode': '0',  # 0 = success
                 'MpesaReceiptNumber': f'MOCK{checkout_request_id[-8:]}'
             }
-        }
\ No newline at end of file
+        }
+    
+    @timed_external('mpesa', 'b2c_payment')
+    def b2c_payment(self, phone_number, amount, remarks):
+        """Send a business-to-customer payout (mock implementation)"""
+        # Mock implementation for demo purposes
+        # In production, this would call the Daraja B2C API
+        if self.mock_latency:
+            time.sleep(self.mock_latency)
+        return {
+            'success': True,
+            'conversation_id': f'mock_b2c_{phone_number}_{amount}',
+            'response_description': 'Mock B2C payment accepted'
+        }
@@ -0,0 +1,263 @@
+# SafeRide Backend - Transactional Outbox
+# Domain events written with the state change they describe, relayed to subscribers and a broker
+
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from fnmatch import fnmatch
+from sqlalchemy import bindparam, text
+import importlib
+import json
+import logging
+import signal
+import threading
+import time
+
+from models import db, OutboxEvent
+from services import metrics
+
+logger = logging.getLogger('saferide.outbox')
+
+# (topic pattern, handler) for in-process subscribers
+SUBSCRIBERS = []
+
+
+class Event:
+    """A published outbox event"""
+
+    __slots__ = ('id', 'topic', 'aggregate_type', 'aggregate_id', 'payload', 'created_at')
+
+    def __init__(self, id, topic, aggregate_type, aggregate_id, payload, created_at):
+        self.id = id
+        self.topic = topic
+        self.aggregate_type = aggregate_type
+        self.aggregate_id = aggregate_id
+        self.payload = payload
+        self.created_at = created_at
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'aggregateType': self.aggregate_type,
+            'aggregateId': self.aggregate_id,
+            'payload': self.payload,
+            'createdAt': self.created_at.isoformat()
+        }
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def record(topic, aggregate_type, aggregate_id, **payload):
+    """Add an event to the current session
+
+    The event commits (or rolls back) with the state change in the caller's
+    transaction, so subscribers never see an event for a change that did
+    not persist, and no committed change goes unannounced.
+    """
+    event = OutboxEvent(
+        topic=topic,
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        payload=json.dumps(payload, default=_json_default)
+    )
+    db.session.add(event)
+    return event
+
+
+def subscribe(pattern):
+    """Register an in-process handler for topics matching ``pattern`` (e.g. ``trip.*``)
+
+    Handlers run in the relay process after the broker accepts the batch.
+    A failing handler is logged and skipped; work that must not be lost
+    should enqueue a job from the handler.
+    """
+    def decorator(fn):
+        SUBSCRIBERS.append((pattern, fn))
+        return fn
+    return decorator
+
+
+def dispatch(event):
+    for pattern, handler in SUBSCRIBERS:
+        if not fnmatch(event.topic, pattern):
+            continue
+        try:
+            handler(event)
+        except Exception:
+            metrics.registry.inc('saferide_outbox_handler_errors_total', (event.topic,))
+            logger.exception('Subscriber %s failed on event %s (%s)', getattr(handler, '__name__', handler),
+                             event.id, event.topic)
+
+
+class LocalBroker:
+    """In-memory stand-in for the broker (tests and single-process development)"""
+
+    def __init__(self, keep=1000):
+        self.published = deque(maxlen=keep)
+
+    def publish(self, events):
+        self.published.extend(events)
+
+    def clear(self):
+        self.published.clear()
+
+
+class RedisStreamBroker:
+    """Broker backed by a Redis stream; consumers read it with XREAD or consumer groups"""
+
+    def __init__(self, url, stream='saferide:events', maxlen=100000):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def publish(self, events):
+        pipe = self.client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {'event': json.dumps(event.to_dict())}, maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+
+def get_broker(url):
+    """Broker for OUTBOX_BROKER_URL: unset or ``local`` for the in-memory stand-in, or a Redis URL"""
+    if not url or url == 'local':
+        return LocalBroker()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStreamBroker(url)
+    raise ValueError(f'Unsupported outbox broker {url}')
+
+
+def relay_batch(broker, batch_size=100):
+    """Publish the oldest unpublished events in id order; returns how many were published
+
+    Events are read, published and marked in one transaction, so a relay
+    that dies mid-batch republishes it (delivery is at-least-once;
+    consumers dedupe on the event id). On Postgres ``SKIP LOCKED`` lets
+    several relays share the table, at the cost of strict global order.
+    """
+    lock = ' FOR UPDATE SKIP LOCKED' if db.engine.dialect.name == 'postgresql' else ''
+    with db.engine.begin() as conn:
+        rows = conn.execute(text(f"""
+            SELECT id, topic, aggregate_type, aggregate_id, payload, created_at FROM outbox_events
+            WHERE published_at IS NULL
+            ORDER BY id
+            LIMIT :limit{lock}
+        """), {'limit': batch_size}).all()
+        if not rows:
+            return 0
+        events = []
+        for id, topic, aggregate_type, aggregate_id, payload, created_at in rows:
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            events.append(Event(id, topic, aggregate_type, aggregate_id, json.loads(payload or '{}'), created_at))
+        broker.publish(events)
+        now = datetime.utcnow()
+        conn.execute(text('UPDATE outbox_events SET published_at = :now WHERE id IN :ids')
+                     .bindparams(bindparam('ids', expanding=True)), {'now': now, 'ids': [e.id for e in events]})
+    for event in events:
+        dispatch(event)
+        metrics.registry.inc('saferide_outbox_published_total', (event.topic,))
+        metrics.registry.observe('saferide_outbox_lag_seconds', (), max((now - event.created_at).total_seconds(), 0))
+    return len(events)
+
+
+def purge_published(retention_days, batch_size=1000):
+    """Delete published events older than the retention window, in small batches"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        with db.engine.begin() as conn:
+            count = conn.execute(text("""
+                DELETE FROM outbox_events WHERE id IN (
+                    SELECT id FROM outbox_events WHERE published_at < :cutoff LIMIT :limit
+                )
+            """), {'cutoff': cutoff, 'limit': batch_size}).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def pending():
+    """Unpublished event count and the age in seconds of the oldest one"""
+    with db.engine.connect() as conn:
+        count, oldest = conn.execute(text(
+            'SELECT COUNT(*), MIN(created_at) FROM outbox_events WHERE published_at IS NULL'
+        )).one()
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    return {
+        'pending': count,
+        'oldestSeconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0
+    }
+
+
+def pending_metrics():
+    """Outbox backlog gauges for /metrics"""
+    summary = pending()
+    return [('saferide_outbox_pending', (), summary['pending']),
+            ('saferide_outbox_oldest_seconds', (), summary['oldestSeconds'])]
+
+
+class Relay:
+    """Tail the outbox until stopped
+
+    Polls only while idle: a full batch is followed immediately by the
+    next one, so a backlog drains at broker speed.
+    """
+
+    def __init__(self, app, broker=None, batch_size=100, poll_interval=0.2, retention_days=3):
+        self.app = app
+        self.broker = broker or get_broker(app.config.get('OUTBOX_BROKER_URL'))
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self.stopping = threading.Event()
+        self.published = 0
+        for module in app.config.get('OUTBOX_SUBSCRIBERS', ()):
+            importlib.import_module(module)
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run_once(self):
+        """Publish everything pending; returns the number of events published"""
+        total = 0
+        with self.app.app_context():
+            while True:
+                count = relay_batch(self.broker, self.batch_size)
+                total += count
+                if count < self.batch_size:
+                    break
+        self.published += total
+        return total
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info('Outbox relay publishing to %s', type(self.broker).__name__)
+        next_maintenance = 0.0
+        while not self.stopping.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Outbox relay batch failed')
+                self.stopping.wait(self.poll_interval * 10)
+            if time.monotonic() >= next_maintenance:
+                next_maintenance = time.monotonic() + 3600
+                with self.app.app_context():
+                    try:
+                        purge_published(self.retention_days)
+                    except Exception:
+                        logger.exception('Outbox purge failed')
+            if metrics.store is not None and metrics.store.flush_due():
+                metrics.store.flush(metrics.registry.items())
+            self.stopping.wait(self.poll_interval)
+        if metrics.store is not None:
+            metrics.store.flush(metrics.registry.items())
@@ -0,0 +1,150 @@
+# SafeRide Backend - Presence Tracking Service
+# In-memory last-seen map for authenticated users and driver location pings
+
+from collections import OrderedDict
+from itertools import islice
+import heapq
+import threading
+import time
+
+
+class PresenceTracker:
+    """Track which users are truly online based on recent activity
+
+    Entries are kept in last-seen order so expired users can be evicted from
+    the front in amortized O(1), and each role has its own last-seen map so
+    online counts are O(1) and a page only walks the users of its roles up
+    to the end of that page. The map is per-process; under gunicorn each
+    worker tracks, counts and lists only the users it served.
+    """
+
+    def __init__(self, ttl_seconds=120, flush_interval=30):
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()  # user_id -> (last_seen, role, location)
+        self._by_role = {}             # role -> OrderedDict(user_id -> last_seen), same order
+        self._expired_drivers = set()  # drivers that went stale since last flush
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, role=None, location=None, now=None):
+        """Mark a user as seen now, optionally recording a location ping"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            previous = self._entries.pop(user_id, None)
+            if previous is None:
+                role = role or 'unknown'
+                self._expired_drivers.discard(user_id)
+            else:
+                role = previous[1]
+                if location is None:
+                    location = previous[2]
+            self._entries[user_id] = (now, role, location)
+            by_role = self._by_role.setdefault(role, OrderedDict())
+            by_role.pop(user_id, None)
+            by_role[user_id] = now
+            self._evict_expired(now)
+
+    def remove(self, user_id):
+        """Forget a user immediately (e.g. driver went offline)"""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                del self._by_role[entry[1]][user_id]
+
+    def is_online(self, user_id, now=None):
+        """Check whether a user has been seen within the TTL"""
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(user_id)
+        return entry is not None and now - entry[0] <= self.ttl_seconds
+
+    def location(self, user_id):
+        """Get the last reported location for an online user"""
+        entry = self._entries.get(user_id)
+        return entry[2] if entry else None
+
+    def count(self, role=None, now=None):
+        """Get online count for a role, or for everyone, in O(1)"""
+        with self._lock:
+            self._evict_expired(time.monotonic() if now is None else now)
+            if role is None:
+                return len(self._entries)
+            return len(self._by_role.get(role, ()))
+
+    def summary(self, now=None):
+        """Get online counts per role"""
+        with self._lock:
+            self._evict_expired(time.monotonic() if now is None else now)
+            return {role: len(users) for role, users in self._by_role.items() if users}
+
+    def page(self, roles=None, page=1, limit=20, now=None):
+        """Get one page of online user IDs for the given roles, most recently seen first
+
+        Walks newest-first only as far as the end of the page, within the
+        requested roles' maps (merged by last-seen when there are several).
+        """
+        offset = (page - 1) * limit
+        with self._lock:
+            self._evict_expired(time.monotonic() if now is None else now)
+            maps = [self._by_role.get(role) for role in (self._by_role if roles is None else roles)]
+            maps = [users for users in maps if users]
+            if not maps:
+                return []
+            if len(maps) == 1:
+                return list(islice(reversed(maps[0]), offset, offset + limit))
+            newest_first = heapq.merge(*(reversed(users.items()) for users in maps),
+                                       key=lambda item: item[1], reverse=True)
+            return [user_id for user_id, _ in islice(newest_first, offset, offset + limit)]
+
+    def driver_locations(self, now=None):
+        """Last reported location of every online driver that has sent one"""
+        with self._lock:
+            self._evict_expired(time.monotonic() if now is None else now)
+            return {user_id: entry[2] for user_id, entry in self._entries.items()
+                    if entry[1] == 'driver' and entry[2] is not None}
+
+    def flush_due(self, now=None):
+        """Check whether the periodic flush interval has elapsed"""
+        now = time.monotonic() if now is None else now
+        return now - self._last_flush >= self.flush_interval
+
+    def drain_expired_drivers(self, now=None):
+        """Evict stale entries and return drivers that went offline since the last flush"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._evict_expired(now)
+            expired = self._expired_drivers
+            self._expired_drivers = set()
+            self._last_flush = now
+            return expired
+
+    def _evict_expired(self, now):
+        """Pop entries older than the TTL from the front of the map (lock held)"""
+        cutoff = now - self.ttl_seconds
+        entries = self._entries
+        while entries:
+            user_id, entry = next(iter(entries.items()))
+            if entry[0] >= cutoff:
+                break
+            entries.popitem(last=False)
+            del self._by_role[entry[1]][user_id]
+            if entry[1] == 'driver':
+                self._expired_drivers.add(user_id)
+
+
+# Shared tracker for the process
+presence = PresenceTracker()
+
+
+def flush_presence():
+    """Mark drivers whose presence expired as offline in one UPDATE"""
+    expired = presence.drain_expired_drivers()
+    if not expired:
+        return 0
+    from models import Driver
+    from services.sqlite_writer import run_write
+    statement = Driver.__table__.update().where(
+        Driver.user_id.in_(expired),
+        Driver.is_online.is_(True)
+    ).values(is_online=False)
+    return run_write(lambda conn: conn.execute(statement).rowcount)
@@ -0,0 +1,217 @@
+# SafeRide Backend - Pricing Engine
+# Fare quotes from in-memory pricing config, memoized per (pickup cell, dropoff cell, time bucket), with surge
+
+from datetime import datetime, timedelta
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+import logging
+import time
+
+from services import metrics
+from services.cache import LRUCache
+from services.geo import haversine_km, cell_id, cell_center
+from services.surge import surge
+from services.eta import eta
+
+logger = logging.getLogger('saferide.pricing')
+
+# Config table key -> default used when the key is missing or unreadable
+PRICING_KEYS = {
+    'TRIP_BASE_FARE': 200.0,      # KES
+    'TRIP_RATE_PER_KM': 50.0,     # KES per km
+    'TRIP_MINIMUM_FARE': 100.0,   # KES
+    'TRIP_AVERAGE_SPEED': 30.0,   # km/h
+    'EARTH_RADIUS_KM': 6371.0,
+}
+
+
+def calculate_fare(distance, base_fare, rate_per_km, average_speed, minimum_fare=0):
+    """Fare (KES) and estimated duration (minutes) for a distance in km"""
+    fare = base_fare + (distance * rate_per_km)
+    if fare < minimum_fare:
+        fare = minimum_fare
+    duration = int((distance / average_speed) * 60)
+    return round(fare, 2), duration
+
+
+class QuoteError(Exception):
+    """Raised for unusable locations or quote tokens; carries the API error code"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def parse_point(point):
+    """(lat, lng) floats from a {lat, lng} request object"""
+    try:
+        lat, lng = float(point['lat']), float(point['lng'])
+    except (KeyError, TypeError, ValueError):
+        raise QuoteError('INVALID_LOCATION', 'Locations need numeric lat and lng')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise QuoteError('INVALID_LOCATION', 'Location is out of range')
+    return lat, lng
+
+
+class Quote:
+    """A priced trip between two grid cells"""
+
+    __slots__ = ('pickup_cell', 'dropoff_cell', 'distance', 'duration', 'fare', 'base_fare', 'distance_fare',
+                 'minimum_fare', 'surge')
+
+    def __init__(self, pickup_cell, dropoff_cell, distance, duration, fare, base_fare=None, distance_fare=None,
+                 minimum_fare=None, surge=1.0):
+        self.pickup_cell = pickup_cell
+        self.dropoff_cell = dropoff_cell
+        self.distance = distance
+        self.duration = duration
+        self.fare = fare
+        self.base_fare = base_fare
+        self.distance_fare = distance_fare
+        self.minimum_fare = minimum_fare
+        self.surge = surge
+
+    def surged(self, multiplier):
+        """Copy of this quote with the fare scaled by a surge multiplier"""
+        return Quote(self.pickup_cell, self.dropoff_cell, self.distance, self.duration,
+                     round(self.fare * multiplier, 2), self.base_fare, self.distance_fare, self.minimum_fare,
+                     multiplier)
+
+    def to_dict(self):
+        return {
+            'fare': self.fare,
+            'distance': self.distance,
+            'duration': self.duration,
+            'breakdown': {
+                'baseFare': self.base_fare,
+                'distanceFare': self.distance_fare,
+                'minimumFare': self.minimum_fare,
+                'surgeMultiplier': self.surge,
+            },
+        }
+
+
+class PricingEngine:
+    """Quote fares without touching the database on the hot path
+
+    Pricing config is read from the config table in one query and refreshed
+    every ``config_ttl`` seconds; a change clears the memo. Quotes are
+    memoized per (pickup cell, dropoff cell, time bucket), with the distance
+    measured between cell centers, so every rider asking for the same route
+    in the same bucket gets the same price from one computation. The
+    pickup zone's surge multiplier is applied on top of the memoized fare.
+    """
+
+    def __init__(self, cell_degrees=0.002, bucket_seconds=60, cache_size=10000, config_ttl=60, quote_ttl=300):
+        self.cell_degrees = cell_degrees
+        self.bucket_seconds = bucket_seconds
+        self.config_ttl = config_ttl
+        self.quote_ttl = quote_ttl
+        self.memo = LRUCache(cache_size)
+        self.values = dict(PRICING_KEYS)
+        self._loaded_at = None
+        self._serializer = None
+
+    def configure(self, secret_key, cell_degrees, bucket_seconds, cache_size, config_ttl, quote_ttl):
+        self.cell_degrees = cell_degrees
+        self.bucket_seconds = bucket_seconds
+        self.config_ttl = config_ttl
+        self.quote_ttl = quote_ttl
+        self.memo = LRUCache(cache_size)
+        self._serializer = URLSafeTimedSerializer(secret_key, salt='trip-quote')
+        self._loaded_at = None
+
+    def config(self):
+        """Current pricing values, reloaded from the config table when stale"""
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at >= self.config_ttl:
+            self._loaded_at = now
+            self.reload()
+        return self.values
+
+    def reload(self):
+        """Read pricing keys from the config table; keeps the current values if it can't"""
+        try:
+            from models import Config
+            rows = Config.query.with_entities(Config.key, Config.value) \
+                .filter(Config.key.in_(list(PRICING_KEYS))).all()
+            values = dict(PRICING_KEYS)
+            for key, value in rows:
+                try:
+                    values[key] = float(value)
+                except ValueError:
+                    logger.warning('Ignoring non-numeric pricing config %s=%r', key, value)
+        except Exception:
+            logger.exception('Could not load pricing config; keeping current values')
+            return
+        if values != self.values:
+            self.values = values
+            self.memo.clear()
+
+    def quote(self, pickup, dropoff, now=None):
+        """Quote a trip between two (lat, lng) points"""
+        now = time.time() if now is None else now
+        config = self.config()
+        size = self.cell_degrees
+        key = (cell_id(pickup[0], pickup[1], size), cell_id(dropoff[0], dropoff[1], size),
+               int(now // self.bucket_seconds))
+        quote = self.memo.get(key)
+        if quote is None:
+            metrics.registry.inc('saferide_quote_cache_total', ('miss',))
+            quote = self._price(key[0], key[1], config, datetime.utcfromtimestamp(key[2] * self.bucket_seconds))
+            self.memo.set(key, quote, self.bucket_seconds)
+        else:
+            metrics.registry.inc('saferide_quote_cache_total', ('hit',))
+        multiplier = surge.multiplier(pickup[0], pickup[1])
+        return quote.surged(multiplier) if multiplier != 1.0 else quote
+
+    def _price(self, pickup_cell, dropoff_cell, config, when):
+        size = self.cell_degrees
+        pickup, dropoff = cell_center(pickup_cell, size), cell_center(dropoff_cell, size)
+        distance = haversine_km(*pickup, *dropoff, radius=config['EARTH_RADIUS_KM'])
+        # Learned speed for this route and hour of week, else the configured average
+        speed = eta.speed(pickup, dropoff, when) or config['TRIP_AVERAGE_SPEED']
+        fare, duration = calculate_fare(distance, config['TRIP_BASE_FARE'], config['TRIP_RATE_PER_KM'],
+                                        speed, config['TRIP_MINIMUM_FARE'])
+        return Quote(pickup_cell, dropoff_cell, round(distance, 2), duration, fare,
+                     base_fare=config['TRIP_BASE_FARE'],
+                     distance_fare=round(distance * config['TRIP_RATE_PER_KM'], 2),
+                     minimum_fare=config['TRIP_MINIMUM_FARE'])
+
+    def sign(self, quote, user_id):
+        """Token binding a quote to a user; returns (token, expires_at)"""
+        token = self._serializer.dumps({
+            'u': user_id, 'p': quote.pickup_cell, 'd': quote.dropoff_cell,
+            'f': quote.fare, 'km': quote.distance, 'm': quote.duration, 's': quote.surge,
+        })
+        return token, datetime.utcnow() + timedelta(seconds=self.quote_ttl)
+
+    def verify(self, token, user_id, pickup, dropoff):
+        """The quote a token was issued for, if it is unexpired, the user's and for these points"""
+        try:
+            data = self._serializer.loads(token, max_age=self.quote_ttl)
+        except SignatureExpired:
+            raise QuoteError('QUOTE_EXPIRED', 'Quote has expired; request a new one')
+        except BadSignature:
+            raise QuoteError('INVALID_QUOTE', 'Quote token is invalid')
+        size = self.cell_degrees
+        if (data.get('u') != user_id or data.get('p') != cell_id(pickup[0], pickup[1], size)
+                or data.get('d') != cell_id(dropoff[0], dropoff[1], size)):
+            raise QuoteError('QUOTE_MISMATCH', 'Quote was issued for a different trip')
+        return Quote(data['p'], data['d'], data['km'], data['m'], data['f'], surge=data.get('s', 1.0))
+
+
+# Shared engine for the process
+pricing = PricingEngine()
+
+
+def init_app(app):
+    """Configure the process-wide pricing engine from app config"""
+    pricing.configure(
+        app.config['SECRET_KEY'],
+        app.config['PRICING_CELL_DEGREES'],
+        app.config['PRICING_TIME_BUCKET_SECONDS'],
+        app.config['PRICING_CACHE_SIZE'],
+        app.config['PRICING_CONFIG_TTL'],
+        app.config['QUOTE_TTL_SECONDS'],
+    )
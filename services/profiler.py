@@ -0,0 +1,190 @@
+# SafeRide Backend - Sampling Profiler
+# Opt-in stack sampling for a worker or a route, exported as collapsed stacks or speedscope JSON
+
+from collections import Counter, deque
+from flask import request
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+MAX_DURATION_SECONDS = 120
+MAX_STACK_DEPTH = 128
+
+
+def _frame_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _stack(frame):
+    """Root-first function names for a frame"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class ProfileSession:
+    """One profiling run and its aggregated stacks"""
+
+    def __init__(self, interval, seconds, route=None, fraction=1.0):
+        self.id = uuid.uuid4().hex[:12]
+        self.interval = interval
+        self.route = route
+        self.fraction = fraction
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.finished_at = None
+        self.samples = 0
+        self.requests = 0
+        self.stacks = Counter()  # "a;b;c" -> samples
+
+    @property
+    def running(self):
+        return self.finished_at is None
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'pid': os.getpid(),
+            'route': self.route,
+            'fraction': self.fraction,
+            'intervalSeconds': self.interval,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'running': self.running,
+            'samples': self.samples,
+            'requests': self.requests,
+        }
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed stack format (flamegraph.pl, speedscope, inferno)"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def speedscope(self):
+        """speedscope.app sampled-profile JSON"""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            indices = []
+            for name in stack.split(';'):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({'name': name})
+                indices.append(index[name])
+            samples.append(indices)
+            weights.append(round(count * self.interval, 6))
+        duration = round(sum(weights), 6)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f'saferide {self.route or "worker"} {self.id}',
+            'exporter': 'saferide-backend',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': f'pid {os.getpid()}',
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': duration,
+                'samples': samples,
+                'weights': weights,
+            }],
+        }
+
+
+class SamplingProfiler:
+    """Sample Python stacks from a background thread via sys._current_frames()
+
+    Nothing runs until a session starts. A worker session samples every
+    thread except the sampler; a route session only samples threads that
+    are serving a selected request to that route. Sampling every 5 ms costs
+    a few percent of one core while active and nothing otherwise.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.history = deque(maxlen=5)
+        self._targets = set()  # Thread idents serving sampled route requests
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, seconds=10, interval=0.005, route=None, fraction=1.0):
+        with self._lock:
+            if self.session is not None and self.session.running:
+                raise RuntimeError('A profiling session is already running')
+            seconds = min(max(float(seconds), 0.1), MAX_DURATION_SECONDS)
+            interval = max(float(interval), 0.001)
+            self.session = ProfileSession(interval, seconds, route, min(max(float(fraction), 0.0), 1.0))
+            self.history.appendleft(self.session)
+            self._thread = threading.Thread(target=self._run, args=(self.session,), name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return self.session
+
+    def stop(self):
+        session = self.session
+        if session is not None and session.running:
+            session.deadline = 0
+            if self._thread is not None:
+                self._thread.join(timeout=1)
+        return session
+
+    def get(self, session_id):
+        for session in self.history:
+            if session.id == session_id:
+                return session
+        return None
+
+    def _run(self, session):
+        own = threading.get_ident()
+        while time.monotonic() < session.deadline:
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if session.route is not None and ident not in self._targets:
+                    continue
+                session.stacks[';'.join(_stack(frame))] += 1
+                session.samples += 1
+            del frames
+            time.sleep(session.interval)
+        session.finished_at = time.time()
+        self._targets.clear()
+
+    # Route sessions
+
+    def begin_request(self):
+        session = self.session
+        if session is None or session.route is None or not session.running:
+            return
+        if request.endpoint != session.route:
+            return
+        if session.fraction < 1.0 and random.random() >= session.fraction:
+            return
+        session.requests += 1
+        self._targets.add(threading.get_ident())
+
+    def end_request(self):
+        self._targets.discard(threading.get_ident())
+
+
+# Profiler for the process
+profiler = SamplingProfiler()
+
+
+def init_app(app):
+    """Hook route sessions into the request cycle (only when profiling is enabled)"""
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    @app.before_request
+    def begin_profiled_request():
+        profiler.begin_request()
+
+    @app.teardown_request
+    def end_profiled_request(exc=None):
+        profiler.end_request()
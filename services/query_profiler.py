@@ -0,0 +1,158 @@
+# SafeRide Backend - Query Profiler
+# Per-request SQL counts, N+1 detection, slow-query log and a max-queries test helper
+
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from sqlalchemy import event
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger('saferide.sql')
+
+# Collapse literals and expanded IN lists so "WHERE id = 1" and "WHERE id = 2" share a shape
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """Normalize a SQL statement so repeats with different parameters compare equal"""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('(?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class QueryProfile:
+    """Statements issued while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = {}  # shape -> [count, seconds]
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.seconds += elapsed
+        shape = statement_shape(statement)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            self.shapes[shape] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def repeated(self, threshold):
+        """Shapes issued at least ``threshold`` times (likely N+1 loops), most frequent first"""
+        return sorted(
+            ((shape, count, seconds) for shape, (count, seconds) in self.shapes.items() if count >= threshold),
+            key=lambda item: -item[1]
+        )
+
+    def header(self, threshold):
+        repeated = self.repeated(threshold)
+        value = f'count={self.count}; time_ms={self.seconds * 1000:.2f}; repeated={len(repeated)}'
+        if repeated:
+            value += f'; worst={repeated[0][1]}x'
+        return value
+
+
+class QueryProfiler:
+    """Attach per-request query profiles to a sample of requests
+
+    Every statement is timed so slow queries are always logged with their
+    parameters; counting and N+1 detection only run for sampled requests
+    (all of them in development, a fraction in production).
+    """
+
+    def __init__(self):
+        self.sample_rate = 1.0
+        self.slow_query_seconds = 0.2
+        self.n_plus_one_threshold = 5
+        self.header_enabled = True
+        self._collectors = []  # Active assert_max_queries() blocks
+        self._lock = threading.Lock()
+
+    def init_app(self, app, engines):
+        self.sample_rate = app.config.get('QUERY_PROFILE_SAMPLE_RATE', 1.0)
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+        self.header_enabled = app.config.get('QUERY_PROFILE_HEADER', True)
+        for engine in engines:
+            self.instrument(engine)
+
+        @app.before_request
+        def start_query_profile():
+            if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                g.query_profile = QueryProfile()
+
+        @app.after_request
+        def finish_query_profile(response):
+            profile = g.pop('query_profile', None)
+            if profile is None:
+                return response
+            repeated = profile.repeated(self.n_plus_one_threshold)
+            for shape, count, seconds in repeated:
+                logger.warning('Possible N+1 on %s %s: %dx (%.1f ms) %s',
+                               request.method, request.path, count, seconds * 1000, shape)
+            if self.header_enabled:
+                response.headers['X-Query-Profile'] = profile.header(self.n_plus_one_threshold)
+            return response
+
+    def instrument(self, engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._profile_start = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - getattr(context, '_profile_start', time.perf_counter())
+            if elapsed >= self.slow_query_seconds:
+                logger.warning('Slow query (%.1f ms)%s: %s params=%.500r', elapsed * 1000,
+                               f' on {request.method} {request.path}' if has_request_context() else '',
+                               statement, parameters)
+            if has_request_context():
+                profile = g.get('query_profile')
+                if profile is not None:
+                    profile.record(statement, elapsed)
+            if self._collectors:
+                with self._lock:
+                    collectors = list(self._collectors)
+                for collector in collectors:
+                    collector.append(statement)
+
+    @contextmanager
+    def capture(self):
+        """Collect every statement issued inside the block (any thread)"""
+        statements = []
+        with self._lock:
+            self._collectors.append(statements)
+        try:
+            yield statements
+        finally:
+            with self._lock:
+                self._collectors.remove(statements)
+
+
+# Profiler for the process
+profiler = QueryProfiler()
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the block issues more than ``limit`` SQL statements
+
+    Usage in tests::
+
+        with assert_max_queries(3):
+            client.get('/api/v1/trips', headers=auth)
+    """
+    with profiler.capture() as statements:
+        yield statements
+    if len(statements) > limit:
+        listing = '\n'.join(f'  {i + 1}. {statement_shape(s)}' for i, s in enumerate(statements))
+        raise AssertionError(f'Expected at most {limit} queries, got {len(statements)}:\n{listing}')
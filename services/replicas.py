@@ -0,0 +1,108 @@
+# SafeRide Backend - Read Replica Routing
+# Sends SELECTs from read-only routes to replica engines, everything else to the primary
+
+from flask import g, has_request_context
+from functools import wraps
+from sqlalchemy import create_engine, event
+import itertools
+import threading
+
+
+class ReplicaRouter:
+    """Route ORM SELECTs to replicas for routes marked with @use_replica
+
+    Routing happens in the session's ``do_orm_execute`` hook, so views keep
+    using ``db.session`` and ``Model.query`` unchanged. A request goes back
+    to the primary as soon as it has pending changes or flushes a write, and
+    a user who just wrote sticks to the primary for ``sticky_seconds`` so
+    they read their own writes despite replication lag. The sticky marker is
+    a TTL entry in the cache's shared tier, so it follows the user across
+    workers; without CACHE_REDIS_URL it lives in the worker's LRU and only
+    holds within that worker. SELECT ... FOR UPDATE always goes to the
+    primary.
+    """
+
+    def __init__(self):
+        self.engines = []
+        self.sticky_seconds = 5
+        self.stats = {'replica_reads': 0, 'primary_writes': 0}
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        urls = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        if not urls:
+            return
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        self.engines = [create_engine(url, **options) for url in urls]
+        for url, engine in zip(urls, self.engines):
+            if url.startswith('sqlite'):
+                from services.sqlite_writer import apply_pragmas
+                apply_pragmas(engine, busy_timeout_ms=app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+        self._cycle = itertools.cycle(self.engines)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        event.listen(db.session, 'do_orm_execute', self._route)
+        event.listen(db.session, 'after_flush', self._mark_write)
+
+    def next_engine(self):
+        with self._lock:
+            return next(self._cycle)
+
+    def stick(self, user_id):
+        """Keep a user on the primary for the sticky window"""
+        if user_id:
+            _sticky_store().set(f'sticky:{user_id}', True, self.sticky_seconds)
+
+    def is_sticky(self, user_id):
+        return bool(user_id) and _sticky_store().get(f'sticky:{user_id}') is not None
+
+    def _route(self, orm_execute_state):
+        if not self.engines or not has_request_context():
+            return
+        if not g.get('db_use_replica') or g.get('db_primary'):
+            return
+        if not orm_execute_state.is_select:
+            return
+        if getattr(orm_execute_state.statement, '_for_update_arg', None) is not None:
+            return
+        session = orm_execute_state.session
+        if session.new or session.dirty or session.deleted:
+            return
+        self.stats['replica_reads'] += 1
+        return orm_execute_state.invoke_statement(bind_arguments={'bind': self.next_engine()})
+
+    def _mark_write(self, session, flush_context):
+        """After any write, the rest of the request (and the user's next few) read the primary"""
+        if not has_request_context():
+            return
+        g.db_primary = True
+        self.stats['primary_writes'] += 1
+        self.stick(_current_user_id())
+
+
+def _sticky_store():
+    """Shared cache tier if configured (expiring entries, visible to every worker), else the local LRU"""
+    from services.cache import cache
+    return cache.shared if cache.shared is not None else cache.local
+
+
+def _current_user_id():
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+# Router for the process
+router = ReplicaRouter()
+
+
+def use_replica(view):
+    """Serve this route's reads from a replica (apply below @jwt_required())"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if router.engines and not router.is_sticky(_current_user_id()):
+            g.db_use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,267 @@
+# SafeRide Backend - Response Serialization
+# Precompiled row-to-JSON encoders for list endpoints
+
+from flask import Response, request
+from datetime import datetime
+from decimal import Decimal
+import json
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are optional
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+MAX_VARIANTS = 64  # Compiled fieldset variants kept per serializer
+
+# Short keys for ?compact=1 responses
+SHORT_KEYS = {
+    'id': 'i', 'passengerId': 'pi', 'driverId': 'di', 'userId': 'ui',
+    'pickup': 'p', 'dropoff': 'd', 'lat': 'la', 'lng': 'ln', 'address': 'a',
+    'status': 's', 'fare': 'f', 'distance': 'ds', 'duration': 'du',
+    'paymentStatus': 'ps', 'rating': 'r', 'feedback': 'fb',
+    'createdAt': 'c', 'acceptedAt': 'ac', 'arrivedAt': 'ar', 'startedAt': 'st', 'completedAt': 'co',
+    'cancelledAt': 'ca',
+    'email': 'e', 'name': 'n', 'phone': 'ph', 'role': 'ro',
+    'tripId': 'ti', 'amount': 'am',
+}
+
+
+class InvalidFieldsError(ValueError):
+    """Raised when ?fields= names a field the resource does not have"""
+
+from models import User, Driver, Trip, Payment, db
+
+
+class Serializer:
+    """Compiled encoder for one response shape
+
+    A field spec is a list of ``(key, column, kind)`` entries, or
+    ``(key, [subfields])`` for nested objects. The spec is compiled once into
+    a plain function that builds the response dict straight from a
+    column-only result row, so list endpoints skip ORM identity-map
+    construction and per-attribute instrumentation entirely.
+
+    Kinds: ``None`` (as is), ``'float'``, ``'float0'`` (falsy -> 0),
+    ``'bool'`` (truthiness) and ``'datetime'``.
+    """
+
+    def __init__(self, name, fields, short_keys=False):
+        self.name = name
+        self.fields = fields
+        self.short_keys = short_keys
+        self.columns = []
+        self._encode_row = self._compile(fields)
+        self._variants = {}
+
+    def variant(self, requested=None, compact=False):
+        """Get a serializer limited to the requested fields, optionally with short keys
+
+        ``requested`` holds top-level keys (``pickup``) or dotted nested keys
+        (``pickup.lat``). Only the matching columns are selected, so sparse
+        fieldsets shrink the SQL column list as well as the payload. Variants
+        are compiled once and reused.
+        """
+        cache_key = (tuple(sorted(requested)) if requested else None, compact)
+        variant = self._variants.get(cache_key)
+        if variant is None:
+            fields = _select_fields(self.fields, requested) if requested else self.fields
+            variant = Serializer(self.name, fields, short_keys=compact)
+            if len(self._variants) >= MAX_VARIANTS:
+                self._variants.clear()
+            self._variants[cache_key] = variant
+        return variant
+
+    def for_request(self):
+        """Get the variant asked for by ?fields= and ?compact= on the current request"""
+        fields = request.args.get('fields')
+        requested = {field.strip() for field in fields.split(',') if field.strip()} if fields else None
+        compact = request.args.get('compact', '').lower() in ('1', 'true')
+        if not requested and not compact:
+            return self
+        return self.variant(requested, compact)
+
+    def select(self):
+        """Build a column-only query for this shape"""
+        return db.session.query(*self.columns)
+
+    def encode(self, row):
+        """Encode one result row"""
+        return self._encode_row(row)
+
+    def encode_all(self, rows):
+        """Encode a list of result rows"""
+        encode = self._encode_row
+        return [encode(row) for row in rows]
+
+    def _compile(self, fields):
+        """Generate the encoder source once per shape"""
+        source = f'def encode_{self.name}(row):\n    return {self._dict_source(fields)}\n'
+        namespace = {}
+        exec(compile(source, f'<serializer {self.name}>', 'exec'), namespace)
+        return namespace[f'encode_{self.name}']
+
+    def _dict_source(self, fields):
+        """Emit a dict literal for a (possibly nested) field list"""
+        items = []
+        for field in fields:
+            key = SHORT_KEYS.get(field[0], field[0]) if self.short_keys else field[0]
+            if isinstance(field[1], list):
+                items.append(f'{key!r}: {self._dict_source(field[1])}')
+                continue
+            column, kind = field[1], field[2]
+            index = len(self.columns)
+            self.columns.append(column)
+            items.append(f'{key!r}: {_value_source(f"row[{index}]", kind, column)}')
+        return '{' + ', '.join(items) + '}'
+
+
+def _select_fields(fields, requested):
+    """Filter a field spec down to the requested keys (id is always kept)"""
+    known = {field[0] for field in fields}
+    nested = {}
+    for name in requested:
+        parent, _, child = name.partition('.')
+        if parent not in known:
+            raise InvalidFieldsError(f'Unknown field: {name}')
+        if child:
+            nested.setdefault(parent, set()).add(child)
+    selected = []
+    for field in fields:
+        key = field[0]
+        if key == 'id' or key in requested:
+            selected.append(field)
+        elif key in nested and isinstance(field[1], list):
+            selected.append((key, _select_fields(field[1], nested[key])))
+        elif key in nested:
+            raise InvalidFieldsError(f'Field {key} has no nested fields')
+    return selected
+
+
+def _value_source(ref, kind, column):
+    """Emit the conversion expression for one column value"""
+    nullable = getattr(getattr(column, 'expression', column), 'nullable', True)
+    if kind == 'float':
+        return f'float({ref})' if not nullable else f'(float({ref}) if {ref} is not None else None)'
+    if kind == 'float0':
+        return f'(float({ref}) if {ref} else 0)'
+    if kind == 'bool':
+        return f'bool({ref})'
+    if kind == 'datetime' and orjson is None:
+        return f'({ref}.isoformat() if {ref} is not None else None)'
+    # orjson writes naive datetimes exactly like isoformat()
+    return ref
+
+
+def _default(value):
+    """Fallback JSON conversion for the standard library encoder"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Serialize a payload to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload):
+    """Build a JSON response using the fast encoder (drop-in for jsonify)"""
+    return Response(dumps(payload), mimetype='application/json')
+
+
+def negotiated_response(payload):
+    """Build a MessagePack response when the client accepts it, JSON otherwise"""
+    if msgpack is not None:
+        best = request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES)
+        if best in MSGPACK_MIMETYPES:
+            return Response(msgpack.packb(payload, default=_default), mimetype=best)
+    return json_response(payload)
+
+
+# Trip.to_dict
+trip_serializer = Serializer('trip', [
+    ('id', Trip.id, None),
+    ('passengerId', Trip.passenger_id, None),
+    ('driverId', Trip.driver_id, None),
+    ('pickup', [
+        ('lat', Trip.pickup_lat, 'float'),
+        ('lng', Trip.pickup_lng, 'float'),
+        ('address', Trip.pickup_address, None),
+    ]),
+    ('dropoff', [
+        ('lat', Trip.dropoff_lat, 'float'),
+        ('lng', Trip.dropoff_lng, 'float'),
+        ('address', Trip.dropoff_address, None),
+    ]),
+    ('status', Trip.status, None),
+    ('fare', Trip.fare, 'float'),
+    ('distance', Trip.distance, 'float'),
+    ('duration', Trip.duration, None),
+    ('paymentStatus', Trip.payment_status, None),
+    ('rating', Trip.rating, None),
+    ('feedback', Trip.feedback, None),
+    ('createdAt', Trip.created_at, 'datetime'),
+    ('acceptedAt', Trip.accepted_at, 'datetime'),
+    ('arrivedAt', Trip.arrived_at, 'datetime'),
+    ('startedAt', Trip.started_at, 'datetime'),
+    ('completedAt', Trip.completed_at, 'datetime'),
+    ('cancelledAt', Trip.cancelled_at, 'datetime'),
+])
+
+# User.to_dict
+user_serializer = Serializer('user', [
+    ('id', User.id, None),
+    ('email', User.email, None),
+    ('name', User.name, None),
+    ('phone', User.phone, None),
+    ('role', User.role, None),
+    ('createdAt', User.created_at, 'datetime'),
+])
+
+# Driver.to_dict - user columns come from an outer join on users
+driver_serializer = Serializer('driver', [
+    ('id', Driver.id, None),
+    ('userId', Driver.user_id, None),
+    ('name', User.name, None),
+    ('email', User.email, None),
+    ('phone', User.phone, None),
+    ('vehicle', [
+        ('make', Driver.vehicle_make, None),
+        ('model', Driver.vehicle_model, None),
+        ('year', Driver.vehicle_year, None),
+        ('plate', Driver.vehicle_plate, None),
+        ('color', Driver.vehicle_color, None),
+    ]),
+    ('documents', [
+        ('idCard', Driver.document_id_card, 'bool'),
+        ('license', Driver.document_license, 'bool'),
+        ('insurance', Driver.document_insurance, 'bool'),
+        ('logbook', Driver.document_logbook, 'bool'),
+    ]),
+    ('rating', Driver.rating, 'float0'),
+    ('totalTrips', Driver.total_trips, None),
+    ('totalEarnings', Driver.total_earnings, 'float0'),
+    ('status', Driver.status, None),
+    ('isOnline', Driver.is_online, None),
+    ('createdAt', Driver.created_at, 'datetime'),
+])
+
+# Payment.to_dict
+payment_serializer = Serializer('payment', [
+    ('id', Payment.id, None),
+    ('tripId', Payment.trip_id, None),
+    ('amount', Payment.amount, 'float'),
+    ('phone', Payment.phone, None),
+    ('status', Payment.status, None),
+    ('createdAt', Payment.created_at, 'datetime'),
+])
@@ -0,0 +1,167 @@
+# SafeRide Backend - SQLite Production Profile
+# Connection pragmas (WAL etc.) and a single writer thread with group commit
+
+from concurrent.futures import Future
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+import os
+import queue
+import random
+import threading
+import time
+
+# Retries for writes that hit SQLITE_BUSY (incl. BUSY_SNAPSHOT in WAL) outside the write queue
+busy_retries = 3
+BUSY_BACKOFF_SECONDS = 0.05
+
+
+def apply_pragmas(engine, busy_timeout_ms=5000, cache_size_kb=65536, mmap_size=268435456):
+    """Set WAL and performance pragmas on every new SQLite connection"""
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')              # Readers never block the writer
+        cursor.execute('PRAGMA synchronous=NORMAL')            # Safe with WAL, far fewer fsyncs
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute(f'PRAGMA cache_size={-int(cache_size_kb)}')  # Negative = KiB
+        cursor.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
+
+
+class WriteQueue:
+    """Serialize writes through one thread and commit them in groups
+
+    SQLite allows a single writer at a time; concurrent request threads
+    that each open a write transaction contend for the lock and fail with
+    "database is locked" once busy_timeout runs out. Here every write is a
+    callable ``fn(connection)`` queued to one thread, which drains whatever
+    is waiting (up to ``max_batch``) and runs it in one transaction, so N
+    concurrent writes cost one commit/fsync. If a batch fails, its jobs are
+    retried one by one so a bad write only fails its own caller.
+    """
+
+    def __init__(self, engine, max_batch=64, max_wait=0.002):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        """Queue a write; returns a Future with fn's result"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def run(self, fn, timeout=30):
+        """Queue a write and wait for its result"""
+        return self.submit(fn).result(timeout=timeout)
+
+    def _ensure_thread(self):
+        """Start the writer thread lazily (and again after a fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name='sqlite-writer', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            with self.engine.begin() as conn:
+                results = [fn(conn) for fn, _ in batch]
+        except Exception:
+            # Isolate the failing write(s)
+            for fn, future in batch:
+                try:
+                    with self.engine.begin() as conn:
+                        future.set_result(fn(conn))
+                except Exception as e:
+                    future.set_exception(e)
+            self.batches += 1
+            self.writes += len(batch)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        self.batches += 1
+        self.writes += len(batch)
+
+
+# Writer for the process (only set up in SQLite mode)
+writer = None
+
+
+def init_app(app, engine):
+    """Enable the SQLite profile for an engine when configured"""
+    global writer
+    apply_pragmas(
+        engine,
+        busy_timeout_ms=app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000),
+        cache_size_kb=app.config.get('SQLITE_CACHE_SIZE_KB', 65536),
+        mmap_size=app.config.get('SQLITE_MMAP_SIZE', 268435456)
+    )
+    if app.config.get('SQLITE_WRITE_QUEUE', True):
+        writer = WriteQueue(engine)
+    global busy_retries
+    busy_retries = app.config.get('SQLITE_BUSY_RETRIES', 3)
+
+
+def run_write(fn, engine=None):
+    """Run ``fn(connection)`` in a write transaction, via the writer thread in SQLite mode"""
+    if writer is not None:
+        return writer.run(fn)
+    if engine is None:
+        from models import db
+        engine = db.engine
+    with engine.begin() as conn:
+        return fn(conn)
+
+
+def is_busy(error):
+    """Whether an error is SQLite refusing a write because another connection holds the lock"""
+    return isinstance(error, OperationalError) and 'database is locked' in str(error)
+
+
+def _busy_backoff(attempt):
+    time.sleep(BUSY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def retry_busy(fn):
+    """Call ``fn()``, rolling back and calling it again while SQLite reports busy
+
+    For ORM writes that bypass the write queue: in WAL a transaction that
+    read before another connection committed gets SQLITE_BUSY_SNAPSHOT at
+    once, and busy_timeout does not help; the whole transaction has to run
+    again. ``fn`` must hold only that transaction (ending in its commit):
+    calls to M-Pesa and other side effects stay outside it, so a retry
+    never repeats them.
+    """
+    from models import db
+    for attempt in range(busy_retries + 1):
+        try:
+            return fn()
+        except OperationalError as e:
+            if not is_busy(e) or attempt == busy_retries:
+                raise
+            db.session.rollback()
+            _busy_backoff(attempt)
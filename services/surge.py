@@ -0,0 +1,187 @@
+# SafeRide Backend - Surge Pricing
+# Per-zone supply/demand published to the database by the job worker and served from memory
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert, exists
+import logging
+import os
+import threading
+import time
+
+from services import metrics
+from services.geo import cell_id, cell_center
+
+logger = logging.getLogger('saferide.surge')
+
+# Trip statuses in which the assigned driver is busy (not idle supply)
+BUSY_STATUSES = ('accepted', 'arrived', 'driving')
+
+
+class SurgeEngine:
+    """Open requested trips and idle online drivers per zone, and a multiplier per zone
+
+    One scheduled job (``maintenance.surge``) counts open requests and idle
+    drivers per zone from the database every ``tick_seconds``, moves each
+    zone's multiplier ``smoothing`` of the way towards its target and
+    replaces the ``surge_zones`` table. Driver locations come from the
+    ``drivers`` row each ping updates, so every worker's drivers count.
+    Each web process loads the newest ``surge_zones`` build on a
+    background thread, never in a request, so all workers quote the same
+    multipliers; ``multiplier()`` is a single dict lookup.
+    """
+
+    def __init__(self, cell_degrees=0.01, tick_seconds=10, smoothing=0.3, sensitivity=0.5, max_multiplier=2.5,
+                 location_ttl=120, enabled=True):
+        self.cell_degrees = cell_degrees
+        self.tick_seconds = tick_seconds
+        self.smoothing = smoothing
+        self.sensitivity = sensitivity
+        self.max_multiplier = max_multiplier
+        self.location_ttl = location_ttl  # Seconds a driver's last ping counts as supply
+        self.enabled = enabled
+        self._zones = {}        # zone -> (multiplier, open trips, idle drivers) of the loaded build
+        self._multipliers = {}  # zone -> multiplier (> 1 only)
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def zone(self, lat, lng):
+        return cell_id(lat, lng, self.cell_degrees)
+
+    def multiplier(self, lat, lng):
+        """Current multiplier for the zone containing a point"""
+        return self._multipliers.get(cell_id(lat, lng, self.cell_degrees), 1.0)
+
+    def target(self, demand, supply):
+        """Multiplier a zone is moving towards for its open requests and idle drivers"""
+        if demand <= supply:
+            return 1.0
+        return min(1.0 + self.sensitivity * (demand - supply) / max(supply, 1), self.max_multiplier)
+
+    # Job worker
+
+    def counts(self, now=None):
+        """(demand, supply): open requested trips and idle online drivers per zone, from the database"""
+        from models import db, Trip, Driver
+        now = now or datetime.utcnow()
+        try:
+            open_trips = db.session.execute(
+                select(Trip.pickup_lat, Trip.pickup_lng).where(Trip.status == 'requested')
+            ).all()
+            idle_drivers = db.session.execute(select(Driver.last_lat, Driver.last_lng).where(
+                Driver.is_online.is_(True),
+                Driver.located_at >= now - timedelta(seconds=self.location_ttl),
+                ~exists().where(Trip.driver_id == Driver.user_id, Trip.status.in_(BUSY_STATUSES))
+            )).all()
+        finally:
+            db.session.rollback()  # End the read transaction
+        demand, supply = {}, {}
+        for lat, lng in open_trips:
+            zone = self.zone(float(lat), float(lng))
+            demand[zone] = demand.get(zone, 0) + 1
+        for lat, lng in idle_drivers:
+            zone = self.zone(lat, lng)
+            supply[zone] = supply.get(zone, 0) + 1
+        return demand, supply
+
+    def publish(self, now=None):
+        """Move every zone's multiplier towards its target and replace surge_zones; returns the zones surging"""
+        from models import SurgeZone
+        from services.sqlite_writer import run_write
+        table = SurgeZone.__table__
+        now = now or datetime.utcnow()
+        demand, supply = self.counts(now)
+
+        def replace(conn):
+            current = dict(conn.execute(select(table.c.zone, table.c.multiplier)).all())
+            rows = []
+            for zone in demand.keys() | supply.keys() | current.keys():
+                previous = current.get(zone, 1.0)
+                value = previous + self.smoothing * (self.target(demand.get(zone, 0), supply.get(zone, 0)) - previous)
+                value = round(value, 2) if value >= 1.01 else 1.0
+                if value > 1.0 or zone in demand or zone in supply:
+                    rows.append({'zone': zone, 'multiplier': value, 'open_trips': demand.get(zone, 0),
+                                 'idle_drivers': supply.get(zone, 0), 'built_at': now})
+            conn.execute(delete(table))
+            if rows:
+                conn.execute(insert(table), rows)
+            return sum(row['multiplier'] > 1.0 for row in rows)
+
+        # Previous multipliers are read in the transaction that replaces them
+        return run_write(replace)
+
+    # Web processes
+
+    def refresh(self):
+        """Load surge_zones if it holds a newer build; keeps the current multipliers if it can't"""
+        from models import db, SurgeZone
+        try:
+            built_at = db.session.query(db.func.max(SurgeZone.built_at)).scalar()
+            if built_at != self.built_at:
+                rows = db.session.query(SurgeZone.zone, SurgeZone.multiplier, SurgeZone.open_trips,
+                                        SurgeZone.idle_drivers).all()
+                zones = {zone: (value, open_trips, idle) for zone, value, open_trips, idle in rows}
+                multipliers = {zone: value for zone, (value, _, _) in zones.items() if value > 1.0}
+                with self._lock:
+                    self._zones, self._multipliers, self.built_at = zones, multipliers, built_at
+                metrics.registry.set('saferide_surge_zones', (), len(multipliers))
+                metrics.registry.set('saferide_surge_max_multiplier', (), max(multipliers.values(), default=1.0))
+        except Exception:
+            logger.exception('Could not load surge zones; keeping the current multipliers')
+        finally:
+            db.session.rollback()  # End the read transaction
+
+    def start(self, app):
+        """Run ``refresh`` on a background thread in this process (again after a fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(app,), name='surge', daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                self.refresh()
+            time.sleep(self.tick_seconds)
+
+    def snapshot(self):
+        """Zones with surge, busiest first"""
+        with self._lock:
+            zones = [
+                {'zone': zone, 'center': cell_center(zone, self.cell_degrees), 'multiplier': value,
+                 'openTrips': open_trips, 'idleDrivers': idle}
+                for zone, (value, open_trips, idle) in self._zones.items() if value > 1.0
+            ]
+            totals = {'openTrips': sum(row[1] for row in self._zones.values()),
+                      'idleDrivers': sum(row[2] for row in self._zones.values())}
+            built_at = self.built_at
+        zones.sort(key=lambda z: z['multiplier'], reverse=True)
+        return dict(totals, zones=zones, cellDegrees=self.cell_degrees,
+                    builtAt=built_at.isoformat() if built_at else None)
+
+
+# Shared engine for the process
+surge = SurgeEngine()
+
+
+def init_app(app):
+    """Configure the surge engine and start its loader thread in each process that serves requests"""
+    surge.enabled = app.config['SURGE_ENABLED']
+    surge.cell_degrees = app.config['SURGE_CELL_DEGREES']
+    surge.tick_seconds = app.config['SURGE_TICK_SECONDS']
+    surge.smoothing = app.config['SURGE_SMOOTHING']
+    surge.sensitivity = app.config['SURGE_SENSITIVITY']
+    surge.max_multiplier = app.config['SURGE_MAX_MULTIPLIER']
+    surge.location_ttl = app.config['PRESENCE_TTL_SECONDS']
+    if not surge.enabled:
+        return
+
+    # Started lazily so preloaded Gunicorn workers each get their own after the fork
+    @app.before_request
+    def start_surge():
+        surge.start(app)
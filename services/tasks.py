@@ -0,0 +1,146 @@
+# SafeRide Backend - Background Tasks
+# Work moved off the request path; every task is safe to retry
+
+from datetime import datetime
+from sqlalchemy import func, select
+import logging
+import os
+
+from models import db, Driver, Trip
+from services import archive
+from services.cache import cache
+from services.jobs import task, PRIORITY_HIGH, PRIORITY_LOW
+
+logger = logging.getLogger('saferide.jobs')
+
+# Leading bytes of each allowed upload type
+FILE_SIGNATURES = {
+    'pdf': (b'%PDF',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+}
+
+DOCUMENT_FIELDS = {
+    'idCard': 'document_id_card',
+    'license': 'document_license',
+    'insurance': 'document_insurance',
+    'logbook': 'document_logbook',
+}
+
+
+@task('drivers.update_stats')
+def update_driver_stats(driver_user_id):
+    """Recompute trip count and earnings from completed trips
+
+    Recomputing (rather than incrementing) keeps retries and duplicate
+    enqueues harmless.
+    """
+    total_trips, total_earnings = archive.count_across(lambda tier: select(
+        func.count(), func.sum(tier.trips.c.fare)
+    ).where(tier.trips.c.driver_id == driver_user_id, tier.trips.c.status == 'completed'))
+    Driver.query.filter_by(user_id=driver_user_id).update({
+        'total_trips': total_trips,
+        'total_earnings': total_earnings,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    cache.invalidate(f'driver:{driver_user_id}')
+
+
+@task('drivers.recompute_rating')
+def recompute_driver_rating(driver_user_id):
+    """Average the driver's trip ratings"""
+    rating_sum, rating_count = archive.count_across(lambda tier: select(
+        func.sum(tier.trips.c.rating), func.count(tier.trips.c.rating)
+    ).where(tier.trips.c.driver_id == driver_user_id))
+    Driver.query.filter_by(user_id=driver_user_id).update({
+        'rating': round(float(rating_sum) / rating_count, 2) if rating_count else 0,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    cache.invalidate(f'driver:{driver_user_id}')
+
+
+@task('trips.notify_drivers', priority=PRIORITY_HIGH, max_attempts=3)
+def notify_drivers(trip_id):
+    """Tell online, approved drivers about a new trip request"""
+    trip = Trip.query.get(trip_id)
+    if not trip or trip.status != 'requested':
+        return
+    driver_ids = [row[0] for row in db.session.query(Driver.user_id).filter_by(is_online=True, status='approved')]
+    # No push provider is integrated yet; drivers poll /drivers/available-trips
+    logger.info('Trip %s: notifying %d online driver(s)', trip_id, len(driver_ids))
+
+
+@task('drivers.submit_payout', queue='payouts', max_attempts=8)
+def submit_payout(payout_id, driver_user_id, amount, phone):
+    """Send a driver payout through M-Pesa B2C; failures retry with backoff"""
+    from services.mpesa import MpesaService
+    result = MpesaService().b2c_payment(phone_number=phone, amount=amount, remarks=f'Payout {payout_id}')
+    if not result.get('success'):
+        raise RuntimeError(f'B2C payout {payout_id} rejected: {result.get("response_description")}')
+    logger.info('Payout %s of %s to driver %s submitted (%s)', payout_id, amount, driver_user_id,
+                result.get('conversation_id'))
+
+
+@task('drivers.process_document', priority=PRIORITY_LOW)
+def process_document(driver_user_id, document_type, filepath):
+    """Check an uploaded document's content matches its extension; reject it otherwise"""
+    ext = filepath.rsplit('.', 1)[-1].lower()
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(16)
+    except FileNotFoundError:
+        head = b''
+    if any(head.startswith(signature) for signature in FILE_SIGNATURES.get(ext, ())):
+        return
+
+    logger.warning('Rejected %s upload for driver %s: content does not match .%s', document_type, driver_user_id, ext)
+    field = DOCUMENT_FIELDS[document_type]
+    Driver.query.filter(Driver.user_id == driver_user_id, getattr(Driver, field) == filepath).update({
+        field: None,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    cache.invalidate(f'driver:{driver_user_id}')
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+@task('maintenance.expire_stale', priority=PRIORITY_LOW, max_attempts=3)
+def expire_stale():
+    """Cancel stale trip requests and expire abandoned payments (scheduled, see jobs.SCHEDULES)"""
+    from flask import current_app
+    from services import expiry
+    counts = expiry.sweep(current_app.config)
+    if any(counts.values()):
+        logger.info('Expiry sweep: %s', counts)
+
+
+@task('maintenance.archive_trips', priority=PRIORITY_LOW, max_attempts=3)
+def archive_trips():
+    """Move finished trips past the hot window to the archive tables (scheduled, see jobs.SCHEDULES)"""
+    from flask import current_app
+    config = current_app.config
+    archive.archive_trips(config['ARCHIVE_AFTER_DAYS'], config['ARCHIVE_BATCH_SIZE'], config['ARCHIVE_EXPORT_DIR'],
+                          max_batches=config['ARCHIVE_MAX_BATCHES'])
+
+
+@task('maintenance.build_eta', priority=PRIORITY_LOW, max_attempts=3)
+def build_eta():
+    """Relearn the ETA speed grid from completed trips (scheduled, see jobs.SCHEDULES)"""
+    from flask import current_app
+    from services import eta
+    config = current_app.config
+    eta.build(config['ETA_CELL_DEGREES'], config['ETA_COARSE_CELL_DEGREES'], config['ETA_MIN_SAMPLES'],
+              config['ETA_HISTORY_DAYS'])
+
+
+@task('maintenance.surge', max_attempts=3)
+def publish_surge():
+    """Recount supply and demand per zone and publish surge multipliers (scheduled, see jobs.SCHEDULES)"""
+    from flask import current_app
+    from services.surge import surge
+    if current_app.config['SURGE_ENABLED']:
+        surge.publish()
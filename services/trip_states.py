@@ -0,0 +1,147 @@
+# SafeRide Backend - Trip State Machine
+# requested -> accepted -> arrived -> driving -> completed, or cancelled before the ride starts
+
+from datetime import datetime
+from sqlalchemy import case, event, literal, update
+
+from models import db, Trip, TripTransition
+from services.cache import cache
+
+# action -> (statuses it may leave, status it enters, timestamp column it sets, who may take it)
+TRANSITIONS = {
+    'accept': (('requested',), 'accepted', 'accepted_at', 'any_driver'),
+    'arrive': (('accepted',), 'arrived', 'arrived_at', 'driver'),
+    'start': (('arrived',), 'driving', 'started_at', 'driver'),
+    'complete': (('driving',), 'completed', 'completed_at', 'driver'),
+    'cancel': (('requested', 'accepted', 'arrived'), 'cancelled', 'cancelled_at', 'participant'),
+    'expire': (('requested', 'accepted', 'arrived'), 'cancelled', 'cancelled_at', 'system'),
+}
+
+ACTIVE_STATUSES = ('requested', 'accepted', 'arrived', 'driving')
+
+# Status -> column set when a trip enters it
+ENTERED_AT = {
+    'requested': Trip.created_at,
+    'accepted': Trip.accepted_at,
+    'arrived': Trip.arrived_at,
+    'driving': Trip.started_at,
+}
+
+
+class TransitionError(Exception):
+    """Raised when a trip cannot take a transition; carries the API error code and HTTP status"""
+
+    def __init__(self, code, message, status):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def _actor_filter(guard, actor_id):
+    if guard == 'driver':
+        return Trip.driver_id == actor_id
+    if guard == 'participant':
+        return db.or_(Trip.passenger_id == actor_id, Trip.driver_id == actor_id)
+    return db.true()
+
+
+def _left_status(sources):
+    """Expression for the status a trip left, read back through RETURNING
+
+    Sources are listed in lifecycle order, so the latest one whose entry
+    timestamp is set is the one the trip was in (the transition never sets
+    those columns). "Set" is tested as ``>= created_at`` rather than ``IS
+    NOT NULL``: SQLite 3.40 evaluates IS [NOT] NULL wrongly in RETURNING.
+    """
+    if len(sources) == 1:
+        return literal(sources[0])
+    return case(*[(ENTERED_AT[source] >= Trip.created_at, source) for source in reversed(sources[1:])],
+                 else_=sources[0])
+
+
+def _apply(action, conditions, actor_id=None, reason=None, sources=None, values=None, now=None):
+    """One conditional UPDATE over every trip matching ``conditions``; returns (id, left, passenger, driver) rows"""
+    allowed, target, timestamp, guard = TRANSITIONS[action]
+    sources = tuple(source for source in allowed if source in sources) if sources else allowed
+    now = now or datetime.utcnow()
+    changes = dict(values or {}, status=target)
+    changes[timestamp] = now
+    if action == 'accept':
+        changes['driver_id'] = actor_id
+    rows = db.session.execute(
+        update(Trip).where(*conditions, Trip.status.in_(sources), _actor_filter(guard, actor_id))
+        .values(**changes)
+        .returning(Trip.id, _left_status(sources), Trip.passenger_id, Trip.driver_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    committed = db.session.info.setdefault('trip_transitions', [])
+    for trip_id, source, passenger_id, driver_id in rows:
+        db.session.add(TripTransition(trip_id=trip_id, from_status=source, to_status=target,
+                                      actor_id=actor_id, reason=reason, created_at=now))
+        committed.append((trip_id, source, target, driver_id))
+    return rows
+
+
+def transition(trip_id, action, actor_id, reason=None, **values):
+    """Move a trip along ``action`` with one conditional UPDATE; returns the status it left
+
+    The update is a single ``UPDATE ... WHERE status IN (:sources) AND
+    <actor guard> RETURNING <prior status>``, so two racing requests (two
+    drivers accepting, a cancel against a start) cannot both win: the
+    loser updates zero rows. Extra column values (e.g. ``driver_id`` on
+    accept) are set in the same statement. The transition log row joins
+    the caller's transaction; the caller commits, and the cache hooks run
+    once the commit succeeds.
+    """
+    rows = _apply(action, [Trip.id == trip_id], actor_id, reason, values=values)
+    if rows:
+        return rows[0][1]
+
+    # Nothing matched: explain why (read only to build the error)
+    row = db.session.query(Trip.status, Trip.passenger_id, Trip.driver_id).filter(Trip.id == trip_id).first()
+    if row is None:
+        raise TransitionError('TRIP_NOT_FOUND', 'Trip not found', 404)
+    status, passenger_id, driver_id = row
+    guard = TRANSITIONS[action][3]
+    if guard == 'driver' and driver_id != actor_id or guard == 'participant' and actor_id not in (passenger_id, driver_id):
+        raise TransitionError('UNAUTHORIZED', 'Unauthorized', 403)
+    if action == 'accept':
+        raise TransitionError('INVALID_STATUS', 'Trip is not available', 400)
+    raise TransitionError('INVALID_STATUS', f'Cannot {action} a trip that is {status}', 400)
+
+
+def transition_many(trip_ids, action, reason=None, sources=None, now=None):
+    """System transition of a batch of trips in one UPDATE; returns (id, left, passenger, driver) per trip moved
+
+    ``sources`` narrows the statuses the trips may leave (e.g. only those
+    the caller picked them in). Trips that moved on meanwhile are skipped.
+    """
+    if not trip_ids:
+        return []
+    return _apply(action, [Trip.id.in_(trip_ids)], reason=reason, sources=sources, now=now)
+
+
+def _run_hooks(session):
+    """Invalidate the available-trips and driver caches for transitions that just committed"""
+    changes = session.info.pop('trip_transitions', None)
+    if not changes:
+        return
+    if any(source == 'requested' for _, source, _, _ in changes):
+        cache.invalidate('trips:available')
+    for _, _, target, driver_id in changes:
+        if target == 'completed':
+            cache.invalidate(f'driver:{driver_id}')
+
+
+def _drop_hooks(session):
+    session.info.pop('trip_transitions', None)
+
+
+event.listen(db.session, 'after_commit', _run_hooks)
+event.listen(db.session, 'after_rollback', _drop_hooks)
+
+
+def history(trip_id):
+    """Transitions of a trip, oldest first"""
+    return TripTransition.query.filter_by(trip_id=trip_id).order_by(TripTransition.id).all()
@@ -0,0 +1,91 @@
+# SafeRide Backend - Test Fixtures
+# A fresh app on a migrated temporary SQLite database per test, with registered users
+
+import pytest
+
+from app import create_app
+from models import db
+
+PICKUP = {'lat': -1.2800, 'lng': 36.8200, 'address': 'Kenyatta Avenue'}
+DROPOFF = {'lat': -1.3000, 'lng': 36.8500, 'address': 'Mombasa Road'}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('SURGE_ENABLED', 'false')
+    monkeypatch.setenv('CACHE_ENABLED', 'false')
+    monkeypatch.setenv('JOBS_EAGER', 'false')
+    monkeypatch.delenv('METRICS_DIR', raising=False)
+    monkeypatch.delenv('CACHE_REDIS_URL', raising=False)
+    app = create_app()
+    with app.app_context():
+        from commands import init_db
+        init_db()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """Register a user and return their Authorization header"""
+    phones = iter(range(712000000, 713000000))
+
+    def register(email, role='passenger'):
+        response = client.post('/api/v1/auth/register', json={
+            'email': email, 'password': 'password1', 'name': email.split('@')[0], 'role': role,
+            'phone': f'0{next(phones)}'
+        })
+        assert response.status_code == 201, response.get_json()
+        return {'Authorization': f'Bearer {response.get_json()["token"]}'}
+    return register
+
+
+@pytest.fixture
+def passenger(register):
+    return register('passenger@example.com')
+
+
+@pytest.fixture
+def driver(register):
+    return register('driver@example.com', 'driver')
+
+
+@pytest.fixture
+def admin(register):
+    return register('admin@example.com', 'admin')
+
+
+@pytest.fixture
+def request_trip(client, passenger):
+    """Book a trip for the passenger and return its id"""
+    def request_trip(headers=None, **extra):
+        response = client.post('/api/v1/trips', json=dict({'pickup': PICKUP, 'dropoff': DROPOFF}, **extra),
+                               headers=headers or passenger)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['data']['id']
+    return request_trip
+
+
+@pytest.fixture
+def advance(client, driver):
+    """Take a trip through driver actions (accept, arrive, start, complete)"""
+    def advance(trip_id, *actions, headers=None):
+        for action in actions:
+            response = client.put(f'/api/v1/trips/{trip_id}/{action}', json={}, headers=headers or driver)
+            assert response.status_code == 200, (action, response.get_json())
+    return advance
@@ -0,0 +1,80 @@
+# SafeRide Backend - Expiry Sweeper Tests
+# Stale trips are cancelled through the state machine and stale payments expired, in batches
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, Trip, Payment, OutboxEvent
+from services import expiry, trip_states
+
+
+def age(trip_id, seconds, column='created_at'):
+    db.session.execute(update(Trip).where(Trip.id == trip_id)
+                       .values({column: datetime.utcnow() - timedelta(seconds=seconds)}))
+    db.session.commit()
+
+
+def test_stale_requests_are_cancelled(app, request_trip):
+    stale, fresh = request_trip(), request_trip()
+    with app.app_context():
+        age(stale, 1000)
+        assert expiry.expire_trips('requested', 900) == 1
+        assert db.session.get(Trip, stale).status == 'cancelled'
+        assert db.session.get(Trip, stale).cancelled_at is not None
+        assert db.session.get(Trip, fresh).status == 'requested'
+        last = trip_states.history(stale)[-1]
+        assert (last.from_status, last.to_status, last.reason, last.actor_id) == \
+            ('requested', 'cancelled', 'expired', None)
+        event = OutboxEvent.query.filter_by(topic='trip.expired').one()
+        assert event.aggregate_id == stale
+
+
+def test_timeout_counts_from_entering_the_status(app, request_trip, advance):
+    trip_id = request_trip()
+    advance(trip_id, 'accept')
+    with app.app_context():
+        # Requested long ago but only just accepted: not stale as an accepted trip
+        age(trip_id, 5000)
+        assert expiry.expire_trips('requested', 900) == 0
+        assert expiry.expire_trips('accepted', 3600) == 0
+        age(trip_id, 4000, 'accepted_at')
+        assert expiry.expire_trips('accepted', 3600) == 1
+        assert trip_states.history(trip_id)[-1].from_status == 'accepted'
+
+
+def test_expires_in_batches(app, request_trip):
+    trip_ids = [request_trip() for _ in range(5)]
+    with app.app_context():
+        for trip_id in trip_ids:
+            age(trip_id, 1000)
+        assert expiry.expire_trips('requested', 900, batch_size=2) == 5
+        assert Trip.query.filter_by(status='cancelled').count() == 5
+
+
+def test_stale_payments_expire(app, request_trip):
+    trip_id = request_trip()
+    with app.app_context():
+        old = Payment(trip_id=trip_id, amount=100, phone='254712345678', status='pending',
+                      created_at=datetime.utcnow() - timedelta(seconds=700))
+        paid = Payment(trip_id=trip_id, amount=100, phone='254712345678', status='paid',
+                       created_at=datetime.utcnow() - timedelta(seconds=700))
+        db.session.add_all([old, paid])
+        db.session.commit()
+        assert expiry.expire_payments(600) == 1
+        assert db.session.get(Payment, old.id).status == 'expired'
+        assert db.session.get(Payment, paid.id).status == 'paid'
+        assert OutboxEvent.query.filter_by(topic='payment.expired').one().aggregate_id == old.id
+
+
+def test_sweep_skips_disabled_timeouts(app, request_trip):
+    trip_id = request_trip()
+    with app.app_context():
+        age(trip_id, 1000)
+        config = dict(app.config, TRIP_EXPIRY_SECONDS={'requested': 0, 'accepted': 3600, 'arrived': 1800})
+        counts = expiry.sweep(config)
+        assert 'trips.requested' not in counts
+        assert counts['trips.accepted'] == counts['payments.pending'] == 0
+        assert db.session.get(Trip, trip_id).status == 'requested'
+
+        assert expiry.sweep(app.config)['trips.requested'] == 1
@@ -0,0 +1,113 @@
+# SafeRide Backend - Idempotency Key Tests
+# Retries under one Idempotency-Key run the view once and replay its response
+
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from sqlalchemy import update
+
+from models import db, Trip, IdempotencyKey
+from services import idempotency
+from tests.conftest import PICKUP, DROPOFF
+
+BOOKING = {'pickup': PICKUP, 'dropoff': DROPOFF}
+
+
+def book(client, headers, key, body=BOOKING):
+    return client.post('/api/v1/trips', json=body, headers=dict(headers, **{'Idempotency-Key': key}))
+
+
+def trip_count(app):
+    with app.app_context():
+        return Trip.query.count()
+
+
+def test_retry_replays_the_stored_response(app, client, passenger):
+    first = book(client, passenger, 'booking-1')
+    retry = book(client, passenger, 'booking-1')
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert trip_count(app) == 1
+
+
+def test_key_reused_for_another_request_is_rejected(app, client, passenger):
+    book(client, passenger, 'booking-1')
+    response = book(client, passenger, 'booking-1', dict(BOOKING, dropoff=PICKUP, pickup=DROPOFF))
+
+    assert response.status_code == 422
+    assert response.get_json()['error']['code'] == 'IDEMPOTENCY_KEY_REUSED'
+    assert trip_count(app) == 1
+
+
+def test_keys_are_scoped_per_user(app, client, passenger, register):
+    other = register('other@example.com')
+    book(client, passenger, 'booking-1')
+    response = book(client, other, 'booking-1')
+
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+    assert trip_count(app) == 2
+
+
+def test_requests_without_a_key_are_not_deduplicated(app, client, passenger):
+    client.post('/api/v1/trips', json=BOOKING, headers=passenger)
+    client.post('/api/v1/trips', json=BOOKING, headers=passenger)
+    assert trip_count(app) == 2
+
+
+def test_invalid_key(client, passenger):
+    response = book(client, passenger, '')
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'INVALID_IDEMPOTENCY_KEY'
+
+
+def test_concurrent_duplicates_run_once(app, passenger):
+    barrier = threading.Barrier(6)
+
+    def attempt(_):
+        client = app.test_client()
+        barrier.wait()
+        return book(client, passenger, 'booking-1')
+
+    with ThreadPoolExecutor(6) as pool:
+        responses = list(pool.map(attempt, range(6)))
+
+    assert trip_count(app) == 1
+    assert {response.status_code for response in responses} <= {201, 409}
+    ids = {response.get_json()['data']['id'] for response in responses if response.status_code == 201}
+    assert len(ids) == 1
+
+
+def test_abandoned_key_is_taken_over(app, client, passenger):
+    book(client, passenger, 'booking-1')
+    with app.app_context():
+        # As if the request holding the key died before storing its response
+        db.session.execute(update(IdempotencyKey).values(
+            status_code=None, body=None, lock_token='dead', locked_until=datetime.utcnow() - timedelta(seconds=1)
+        ))
+        db.session.commit()
+
+    response = book(client, passenger, 'booking-1')
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+    assert trip_count(app) == 2
+    assert book(client, passenger, 'booking-1').headers['Idempotent-Replayed'] == 'true'
+
+
+def test_expired_keys_are_purged(app, client, passenger):
+    book(client, passenger, 'booking-1')
+    book(client, passenger, 'booking-2')
+    with app.app_context():
+        db.session.execute(update(IdempotencyKey).where(IdempotencyKey.id == 1)
+                           .values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        assert idempotency.purge_expired(batch_size=1) == 1
+        assert IdempotencyKey.query.count() == 1
+
+    response = book(client, passenger, 'booking-1')
+    assert 'Idempotent-Replayed' not in response.headers
+    assert trip_count(app) == 3
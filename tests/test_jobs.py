@@ -0,0 +1,124 @@
+# SafeRide Backend - Job Queue Tests
+# Claiming, retries with backoff, dead jobs and recovery of expired leases
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Job
+from services import jobs
+
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task('tests.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('task failed')
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def enqueue(name, payload=None, **options):
+    job = jobs.enqueue(name, payload, **options)
+    db.session.commit()
+    return job.id
+
+
+def test_rolled_back_enqueue_leaves_no_job(app_context):
+    jobs.enqueue('tests.record', {'value': 1})
+    db.session.rollback()
+    assert Job.query.count() == 0
+
+
+def test_claim_leases_a_job_once(app_context):
+    job_id = enqueue('tests.record', {'value': 1})
+
+    claimed = jobs.claim('worker-1', ['default'])
+    assert [job['id'] for job in claimed] == [job_id]
+    assert claimed[0]['attempts'] == 1
+    assert jobs.claim('worker-2', ['default']) == []
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.locked_by) == ('running', 'worker-1')
+
+
+def test_claim_order_priority_delay_and_queue(app_context):
+    low = enqueue('tests.record', {'value': 'low'}, priority=jobs.PRIORITY_LOW)
+    high = enqueue('tests.record', {'value': 'high'}, priority=jobs.PRIORITY_HIGH)
+    enqueue('tests.record', {'value': 'later'}, delay=3600)
+    enqueue('tests.record', {'value': 'other'}, queue='payouts')
+
+    claimed = jobs.claim('worker-1', ['default'], limit=5)
+    assert [job['id'] for job in claimed] == [high, low]
+
+
+def test_run_job_success(app_context):
+    job_id = enqueue('tests.record', {'value': 42})
+    assert jobs.run_job(jobs.claim('worker-1', ['default'])[0]) == 'done'
+    assert calls == [42]
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.locked_by) == ('done', None)
+    assert job.finished_at is not None
+
+
+def test_failure_retries_with_backoff_then_dies(app_context):
+    job_id = enqueue('tests.fail')
+
+    before = datetime.utcnow()
+    assert jobs.run_job(jobs.claim('worker-1', ['default'])[0]) == 'retry'
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts, job.locked_by) == ('queued', 1, None)
+    assert 'task failed' in job.last_error
+    assert before + timedelta(seconds=jobs.BACKOFF_BASE_SECONDS * 0.5) <= job.run_at
+    assert jobs.claim('worker-1', ['default']) == []  # Not runnable until its backoff passes
+
+    job.run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert jobs.run_job(jobs.claim('worker-1', ['default'])[0]) == 'dead'
+    job = db.session.get(Job, job_id)
+    assert (job.status, job.attempts) == ('dead', 2)
+    assert job.finished_at is not None
+
+
+def test_backoff_grows_and_is_capped():
+    for attempts in range(1, 20):
+        delay = min(jobs.BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), jobs.BACKOFF_MAX_SECONDS)
+        assert delay * 0.5 <= jobs.backoff_seconds(attempts) <= delay * 1.5
+    assert jobs.backoff_seconds(50) <= jobs.BACKOFF_MAX_SECONDS * 1.5
+
+
+def test_requeue_stale_leases(app_context):
+    retried = enqueue('tests.record', {'value': 1})
+    exhausted = enqueue('tests.fail')
+    fresh = enqueue('tests.record', {'value': 2})
+    jobs.claim('worker-1', ['default'], limit=3)
+    for job_id in (retried, exhausted):
+        job = db.session.get(Job, job_id)
+        job.locked_at = datetime.utcnow() - timedelta(minutes=10)
+    db.session.get(Job, exhausted).attempts = 2
+    db.session.commit()
+
+    assert jobs.requeue_stale(visibility_timeout=60) == (1, 1)
+    db.session.expire_all()
+    assert db.session.get(Job, retried).status == 'queued'
+    assert db.session.get(Job, exhausted).status == 'dead'
+    assert db.session.get(Job, fresh).status == 'running'
+
+
+def test_scheduled_task_queues_its_successor(app, app_context):
+    jobs.ensure_scheduled(['default'])
+    jobs.ensure_scheduled(['default'])
+    assert Job.query.filter_by(name='maintenance.expire_stale', status='queued').count() == 1
+
+    job = next(job for job in jobs.claim('worker-1', ['default'], limit=10) if job['name'] == 'maintenance.expire_stale')
+    assert jobs.run_job(job) == 'done'
+    successor = Job.query.filter_by(name='maintenance.expire_stale', status='queued').one()
+    interval = app.config['EXPIRY_SWEEP_INTERVAL']
+    assert successor.run_at >= datetime.utcnow() + timedelta(seconds=interval - 5)
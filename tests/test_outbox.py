@@ -0,0 +1,98 @@
+# SafeRide Backend - Outbox Tests
+# Events commit with their state change and reach the broker once, in order
+
+import pytest
+
+from models import db, OutboxEvent
+from services import outbox
+
+
+@pytest.fixture
+def subscribers(monkeypatch):
+    monkeypatch.setattr(outbox, 'SUBSCRIBERS', [])
+    return outbox.SUBSCRIBERS
+
+
+def test_relay_publishes_in_order_once(app_context):
+    for n in range(5):
+        outbox.record('trip.requested', 'trip', f't_{n}', n=n)
+    db.session.commit()
+    broker = outbox.LocalBroker()
+
+    assert outbox.relay_batch(broker, batch_size=3) == 3
+    assert outbox.relay_batch(broker, batch_size=3) == 2
+    assert outbox.relay_batch(broker, batch_size=3) == 0
+    assert [event.payload['n'] for event in broker.published] == [0, 1, 2, 3, 4]
+    assert [event.aggregate_id for event in broker.published] == [f't_{n}' for n in range(5)]
+    assert OutboxEvent.query.filter(OutboxEvent.published_at.is_(None)).count() == 0
+    assert outbox.pending()['pending'] == 0
+
+
+def test_rolled_back_events_are_never_published(app_context):
+    outbox.record('trip.requested', 'trip', 't_kept')
+    db.session.commit()
+    outbox.record('trip.requested', 'trip', 't_dropped')
+    db.session.rollback()
+    broker = outbox.LocalBroker()
+
+    outbox.relay_batch(broker)
+    assert [event.aggregate_id for event in broker.published] == ['t_kept']
+
+
+def test_broker_failure_leaves_events_pending(app_context):
+    class FailingBroker(outbox.LocalBroker):
+        def publish(self, events):
+            raise ConnectionError('broker down')
+
+    outbox.record('payment.paid', 'payment', 'p_1')
+    db.session.commit()
+
+    with pytest.raises(ConnectionError):
+        outbox.relay_batch(FailingBroker())
+    assert outbox.pending()['pending'] == 1
+    broker = outbox.LocalBroker()
+    assert outbox.relay_batch(broker) == 1
+    assert broker.published[0].topic == 'payment.paid'
+
+
+def test_subscribers_match_topics_and_survive_failures(app_context, subscribers):
+    seen = []
+
+    @outbox.subscribe('trip.*')
+    def broken(event):
+        raise RuntimeError('handler bug')
+
+    @outbox.subscribe('trip.*')
+    def record_trip(event):
+        seen.append(event.topic)
+
+    outbox.record('trip.accepted', 'trip', 't_1')
+    outbox.record('payment.paid', 'payment', 'p_1')
+    db.session.commit()
+
+    assert outbox.relay_batch(outbox.LocalBroker()) == 2
+    assert seen == ['trip.accepted']
+
+
+def test_relay_drains_backlog(app):
+    with app.app_context():
+        for n in range(7):
+            outbox.record('trip.requested', 'trip', f't_{n}')
+        db.session.commit()
+    broker = outbox.LocalBroker()
+    relay = outbox.Relay(app, broker=broker, batch_size=2)
+
+    assert relay.run_once() == 7
+    assert relay.run_once() == 0
+    assert len(broker.published) == 7
+
+
+def test_trip_lifecycle_events(request_trip, advance, app):
+    trip_id = request_trip()
+    advance(trip_id, 'accept', 'arrive', 'start', 'complete')
+    broker = outbox.LocalBroker()
+    with app.app_context():
+        outbox.relay_batch(broker)
+    assert [(event.topic, event.aggregate_id) for event in broker.published] == [
+        ('trip.accepted', trip_id), ('trip.arrived', trip_id), ('trip.started', trip_id), ('trip.completed', trip_id)
+    ]
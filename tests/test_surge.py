@@ -0,0 +1,59 @@
+# SafeRide Backend - Surge Tests
+# Multipliers published from database driver locations and open trips, and loaded by web workers
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, Driver
+from services.surge import SurgeEngine
+from tests.conftest import PICKUP
+
+
+def test_published_multipliers_follow_supply_and_demand(app, client, driver, request_trip, advance):
+    client.put('/api/v1/drivers/status', json={'isOnline': True}, headers=driver)
+    client.put('/api/v1/drivers/location', json={'lat': PICKUP['lat'], 'lng': PICKUP['lng']}, headers=driver)
+    for _ in range(4):
+        request_trip()
+    publisher, worker = SurgeEngine(smoothing=1.0), SurgeEngine()
+    with app.app_context():
+        zone = publisher.zone(PICKUP['lat'], PICKUP['lng'])
+        assert publisher.counts() == ({zone: 4}, {zone: 1})
+        assert publisher.publish() == 1
+        worker.refresh()
+        assert worker.multiplier(PICKUP['lat'], PICKUP['lng']) == publisher.target(4, 1) == 2.5
+        snapshot = worker.snapshot()
+        assert (snapshot['openTrips'], snapshot['idleDrivers'], len(snapshot['zones'])) == (4, 1, 1)
+
+        # A driver with a stale ping is not supply
+        db.session.execute(update(Driver).values(located_at=datetime.utcnow() - timedelta(minutes=10)))
+        db.session.commit()
+        assert publisher.counts()[1] == {}
+
+
+def test_busy_drivers_are_not_supply(app, client, driver, request_trip, advance):
+    client.put('/api/v1/drivers/status', json={'isOnline': True}, headers=driver)
+    client.put('/api/v1/drivers/location', json={'lat': PICKUP['lat'], 'lng': PICKUP['lng']}, headers=driver)
+    trip_id = request_trip()
+    with app.app_context():
+        assert sum(SurgeEngine().counts()[1].values()) == 1
+    advance(trip_id, 'accept')
+    with app.app_context():
+        assert SurgeEngine().counts() == ({}, {})
+
+
+def test_multipliers_smooth_and_decay(app, request_trip):
+    request_trip()
+    engine = SurgeEngine(smoothing=0.5, max_multiplier=3.0)
+    with app.app_context():
+        values = []
+        for _ in range(3):
+            engine.publish()
+            engine.refresh()
+            values.append(engine.multiplier(PICKUP['lat'], PICKUP['lng']))
+        assert values[0] < values[1] < values[2] < engine.target(1, 0)
+
+        engine.sensitivity = 0  # Demand met: multipliers fall back towards 1
+        engine.publish()
+        engine.refresh()
+        assert 1.0 <= engine.multiplier(PICKUP['lat'], PICKUP['lng']) < values[2]
@@ -0,0 +1,54 @@
+# SafeRide Backend - Trip List Query Budgets
+# Listing endpoints issue a fixed number of statements however many trips they return
+
+from services.query_profiler import assert_max_queries
+
+
+def book_trips(request_trip, advance, completed, open_):
+    for _ in range(completed):
+        advance(request_trip(), 'accept', 'arrive', 'start', 'complete')
+    for _ in range(open_):
+        request_trip()
+
+
+def test_passenger_trips(client, passenger, request_trip, advance):
+    book_trips(request_trip, advance, completed=6, open_=4)
+    # User, page (hot UNION ALL archive), and a count per tier
+    with assert_max_queries(4):
+        response = client.get('/api/v1/trips', headers=passenger)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['trips']) == 10
+
+
+def test_driver_trips(client, driver, request_trip, advance):
+    book_trips(request_trip, advance, completed=6, open_=0)
+    with assert_max_queries(4):
+        response = client.get('/api/v1/trips', headers=driver)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['trips']) == 6
+
+
+def test_available_trips(client, driver, request_trip, advance):
+    book_trips(request_trip, advance, completed=2, open_=8)
+    with assert_max_queries(2):
+        response = client.get('/api/v1/drivers/available-trips', headers=driver)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['trips']) == 8
+
+
+def test_admin_trips(client, admin, request_trip, advance):
+    book_trips(request_trip, advance, completed=4, open_=4)
+    with assert_max_queries(2):
+        response = client.get('/api/v1/admin/trips', headers=admin)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']['trips']) == 8
+
+
+def test_budget_does_not_grow_with_trips(client, passenger, request_trip, advance):
+    request_trip()
+    with assert_max_queries(4) as few:
+        client.get('/api/v1/trips', headers=passenger)
+    book_trips(request_trip, advance, completed=5, open_=5)
+    with assert_max_queries(4) as many:
+        client.get('/api/v1/trips', headers=passenger)
+    assert len(many) == len(few)
@@ -0,0 +1,126 @@
+# SafeRide Backend - Trip State Machine Tests
+# Conditional single-statement transitions, their guards and the transition log
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+from models import db, Trip, User
+from services import trip_states
+from services.query_profiler import profiler
+from services.trip_states import TransitionError
+
+
+def user_id(email):
+    return User.query.filter_by(email=email).one().id
+
+
+def move(trip_id, action, actor_id, **values):
+    left = trip_states.transition(trip_id, action, actor_id, **values)
+    db.session.commit()
+    return left
+
+
+def test_lifecycle_records_each_transition(app, request_trip, driver):
+    trip_id = request_trip()
+    with app.app_context():
+        driver_id = user_id('driver@example.com')
+        assert [move(trip_id, action, driver_id) for action in ('accept', 'arrive', 'start', 'complete')] == \
+            ['requested', 'accepted', 'arrived', 'driving']
+        trip = db.session.get(Trip, trip_id)
+        assert (trip.status, trip.driver_id) == ('completed', driver_id)
+        assert None not in (trip.accepted_at, trip.arrived_at, trip.started_at, trip.completed_at)
+        assert [(t.from_status, t.to_status) for t in trip_states.history(trip_id)] == [
+            ('requested', 'accepted'), ('accepted', 'arrived'), ('arrived', 'driving'), ('driving', 'completed')
+        ]
+
+
+def test_transition_is_one_update(app, request_trip, driver):
+    trip_id = request_trip()
+    with app.app_context():
+        driver_id = user_id('driver@example.com')
+        with profiler.capture() as statements:
+            trip_states.transition(trip_id, 'accept', driver_id)
+        db.session.commit()
+        assert [s.split()[0] for s in statements] == ['UPDATE']
+        assert db.session.get(Trip, trip_id).status == 'accepted'
+
+
+@pytest.mark.parametrize('steps, expected', [
+    ((), 'requested'),
+    (('accept',), 'accepted'),
+    (('accept', 'arrive'), 'arrived'),
+])
+def test_cancel_reports_the_status_it_left(client, passenger, request_trip, advance, app, steps, expected):
+    trip_id = request_trip()
+    advance(trip_id, *steps)
+    response = client.put(f'/api/v1/trips/{trip_id}/cancel', json={'reason': 'changed plans'}, headers=passenger)
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        last = trip_states.history(trip_id)[-1]
+        assert (last.from_status, last.to_status, last.reason) == (expected, 'cancelled', 'changed plans')
+
+
+def expect_error(trip_id, action, actor_id, code, status):
+    with pytest.raises(TransitionError) as error:
+        trip_states.transition(trip_id, action, actor_id)
+    db.session.rollback()
+    assert (error.value.code, error.value.status) == (code, status)
+
+
+def test_invalid_transitions(app, request_trip, advance, register):
+    trip_id = request_trip()
+    register('other-driver@example.com', 'driver')
+    with app.app_context():
+        driver_id, other_id = user_id('driver@example.com'), user_id('other-driver@example.com')
+        passenger_id = user_id('passenger@example.com')
+        expect_error('t_missing', 'accept', driver_id, 'TRIP_NOT_FOUND', 404)
+        # Driver actions belong to the assigned driver only
+        expect_error(trip_id, 'start', driver_id, 'UNAUTHORIZED', 403)
+
+    advance(trip_id, 'accept')
+    with app.app_context():
+        expect_error(trip_id, 'arrive', other_id, 'UNAUTHORIZED', 403)
+        expect_error(trip_id, 'accept', other_id, 'INVALID_STATUS', 400)
+        expect_error(trip_id, 'complete', driver_id, 'INVALID_STATUS', 400)
+
+    # Nobody can cancel once the ride has started
+    advance(trip_id, 'arrive', 'start')
+    with app.app_context():
+        expect_error(trip_id, 'cancel', passenger_id, 'INVALID_STATUS', 400)
+        assert db.session.get(Trip, trip_id).status == 'driving'
+        assert len(trip_states.history(trip_id)) == 3
+
+
+def test_racing_drivers_one_accept_wins(app, request_trip, register):
+    drivers = [register(f'driver{n}@example.com', 'driver') for n in range(6)]
+    trip_id = request_trip()
+    barrier = threading.Barrier(len(drivers))
+
+    def accept(headers):
+        client = app.test_client()
+        barrier.wait()
+        return client.put(f'/api/v1/trips/{trip_id}/accept', json={}, headers=headers)
+
+    with ThreadPoolExecutor(len(drivers)) as pool:
+        responses = list(pool.map(accept, drivers))
+
+    assert sorted(response.status_code for response in responses) == [200] + [400] * 5
+    losers = [response.get_json()['error']['code'] for response in responses if response.status_code == 400]
+    assert set(losers) == {'INVALID_STATUS'}
+    with app.app_context():
+        winner = next(response for response in responses if response.status_code == 200).get_json()['data']['driverId']
+        assert db.session.get(Trip, trip_id).driver_id == winner
+        assert len(trip_states.history(trip_id)) == 1
+
+
+def test_transition_many_only_moves_trips_still_in_a_source(app, request_trip, advance):
+    waiting, taken = request_trip(), request_trip()
+    advance(taken, 'accept')
+    with app.app_context():
+        rows = trip_states.transition_many([waiting, taken], 'expire', reason='expired', sources=('requested',))
+        db.session.commit()
+        assert [(row[0], row[1]) for row in rows] == [(waiting, 'requested')]
+        assert db.session.get(Trip, waiting).status == 'cancelled'
+        assert db.session.get(Trip, taken).status == 'accepted'